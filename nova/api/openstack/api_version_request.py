@@ -71,6 +71,12 @@ REST_API_VERSION_HISTORY = """REST API Version History:
     * 2.24 - Add API to cancel a running live migration
     * 2.25 - Make block_migration support 'auto' and remove
              disk_over_commit for os-migrateLive.
+    * 2.26 - Add os-server-bulk-actions to start, stop or reboot many
+             servers with one request.
+    * 2.27 - Add cache_images and unpin_images actions to os-aggregates
+             to fetch images into the image cache of the aggregate hosts.
+    * 2.28 - Add ETag and If-None-Match support to server and flavor show
+             and detail.
 
 """
 
@@ -80,7 +86,7 @@ REST_API_VERSION_HISTORY = """REST API Version History:
 # Note(cyeoh): This only applies for the v2.1 API once microversions
 # support is fully merged. It does not affect the V2 API.
 _MIN_API_VERSION = "2.1"
-_MAX_API_VERSION = "2.25"
+_MAX_API_VERSION = "2.28"
 DEFAULT_API_VERSION = _MIN_API_VERSION
 
 
@@ -197,6 +197,41 @@ class AggregateController(wsgi.Controller):
 
         return self._marshall_aggregate(aggregate)
 
+    @wsgi.Controller.api_version("2.27")
+    @wsgi.response(202)
+    @extensions.expected_errors((400, 404))
+    @wsgi.action('cache_images')
+    @validation.schema(aggregates.cache_images)
+    def _cache_images(self, req, id, body):
+        """Fetches images into the image cache of the aggregate hosts."""
+        context = _get_context(req)
+        authorize(context, action='cache_images')
+
+        image_ids = body['cache_images']['images']
+        pin = body['cache_images'].get('pin', False)
+        try:
+            self.api.cache_images(context, id, image_ids, pin=pin)
+        except exception.AggregateNotFound as e:
+            raise exc.HTTPNotFound(explanation=e.format_message())
+        except exception.ImageNotFound as e:
+            raise exc.HTTPBadRequest(explanation=e.format_message())
+
+    @wsgi.Controller.api_version("2.27")
+    @wsgi.response(202)
+    @extensions.expected_errors(404)
+    @wsgi.action('unpin_images')
+    @validation.schema(aggregates.unpin_images)
+    def _unpin_images(self, req, id, body):
+        """Lets the aggregate hosts remove images from their cache."""
+        context = _get_context(req)
+        authorize(context, action='unpin_images')
+
+        image_ids = body['unpin_images']['images']
+        try:
+            self.api.unpin_images(context, id, image_ids)
+        except exception.AggregateNotFound as e:
+            raise exc.HTTPNotFound(explanation=e.format_message())
+
     def _marshall_aggregate(self, aggregate):
         _aggregate = {}
         for key, value in self._build_aggregate_items(aggregate):
@@ -45,12 +45,16 @@ class ConfigDriveController(wsgi.Controller):
         if authorize(context):
             self._show(req, resp_obj)
 
+    @staticmethod
+    def _contribute(server, instance):
+        server[ATTRIBUTE_NAME] = instance['config_drive']
+
     @wsgi.extends
-    def detail(self, req, resp_obj):
+    def detail(self, req):
         context = req.environ['nova.context']
-        if 'servers' in resp_obj.obj and authorize(context):
-            servers = resp_obj.obj['servers']
-            self._add_config_drive(req, servers)
+        if authorize(context):
+            req.add_view_contributor('servers', self._contribute)
+        yield
 
 
 class ConfigDrive(extensions.V21APIExtensionBase):
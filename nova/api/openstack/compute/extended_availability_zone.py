@@ -15,6 +15,8 @@
 
 """The Extended Availability Zone Status API extension."""
 
+import functools
+
 from nova.api.openstack import extensions
 from nova.api.openstack import wsgi
 from nova import availability_zones as avail_zone
@@ -42,13 +44,12 @@ class ExtendedAZController(wsgi.Controller):
             self._extend_server(context, server, db_instance)
 
     @wsgi.extends
-    def detail(self, req, resp_obj):
+    def detail(self, req):
         context = req.environ['nova.context']
         if authorize(context):
-            servers = list(resp_obj.obj['servers'])
-            for server in servers:
-                db_instance = req.get_db_instance(server['id'])
-                self._extend_server(context, server, db_instance)
+            req.add_view_contributor('servers',
+                functools.partial(self._extend_server, context))
+        yield
 
 
 class ExtendedAvailabilityZone(extensions.V21APIExtensionBase):
@@ -78,7 +78,7 @@ class ExtendedServerAttributesController(wsgi.Controller):
                 self._server_host_status(context, server, db_instance, req)
 
     @wsgi.extends
-    def detail(self, req, resp_obj):
+    def detail(self, req):
         context = req.environ['nova.context']
         authorize_extend = False
         authorize_host_status = False
@@ -88,20 +88,23 @@ class ExtendedServerAttributesController(wsgi.Controller):
             soft_authorize(context, action='show:host_status')):
             authorize_host_status = True
         if authorize_extend or authorize_host_status:
-            servers = list(resp_obj.obj['servers'])
-            instances = req.get_db_instances()
-            # Instances is guaranteed to be in the cache due to
-            # the core API adding it in its 'detail' method.
-            if authorize_host_status:
-                host_statuses = self.compute_api.get_instances_host_statuses(
-                                instances.values())
-            for server in servers:
+            host_statuses = {}
+
+            def contribute(server, instance):
                 if authorize_extend:
-                    instance = instances[server['id']]
                     self._extend_server(context, server, instance, req)
                 if authorize_host_status:
+                    if not host_statuses:
+                        # Instances is guaranteed to be in the cache due to
+                        # the core API adding it in its 'detail' method.
+                        host_statuses.update(
+                            self.compute_api.get_instances_host_statuses(
+                                req.get_db_instances().values()))
                     server['host_status'] = host_statuses[server['id']]
 
+            req.add_view_contributor('servers', contribute)
+        yield
+
 
 class ExtendedServerAttributes(extensions.V21APIExtensionBase):
     """Extended Server Attributes support."""
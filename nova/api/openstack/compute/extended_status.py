@@ -47,15 +47,11 @@ class ExtendedStatusController(wsgi.Controller):
             self._extend_server(server, db_instance)
 
     @wsgi.extends
-    def detail(self, req, resp_obj):
+    def detail(self, req):
         context = req.environ['nova.context']
         if authorize(context):
-            servers = list(resp_obj.obj['servers'])
-            for server in servers:
-                db_instance = req.get_db_instance(server['id'])
-                # server['id'] is guaranteed to be in the cache due to
-                # the core API adding it in its 'detail' method.
-                self._extend_server(server, db_instance)
+            req.add_view_contributor('servers', self._extend_server)
+        yield
 
 
 class ExtendedStatus(extensions.V21APIExtensionBase):
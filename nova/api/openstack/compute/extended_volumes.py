@@ -52,17 +52,26 @@ class ExtendedVolumesController(wsgi.Controller):
             self._extend_server(context, server, req, instance_bdms)
 
     @wsgi.extends
-    def detail(self, req, resp_obj):
+    def detail(self, req):
         context = req.environ['nova.context']
         if soft_authorize(context):
-            servers = list(resp_obj.obj['servers'])
-            instance_uuids = [server['id'] for server in servers]
-            bdms = objects.BlockDeviceMappingList.bdms_by_instance_uuid(
-                context, instance_uuids)
-            for server in servers:
-                instance_bdms = self._get_instance_bdms(bdms, server)
+            bdms = []
+
+            def contribute(server, instance):
+                if not bdms:
+                    # Fetch the BDMs of the whole page in one query when the
+                    # first server is rendered. The instances are guaranteed
+                    # to be in the cache due to the core API adding them in
+                    # its 'detail' method.
+                    bdms.append(
+                        objects.BlockDeviceMappingList.bdms_by_instance_uuid(
+                            context, list(req.get_db_instances())))
+                instance_bdms = self._get_instance_bdms(bdms[0], server)
                 self._extend_server(context, server, req, instance_bdms)
 
+            req.add_view_contributor('servers', contribute)
+        yield
+
     def _get_instance_bdms(self, bdms, server):
         # server['id'] is guaranteed to be in the cache due to
         # the core API adding it in the 'detail' or 'show' method.
@@ -39,6 +39,7 @@ class FlavorsController(wsgi.Controller):
         limited_flavors = self._get_flavors(req)
         return self._view_builder.index(req, limited_flavors)
 
+    @wsgi.etag('2.28')
     @extensions.expected_errors(400)
     def detail(self, req):
         """Return all flavors in detail."""
@@ -46,6 +47,7 @@ class FlavorsController(wsgi.Controller):
         req.cache_db_flavors(limited_flavors)
         return self._view_builder.detail(req, limited_flavors)
 
+    @wsgi.etag('2.28')
     @extensions.expected_errors(404)
     def show(self, req, id):
         """Return data about the given flavor id."""
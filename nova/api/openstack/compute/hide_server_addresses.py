@@ -62,16 +62,15 @@ class Controller(wsgi.Controller):
             instance = req.get_db_instance(id)
             self._perhaps_hide_addresses(instance, resp.obj['server'])
 
-    @wsgi.extends
-    def detail(self, req, resp_obj):
-        resp = resp_obj
-        if not authorize(req.environ['nova.context']):
-            return
+    def _contribute(self, server, instance):
+        if 'addresses' in server:
+            self._perhaps_hide_addresses(instance, server)
 
-        for server in list(resp.obj['servers']):
-            if 'addresses' in server:
-                instance = req.get_db_instance(server['id'])
-                self._perhaps_hide_addresses(instance, server)
+    @wsgi.extends
+    def detail(self, req):
+        if authorize(req.environ['nova.context']):
+            req.add_view_contributor('servers', self._contribute)
+        yield
 
 
 class HideServerAddresses(extensions.V21APIExtensionBase):
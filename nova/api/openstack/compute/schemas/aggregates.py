@@ -129,3 +129,46 @@ set_metadata = {
     'required': ['set_metadata'],
     'additionalProperties': False,
 }
+
+
+images = {
+    'type': 'array',
+    'items': parameter_types.image_id,
+    'minItems': 1,
+    'uniqueItems': True,
+}
+
+
+cache_images = {
+    'type': 'object',
+    'properties': {
+        'cache_images': {
+            'type': 'object',
+            'properties': {
+                'images': images,
+                'pin': {'type': 'boolean'},
+            },
+            'required': ['images'],
+            'additionalProperties': False,
+        },
+    },
+    'required': ['cache_images'],
+    'additionalProperties': False,
+}
+
+
+unpin_images = {
+    'type': 'object',
+    'properties': {
+        'unpin_images': {
+            'type': 'object',
+            'properties': {
+                'images': images,
+            },
+            'required': ['images'],
+            'additionalProperties': False,
+        },
+    },
+    'required': ['unpin_images'],
+    'additionalProperties': False,
+}
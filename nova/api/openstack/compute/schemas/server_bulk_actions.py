@@ -0,0 +1,41 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+create = {
+    'type': 'object',
+    'properties': {
+        'bulk_action': {
+            'type': 'object',
+            'properties': {
+                'action': {
+                    'type': 'string',
+                    'enum': ['start', 'stop', 'reboot'],
+                },
+                'servers': {
+                    'type': 'array', 'minItems': 1, 'maxItems': 1000,
+                    'items': {
+                        'type': 'string', 'format': 'uuid',
+                    },
+                },
+                'reboot_type': {
+                    'type': 'string',
+                    'enum': ['HARD', 'Hard', 'hard', 'SOFT', 'Soft', 'soft'],
+                },
+            },
+            'required': ['action', 'servers'],
+            'additionalProperties': False,
+        },
+    },
+    'required': ['bulk_action'],
+    'additionalProperties': False,
+}
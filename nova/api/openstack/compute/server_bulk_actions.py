@@ -0,0 +1,127 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+
+from oslo_log import log as logging
+import webob
+
+from nova.api.openstack.compute.schemas import server_bulk_actions
+from nova.api.openstack import extensions
+from nova.api.openstack import wsgi
+from nova.api import validation
+from nova import compute
+from nova import exception
+from nova.i18n import _
+
+
+LOG = logging.getLogger(__name__)
+ALIAS = 'os-server-bulk-actions'
+# NOTE: Each server is authorized against the policy of the single server
+# action, so that the bulk API grants nothing more than the actions do.
+authorize = extensions.os_compute_authorizer('servers')
+
+
+class ServerBulkActionsController(wsgi.Controller):
+    """Runs a power action on many servers with a single request."""
+
+    def __init__(self):
+        self.compute_api = compute.API()
+        super(ServerBulkActionsController, self).__init__()
+
+    def _start(self, context, instance, body):
+        self.compute_api.start(context, instance)
+
+    def _stop(self, context, instance, body):
+        self.compute_api.stop(context, instance)
+
+    def _reboot(self, context, instance, body):
+        reboot_type = body.get('reboot_type', 'SOFT').upper()
+        self.compute_api.reboot(context, instance, reboot_type)
+
+    def _get_instances(self, context, uuids):
+        search_opts = {'uuid': uuids, 'deleted': False}
+        if not context.is_admin:
+            search_opts['project_id'] = context.project_id
+        # NOTE: Sorting by host keeps the casts to each compute host together.
+        return self.compute_api.get_all(context, search_opts=search_opts,
+                                        want_objects=True,
+                                        sort_keys=['host', 'uuid'],
+                                        sort_dirs=['asc', 'asc'])
+
+    @wsgi.Controller.api_version("2.26")
+    @extensions.expected_errors((400, 404))
+    @validation.schema(server_bulk_actions.create)
+    def create(self, req, body):
+        """Run an action on each of the listed servers."""
+        context = req.environ['nova.context']
+        body = body['bulk_action']
+        action = body['action']
+        run_action = getattr(self, '_%s' % action)
+        uuids = list(collections.OrderedDict.fromkeys(body['servers']))
+
+        instances = self._get_instances(context, uuids)
+        if not instances:
+            msg = _('None of the servers could be found')
+            raise webob.exc.HTTPNotFound(explanation=msg)
+
+        results = {}
+        for instance in instances:
+            try:
+                authorize(context, instance, action)
+                run_action(context, instance, body)
+            except exception.PolicyNotAuthorized as e:
+                results[instance.uuid] = (403, e.format_message())
+            except exception.InstanceUnknownCell as e:
+                results[instance.uuid] = (404, e.format_message())
+            except (exception.InstanceNotReady,
+                    exception.InstanceIsLocked,
+                    exception.InstanceInvalidState) as e:
+                results[instance.uuid] = (409, e.format_message())
+            else:
+                results[instance.uuid] = (202, None)
+
+        LOG.debug('Bulk %(action)s of %(count)d servers',
+                  {'action': action, 'count': len(instances)})
+
+        result = 202
+        response_servers = []
+        for uuid in uuids:
+            code, message = results.get(uuid, (404, None))
+            server = {'id': uuid, 'code': code}
+            if code == 404 and message is None:
+                message = _('Server %s could not be found') % uuid
+            if message is not None:
+                server['message'] = message
+                result = 207
+            response_servers.append(server)
+
+        robj = wsgi.ResponseObject({'servers': response_servers})
+        robj._code = result
+        return robj
+
+
+class ServerBulkActions(extensions.V21APIExtensionBase):
+    """Start, stop or reboot many servers with one request."""
+
+    name = "ServerBulkActions"
+    alias = ALIAS
+    version = 1
+
+    def get_resources(self):
+        resource = extensions.ResourceExtension(ALIAS,
+                ServerBulkActionsController())
+
+        return [resource]
+
+    def get_controller_extensions(self):
+        return []
@@ -286,6 +286,7 @@ class ServersController(wsgi.Controller):
             raise exc.HTTPBadRequest(explanation=err.format_message())
         return servers
 
+    @wsgi.etag('2.28')
     @extensions.expected_errors((400, 403))
     def detail(self, req):
         """Returns a list of server details for a given user."""
@@ -407,7 +408,7 @@ class ServersController(wsgi.Controller):
             instance_list = self.compute_api.get_all(elevated or context,
                     search_opts=search_opts, limit=limit, marker=marker,
                     want_objects=True, expected_attrs=expected_attrs,
-                    sort_keys=sort_keys, sort_dirs=sort_dirs)
+                    sort_keys=sort_keys, sort_dirs=sort_dirs, stale_ok=True)
         except exception.MarkerNotFound:
             msg = _('marker [%s] not found') % marker
             raise exc.HTTPBadRequest(explanation=msg)
@@ -416,13 +417,15 @@ class ServersController(wsgi.Controller):
                       search_opts['flavor'])
             instance_list = objects.InstanceList()
 
+        # NOTE: Cache the instances before building the view so that the
+        # extensions contributing fields to it can look them all up.
+        req.cache_db_instances(instance_list)
         if is_detail:
             instance_list._context = context
             instance_list.fill_faults()
             response = self._view_builder.detail(req, instance_list)
         else:
             response = self._view_builder.index(req, instance_list)
-        req.cache_db_instances(instance_list)
         return response
 
     def _get_server(self, context, req, instance_uuid, is_detail=False):
@@ -516,6 +519,7 @@ class ServersController(wsgi.Controller):
         except TypeError:
             return None
 
+    @wsgi.etag('2.28')
     @extensions.expected_errors(404)
     def show(self, req, id):
         """Returns server details by server id."""
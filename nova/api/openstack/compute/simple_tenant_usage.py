@@ -16,6 +16,7 @@
 import datetime
 
 import iso8601
+from oslo_config import cfg
 from oslo_utils import timeutils
 import six
 import six.moves.urllib.parse as urlparse
@@ -27,6 +28,19 @@ from nova import exception
 from nova.i18n import _
 from nova import objects
 
+opts = [
+    cfg.BoolOpt('simple_tenant_usage_aggregate_in_db',
+                default=False,
+                help='Compute the totals of the non detailed simple tenant '
+                     'usage listing in the database instead of loading '
+                     'every instance active during the requested period. '
+                     'The totals may differ from the historical ones by '
+                     'floating point rounding.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(opts)
+
 ALIAS = "os-simple-tenant-usage"
 authorize = extensions.os_compute_authorizer(ALIAS)
 
@@ -97,8 +111,28 @@ class SimpleTenantUsageController(wsgi.Controller):
 
         return flavor_ref
 
+    def _tenant_usage_totals_for_period(self, context, period_start,
+                                        period_stop, tenant_id=None):
+        usages = objects.InstanceList.get_usage_by_window(
+            context, period_start, period_stop, project_id=tenant_id)
+        rval = []
+        for usage in usages:
+            summary = {}
+            summary['tenant_id'] = usage['project_id']
+            summary['total_local_gb_usage'] = usage['local_gb_hours']
+            summary['total_vcpus_usage'] = usage['vcpus_hours']
+            summary['total_memory_mb_usage'] = usage['memory_mb_hours']
+            summary['total_hours'] = usage['hours']
+            summary['start'] = timeutils.normalize_time(period_start)
+            summary['stop'] = timeutils.normalize_time(period_stop)
+            rval.append(summary)
+        return rval
+
     def _tenant_usages_for_period(self, context, period_start,
                                   period_stop, tenant_id=None, detailed=True):
+        if not detailed and CONF.simple_tenant_usage_aggregate_in_db:
+            return self._tenant_usage_totals_for_period(
+                context, period_start, period_stop, tenant_id=tenant_id)
 
         instances = objects.InstanceList.get_active_by_window_joined(
                         context, period_start, period_stop, tenant_id,
@@ -147,7 +147,19 @@ class ViewBuilder(common.ViewBuilder):
     def detail(self, request, instances):
         """Detailed view of a list of instance."""
         coll_name = self._collection_name + '/detail'
-        return self._list_view(self.show, request, instances, coll_name)
+        contributors = request.get_view_contributors(self._collection_name)
+        if not contributors:
+            return self._list_view(self.show, request, instances, coll_name)
+
+        def _show(request, instance):
+            # Let the extensions add their fields while the server is built
+            # instead of walking the whole list again for each of them.
+            server = self.show(request, instance)
+            for contributor in contributors:
+                contributor(server['server'], instance)
+            return server
+
+        return self._list_view(_show, request, instances, coll_name)
 
     def _list_view(self, func, request, servers, coll_name):
         """Provide a view for a list of servers.
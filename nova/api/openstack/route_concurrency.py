@@ -0,0 +1,235 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Bounded concurrency for classes of API routes.
+
+A single API worker serves every route from one pool of greenthreads, so a
+burst of slow requests, such as console URLs waiting on a compute RPC call,
+can occupy the whole pool and starve cheap GETs. Routes can be given their
+own limit of requests processed concurrently by each API worker. Requests
+beyond the limit wait in a bounded queue, and are rejected with a
+Retry-After header once the queue is full or they waited too long.
+
+NOTE: The 429 and 503 responses and their Retry-After header are not tied to
+a microversion. Like the responses of rate limiting middleware, which the
+API faults already describe with a retryAfter field, they are overload
+protection configured by the operator rather than part of the contract of a
+route. Gating them on the requested microversion would let older clients
+bypass the limit altogether. Any API can already return them from a proxy
+or load balancer, and clients are expected to retry them.
+"""
+
+import collections
+import threading
+import time
+
+from oslo_config import cfg
+from oslo_log import log as logging
+from oslo_reports import guru_meditation_report as gmr
+from oslo_reports.models import with_default_views as mwdv
+import six
+import webob
+
+from nova.i18n import _
+from nova.i18n import _LW
+
+
+route_concurrency_opts = [
+    cfg.DictOpt('osapi_route_concurrency',
+                default={},
+                help='Maximum number of requests of a class of routes each '
+                     'API worker processes concurrently, as a comma '
+                     'separated list of <route class>:<limit> pairs. A '
+                     'route class is either a controller, such as '
+                     '"ServersController", or one of its methods, such as '
+                     '"RemoteConsolesController.get_vnc_console". A method '
+                     'limit takes precedence over the limit of its '
+                     'controller. Routes without a limit are not bounded.'),
+    cfg.IntOpt('osapi_route_queue_size',
+               default=10,
+               min=0,
+               help='Number of requests of a limited route class that may '
+                    'wait for a free slot. Further requests are rejected '
+                    'right away with a 429 response.'),
+    cfg.IntOpt('osapi_route_queue_timeout',
+               default=10,
+               min=0,
+               help='Seconds a request of a limited route class waits for a '
+                    'free slot before it is rejected with a 503 response.'),
+    cfg.IntOpt('osapi_route_retry_after',
+               default=5,
+               min=0,
+               help='Seconds clients are asked to wait in the Retry-After '
+                    'header of the responses to rejected requests.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(route_concurrency_opts)
+
+LOG = logging.getLogger(__name__)
+
+_LIMITERS = {}
+_LIMITERS_LOCK = threading.Lock()
+_REPORT_REGISTERED = False
+
+
+class RouteLimiter(object):
+    """Bounds the number of requests of a route class processed at once."""
+
+    def __init__(self, name, limit, queue_size, queue_timeout):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_in_flight = 0
+        self.max_waiting = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._cond = threading.Condition()
+
+    def _reject(self, exc_class, explanation):
+        return exc_class(explanation=explanation,
+                         headers={'Retry-After':
+                                  '%d' % CONF.osapi_route_retry_after})
+
+    def _take_slot(self):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def acquire(self):
+        """Take a slot, waiting in the queue if none is free.
+
+        :returns: None once the slot is taken, or the webob HTTP error to
+                  return when the request was rejected
+        """
+        with self._cond:
+            if self.in_flight < self.limit and not self.waiting:
+                self._take_slot()
+                return None
+            if self.waiting >= self.queue_size:
+                self.rejected += 1
+                LOG.warning(_LW('Rejecting request for %(name)s, %(waiting)d '
+                                'requests are already waiting'),
+                            {'name': self.name, 'waiting': self.waiting})
+                return self._reject(
+                    webob.exc.HTTPTooManyRequests,
+                    _('Too many requests are being processed, please retry '
+                      'later.'))
+
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+            deadline = time.time() + self.queue_timeout
+            try:
+                while self.in_flight >= self.limit:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        self.timed_out += 1
+                        LOG.warning(_LW('Request for %(name)s timed out '
+                                        'waiting for one of %(limit)d '
+                                        'slots'),
+                                    {'name': self.name, 'limit': self.limit})
+                        return self._reject(
+                            webob.exc.HTTPServiceUnavailable,
+                            _('The service is overloaded, please retry '
+                              'later.'))
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self._take_slot()
+            return None
+
+    def release(self):
+        """Free the slot taken by acquire()."""
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def get_stats(self):
+        with self._cond:
+            return {'limit': self.limit,
+                    'in_flight': self.in_flight,
+                    'waiting': self.waiting,
+                    'max_in_flight': self.max_in_flight,
+                    'max_waiting': self.max_waiting,
+                    'rejected': self.rejected,
+                    'timed_out': self.timed_out}
+
+
+def _get_limit(name):
+    limit = CONF.osapi_route_concurrency.get(name)
+    if limit is None:
+        return None
+    try:
+        limit = int(limit)
+    except ValueError:
+        LOG.warning(_LW('Ignoring invalid concurrency limit %(limit)r of '
+                        '%(name)s'), {'limit': limit, 'name': name})
+        return None
+    return limit if limit > 0 else None
+
+
+def _get_route_classes(meth):
+    owner = getattr(meth, '__self__', None)
+    controller = type(owner).__name__ if owner is not None else None
+    name = getattr(meth, '__name__', None)
+    if controller and name:
+        yield '%s.%s' % (controller, name)
+    if controller:
+        yield controller
+
+
+def get_limiter(meth):
+    """Return the limiter bounding calls to a controller method, if any."""
+    if not CONF.osapi_route_concurrency:
+        return None
+    for name in _get_route_classes(meth):
+        limit = _get_limit(name)
+        if limit is None:
+            continue
+        with _LIMITERS_LOCK:
+            limiter = _LIMITERS.get(name)
+            if limiter is None or limiter.limit != limit:
+                limiter = RouteLimiter(name, limit,
+                                       CONF.osapi_route_queue_size,
+                                       CONF.osapi_route_queue_timeout)
+                _LIMITERS[name] = limiter
+                _register_report()
+        return limiter
+    return None
+
+
+def get_stats():
+    """Return the in flight and queue statistics of every route class."""
+    with _LIMITERS_LOCK:
+        limiters = list(_LIMITERS.values())
+    return dict((limiter.name, limiter.get_stats()) for limiter in limiters)
+
+
+def report_generator():
+    return mwdv.ModelWithDefaultViews(
+        data=collections.OrderedDict(sorted(six.iteritems(get_stats()))))
+
+
+def _register_report():
+    global _REPORT_REGISTERED
+    if not _REPORT_REGISTERED:
+        gmr.TextGuruMeditation.register_section('API Route Concurrency',
+                                                report_generator)
+        _REPORT_REGISTERED = True
+
+
+def reset():
+    """Forget every limiter, for tests."""
+    with _LIMITERS_LOCK:
+        _LIMITERS.clear()
@@ -15,10 +15,12 @@
 #    under the License.
 
 import functools
+import hashlib
 import inspect
 import math
 import time
 
+from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
 from oslo_utils import strutils
@@ -26,7 +28,9 @@ import six
 import webob
 
 from nova.api.openstack import api_version_request as api_version
+from nova.api.openstack import route_concurrency
 from nova.api.openstack import versioned_method
+from nova.db.sqlalchemy import profiler as db_profiler
 from nova import exception
 from nova import i18n
 from nova.i18n import _
@@ -36,8 +40,24 @@ from nova import utils
 from nova import wsgi
 
 
+serialization_opts = [
+    cfg.IntOpt('osapi_stream_response_threshold',
+               default=100,
+               min=0,
+               help='Responses holding a list of at least this many items, '
+                    'such as a page of server details, are sent in chunks '
+                    'as they are serialized instead of being serialized in '
+                    'memory as a whole first. Set to 0 to disable.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(serialization_opts)
+
 LOG = logging.getLogger(__name__)
 
+# Number of list items serialized into each chunk of a streamed response.
+_STREAM_CHUNK_ITEMS = 50
+
 _SUPPORTED_CONTENT_TYPES = (
     'application/json',
     'application/vnd.openstack.compute+json',
@@ -102,7 +122,7 @@ class Request(wsgi.Request):
 
     def __init__(self, *args, **kwargs):
         super(Request, self).__init__(*args, **kwargs)
-        self._extension_data = {'db_items': {}}
+        self._extension_data = {'db_items': {}, 'view_contributors': {}}
         if not hasattr(self, 'api_version_request'):
             self.api_version_request = api_version.APIVersionRequest()
 
@@ -170,6 +190,21 @@ class Request(wsgi.Request):
     def get_db_compute_node(self, id):
         return self.get_db_item('compute_nodes', id)
 
+    def add_view_contributor(self, collection, contributor):
+        """Allow an API extension to add fields to the items of a view.
+
+        The view builder of the collection calls contributor(item, db_item)
+        for every item it renders, right after building it, so extensions
+        do not need to walk the response again once it has been built.
+        Extensions register from the pre-processing stage of a generator
+        extension, after resolving their policy once for the request.
+        """
+        contributors = self._extension_data['view_contributors']
+        contributors.setdefault(collection, []).append(contributor)
+
+    def get_view_contributors(self, collection):
+        return self._extension_data['view_contributors'].get(collection, [])
+
     def best_match_content_type(self):
         """Determine the requested response content-type."""
         if 'nova.best_content_type' not in self.environ:
@@ -296,6 +331,44 @@ class JSONDictSerializer(ActionDispatcher):
     def default(self, data):
         return six.text_type(jsonutils.dumps(data))
 
+    @staticmethod
+    def can_stream(data, threshold):
+        """Whether data holds a list long enough to be worth streaming."""
+        if not threshold or not isinstance(data, dict):
+            return False
+        if not all(isinstance(key, six.string_types) for key in data):
+            return False
+        return any(isinstance(value, list) and len(value) >= threshold
+                   for value in data.values())
+
+    def serialize_chunks(self, data):
+        """Serialize a dict into an iterator of utf-8 encoded chunks.
+
+        The joined chunks are byte for byte identical to the output of
+        default(). Each item of the lists held by the dict is encoded with
+        a single call to jsonutils.dumps, so that the C accelerated encoder
+        of the json module is used when available, and the items are
+        yielded in batches so only one batch is held in memory at a time.
+        """
+        separator = ''
+        yield b'{'
+        for key, value in data.items():
+            prefix = '%s%s: ' % (separator, jsonutils.dumps(key))
+            separator = ', '
+            if not isinstance(value, list):
+                yield (prefix + jsonutils.dumps(value)).encode('utf-8')
+                continue
+            yield (prefix + '[').encode('utf-8')
+            for start in range(0, len(value), _STREAM_CHUNK_ITEMS):
+                chunk = ', '.join(
+                    jsonutils.dumps(item)
+                    for item in value[start:start + _STREAM_CHUNK_ITEMS])
+                if start:
+                    chunk = ', ' + chunk
+                yield chunk.encode('utf-8')
+            yield b']'
+        yield b'}'
+
 
 def response(code):
     """Attaches response code to a method.
@@ -311,6 +384,21 @@ def response(code):
     return decorator
 
 
+def etag(min_version):
+    """Attaches an ETag to the responses of a method.
+
+    The ETag is a hash of the serialized response body. Clients sending it
+    back in an If-None-Match header get an empty 304 response when the
+    resource did not change.  Only requests for min_version or later get
+    either behaviour.  The method is not wrapped.
+    """
+
+    def decorator(func):
+        func.wsgi_etag = min_version
+        return func
+    return decorator
+
+
 class ResponseObject(object):
     """Bundles a response object
 
@@ -325,6 +413,7 @@ class ResponseObject(object):
         self.obj = obj
         self._default_code = 200
         self._code = code
+        self._etag = False
         self._headers = headers or {}
         self.serializer = JSONDictSerializer()
 
@@ -351,20 +440,44 @@ class ResponseObject(object):
         """
 
         serializer = self.serializer
+        code = self.code
+        etag = None
 
-        body = None
-        if self.obj is not None:
+        if (self._etag and self.obj is not None and
+                request.method in ('GET', 'HEAD')):
+            # NOTE: The whole body is needed to hash it, so responses with
+            # an ETag are never streamed.
             body = serializer.serialize(self.obj)
-        response = webob.Response(body=body)
+            # NOTE: webob parses If-None-Match into unquoted entity tags,
+            # so the bare digest is matched and only the header is quoted.
+            etag = hashlib.sha1(utils.utf8(body)).hexdigest()
+            if etag in request.if_none_match:
+                body = None
+                code = 304
+            response = webob.Response(body=body)
+        elif (isinstance(serializer, JSONDictSerializer) and
+                serializer.can_stream(self.obj,
+                                      CONF.osapi_stream_response_threshold)):
+            # NOTE: Without a Content-Length the body is sent with chunked
+            # transfer encoding as it is serialized.
+            response = webob.Response(
+                app_iter=serializer.serialize_chunks(self.obj))
+        else:
+            body = None
+            if self.obj is not None:
+                body = serializer.serialize(self.obj)
+            response = webob.Response(body=body)
         if response.headers.get('Content-Length'):
             # NOTE(andreykurilin): we need to encode 'Content-Length' header,
             # since webob.Response auto sets it if "body" attr is presented.
             # https://github.com/Pylons/webob/blob/1.5.0b0/webob/response.py#L147
             response.headers['Content-Length'] = utils.utf8(
                 response.headers['Content-Length'])
-        response.status_int = self.code
+        response.status_int = code
         for hdr, value in self._headers.items():
             response.headers[hdr] = utils.utf8(value)
+        if etag:
+            response.headers['ETag'] = utils.utf8('"%s"' % etag)
         response.headers['Content-Type'] = utils.utf8(content_type)
         return response
 
@@ -688,6 +801,10 @@ class Resource(wsgi.Application):
             msg = _("Malformed request body")
             return Fault(webob.exc.HTTPBadRequest(explanation=msg))
 
+        db_profiler.set_operation('%s %s.%s' % (
+            request.method, type(self.controller).__name__,
+            getattr(meth, '__name__', action)))
+
         if body:
             msg = _("Action: '%(action)s', calling method: %(meth)s, body: "
                     "%(body)s") % {'action': action,
@@ -724,6 +841,21 @@ class Resource(wsgi.Application):
                      'context_project_id': context.project_id}
             return Fault(webob.exc.HTTPBadRequest(explanation=msg))
 
+        limiter = route_concurrency.get_limiter(meth)
+        if limiter is not None:
+            error = limiter.acquire()
+            if error is not None:
+                return Fault(error)
+        try:
+            return self._run_method(request, meth, extensions, action_args,
+                                    accept)
+        finally:
+            if limiter is not None:
+                limiter.release()
+
+    def _run_method(self, request, meth, extensions, action_args, accept):
+        """Run the method and its extensions and serialize the result."""
+
         # Run pre-processing extensions
         response, post = self.pre_process_extensions(extensions,
                                                      request, action_args)
@@ -751,6 +883,10 @@ class Resource(wsgi.Application):
                 # Do a preserialize to set up the response object
                 if hasattr(meth, 'wsgi_code'):
                     resp_obj._default_code = meth.wsgi_code
+                etag_version = getattr(meth, 'wsgi_etag', None)
+                if etag_version and api_version.is_supported(
+                        request, min_version=etag_version):
+                    resp_obj._etag = True
                 # Process post-processing extensions
                 response = self.post_process_extensions(post, resp_obj,
                                                         request, action_args)
@@ -1074,7 +1210,7 @@ class Fault(webob.exc.HTTPException):
             fault_name: {
                 'code': code,
                 'message': explanation}}
-        if code == 413 or code == 429:
+        if code in (413, 429, 503):
             retry = self.wrapped_exc.headers.get('Retry-After', None)
             if retry:
                 fault_data[fault_name]['retryAfter'] = retry
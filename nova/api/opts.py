@@ -25,6 +25,9 @@ import nova.api.openstack.compute.legacy_v2.contrib.fping
 import nova.api.openstack.compute.legacy_v2.contrib.os_tenant_networks
 import nova.api.openstack.compute.legacy_v2.extensions
 import nova.api.openstack.compute.legacy_v2.servers
+import nova.api.openstack.compute.simple_tenant_usage
+import nova.api.openstack.route_concurrency
+import nova.api.openstack.wsgi
 import nova.availability_zones
 import nova.baserpc
 import nova.cells.manager
@@ -134,6 +137,9 @@ def list_opts():
              nova.api.openstack.compute.legacy_v2.extensions.ext_opts,
              nova.api.openstack.compute.hide_server_addresses.opts,
              nova.api.openstack.compute.legacy_v2.servers.server_opts,
+             nova.api.openstack.compute.simple_tenant_usage.opts,
+             nova.api.openstack.route_concurrency.route_concurrency_opts,
+             nova.api.openstack.wsgi.serialization_opts,
          )),
         ('neutron', nova.api.metadata.handler.metadata_proxy_opts),
         ('osapi_v21', nova.api.openstack.api_opts),
@@ -38,6 +38,7 @@ from six.moves import range
 
 from nova import availability_zones
 from nova import block_device
+from nova import cache_utils
 from nova.cells import opts as cells_opts
 from nova.compute import flavors
 from nova.compute import instance_actions
@@ -956,17 +957,36 @@ class API(base.Base):
         LOG.debug("Going to run %s instances..." % num_instances)
         instances = []
         try:
-            for i in range(num_instances):
-                # Create a uuid for the instance so we can store the
-                # RequestSpec before the instance is created.
-                instance_uuid = str(uuid.uuid4())
-                # Store the RequestSpec that will be used for scheduling.
-                req_spec = objects.RequestSpec.from_components(context,
+            if instance_group and check_server_group_quota:
+                # Check the quota for the whole batch at once rather than
+                # counting the members again for every instance.
+                count = objects.Quotas.count(context,
+                                             'server_group_members',
+                                             instance_group,
+                                             context.user_id)
+                try:
+                    objects.Quotas.limit_check(context,
+                        server_group_members=count + num_instances)
+                except exception.OverQuota:
+                    msg = _("Quota exceeded, too many servers in group")
+                    raise exception.QuotaError(msg)
+
+            # Create a uuid for each instance so we can store the
+            # RequestSpecs, used for scheduling, before the instances are
+            # created. They are all written in a single transaction.
+            instance_uuids = [str(uuid.uuid4())
+                              for i in range(num_instances)]
+            req_specs = []
+            for instance_uuid in instance_uuids:
+                req_specs.append(objects.RequestSpec.from_components(context,
                         instance_uuid, boot_meta, instance_type,
                         base_options['numa_topology'],
                         base_options['pci_requests'], filter_properties,
-                        instance_group, base_options['availability_zone'])
-                req_spec.create()
+                        instance_group, base_options['availability_zone']))
+            objects.RequestSpec.create_all(context, req_specs)
+
+            for i, instance_uuid in enumerate(instance_uuids):
+                req_spec = req_specs[i]
                 build_request = self._create_build_request(context,
                         instance_uuid, base_options, req_spec, security_groups,
                         num_instances, i)
@@ -990,29 +1010,16 @@ class API(base.Base):
                 # be updated before this is destroyed.
                 build_request.destroy()
 
-                if instance_group:
-                    if check_server_group_quota:
-                        count = objects.Quotas.count(context,
-                                             'server_group_members',
-                                             instance_group,
-                                             context.user_id)
-                        try:
-                            objects.Quotas.limit_check(context,
-                                               server_group_members=count + 1)
-                        except exception.OverQuota:
-                            msg = _("Quota exceeded, too many servers in "
-                                    "group")
-                            raise exception.QuotaError(msg)
-
-                    objects.InstanceGroup.add_members(context,
-                                                      instance_group.uuid,
-                                                      [instance.uuid])
-
                 # send a state update notification for the initial create to
                 # show it going from non-existent to BUILDING
                 notifications.send_update_with_states(context, instance, None,
                         vm_states.BUILDING, None, None, service="api")
 
+            if instance_group:
+                objects.InstanceGroup.add_members(context,
+                        instance_group.uuid,
+                        [instance.uuid for instance in instances])
+
         # In the case of any exceptions, attempt DB cleanup and rollback the
         # quota reservations.
         except Exception:
@@ -2024,7 +2031,7 @@ class API(base.Base):
 
     def get_all(self, context, search_opts=None, limit=None, marker=None,
                 want_objects=False, expected_attrs=None, sort_keys=None,
-                sort_dirs=None):
+                sort_dirs=None, stale_ok=False):
         """Get all instances filtered by one of the given parameters.
 
         If there is no filter and the context is an admin, it will retrieve
@@ -2038,6 +2045,10 @@ class API(base.Base):
         secondary sort ket, etc.). For each sort key, the associated sort
         direction is based on the list of sort directions in the 'sort_dirs'
         parameter.
+
+        When 'stale_ok' is True the instances may be read from the database
+        replica, and miss the changes of the last seconds. This is only meant
+        for read-only listings returned to the user.
         """
 
         # TODO(bcwaldon): determine the best argument for target here
@@ -2119,7 +2130,7 @@ class API(base.Base):
 
         inst_models = self._get_instances_by_filters(context, filters,
                 limit=limit, marker=marker, expected_attrs=expected_attrs,
-                sort_keys=sort_keys, sort_dirs=sort_dirs)
+                sort_keys=sort_keys, sort_dirs=sort_dirs, stale_ok=stale_ok)
 
         if filter_ip:
             inst_models = self._ip_filter(inst_models, filters, orig_limit)
@@ -2162,12 +2173,17 @@ class API(base.Base):
 
     def _get_instances_by_filters(self, context, filters,
                                   limit=None, marker=None, expected_attrs=None,
-                                  sort_keys=None, sort_dirs=None):
+                                  sort_keys=None, sort_dirs=None,
+                                  stale_ok=False):
         fields = ['metadata', 'system_metadata', 'info_cache',
                   'security_groups']
         if expected_attrs:
             fields.extend(expected_attrs)
-        return objects.InstanceList.get_by_filters(
+        if stale_ok:
+            get_by_filters = objects.InstanceList.get_by_filters_stale_ok
+        else:
+            get_by_filters = objects.InstanceList.get_by_filters
+        return get_by_filters(
             context, filters=filters, limit=limit, marker=marker,
             expected_attrs=fields, sort_keys=sort_keys, sort_dirs=sort_dirs)
 
@@ -3576,6 +3592,27 @@ class API(base.Base):
         return host_statuses
 
 
+_HYPERVISOR_CACHE = None
+_HYPERVISOR_STATS_KEY = 'hypervisor-statistics'
+_HYPERVISOR_NODES_KEY = 'hypervisor-compute-nodes'
+
+
+def _get_hypervisor_cache():
+    global _HYPERVISOR_CACHE
+
+    if _HYPERVISOR_CACHE is None:
+        _HYPERVISOR_CACHE = cache_utils.get_client(
+            expiration_time=CONF.hypervisor_cache_seconds)
+    return _HYPERVISOR_CACHE
+
+
+def reset_hypervisor_cache():
+    """Reset the hypervisor cache client, mainly for testing purposes."""
+    global _HYPERVISOR_CACHE
+
+    _HYPERVISOR_CACHE = None
+
+
 class HostAPI(base.Base):
     """Sub-set of the Compute Manager API for managing host operations."""
 
@@ -3693,6 +3730,7 @@ class HostAPI(base.Base):
     def _service_delete(self, context, service_id):
         """Performs the actual Service deletion operation."""
         objects.Service.get_by_id(context, service_id).destroy()
+        self.invalidate_hypervisor_cache()
 
     def service_delete(self, context, service_id):
         """Deletes the specified service."""
@@ -3717,15 +3755,51 @@ class HostAPI(base.Base):
         """Return compute node entry for particular integer ID."""
         return objects.ComputeNode.get_by_id(context, int(compute_id))
 
+    def _get_cached(self, key, creator):
+        """Return a cached hypervisor view or build and cache it.
+
+        Values are stored with the time they were built so that the
+        configured hypervisor_cache_seconds is honoured whatever expiration
+        the cache backend applies.
+        """
+        max_age = CONF.hypervisor_cache_seconds
+        if not max_age:
+            return creator()
+        cache = _get_hypervisor_cache()
+        cached = cache.get(key)
+        now = timeutils.utcnow_ts()
+        if cached is not None and now - cached[0] < max_age:
+            return cached[1]
+        value = creator()
+        cache.set(key, (now, value))
+        return value
+
+    def invalidate_hypervisor_cache(self):
+        """Drop the cached hypervisor statistics and compute node list."""
+        if CONF.hypervisor_cache_seconds:
+            _get_hypervisor_cache().delete_multi([_HYPERVISOR_STATS_KEY,
+                                                  _HYPERVISOR_NODES_KEY])
+
     def compute_node_get_all(self, context):
-        return objects.ComputeNodeList.get_all(context)
+        if not CONF.hypervisor_cache_seconds:
+            return objects.ComputeNodeList.get_all(context)
+        # NOTE: The list is cached as a primitive so that it can be shared
+        # through memcached and bound to the caller's context on the way out.
+        def _get_all():
+            return objects.ComputeNodeList.get_all(context).obj_to_primitive()
+
+        primitive = self._get_cached(_HYPERVISOR_NODES_KEY, _get_all)
+        return objects.ComputeNodeList.obj_from_primitive(primitive,
+                                                          context=context)
 
     def compute_node_search_by_hypervisor(self, context, hypervisor_match):
         return objects.ComputeNodeList.get_by_hypervisor(context,
                                                          hypervisor_match)
 
     def compute_node_statistics(self, context):
-        return self.db.compute_node_statistics(context)
+        return self._get_cached(
+            _HYPERVISOR_STATS_KEY,
+            lambda: self.db.compute_node_statistics(context))
 
 
 class InstanceActionAPI(base.Base):
@@ -3749,6 +3823,7 @@ class AggregateAPI(base.Base):
     def __init__(self, **kwargs):
         self.compute_rpcapi = compute_rpcapi.ComputeAPI()
         self.scheduler_client = scheduler_client.SchedulerClient()
+        self.image_api = image.API()
         super(AggregateAPI, self).__init__(**kwargs)
 
     @wrap_exception()
@@ -3923,6 +3998,31 @@ class AggregateAPI(base.Base):
                                                     aggregate_payload)
         return aggregate
 
+    @wrap_exception()
+    def cache_images(self, context, aggregate_id, image_ids, pin=False):
+        """Fetch images into the image cache of the aggregate hosts.
+
+        The images are fetched asynchronously by every host. Pinned images
+        are kept in the image caches even when no instance uses them.
+        """
+        aggregate = objects.Aggregate.get_by_id(context, aggregate_id)
+        # validates the images; ImageNotFound is raised if invalid
+        for image_id in image_ids:
+            self.image_api.get(context, image_id)
+        for host in aggregate.hosts:
+            self.compute_rpcapi.cache_images(context, host=host,
+                                             image_ids=image_ids, pin=pin)
+        return aggregate
+
+    @wrap_exception()
+    def unpin_images(self, context, aggregate_id, image_ids):
+        """Let the image caches of the aggregate hosts remove images."""
+        aggregate = objects.Aggregate.get_by_id(context, aggregate_id)
+        for host in aggregate.hosts:
+            self.compute_rpcapi.unpin_images(context, host=host,
+                                             image_ids=image_ids)
+        return aggregate
+
 
 class KeypairAPI(base.Base):
     """Subset of the Compute Manager API for managing key pairs."""
@@ -676,7 +676,7 @@ class ComputeVirtAPI(virtapi.VirtAPI):
 class ComputeManager(manager.Manager):
     """Manages the running instances from creation to destruction."""
 
-    target = messaging.Target(version='4.11')
+    target = messaging.Target(version='4.12')
 
     # How long to wait in seconds before re-issuing a shutdown
     # signal to an instance during power off.  The overall
@@ -1309,6 +1309,7 @@ class ComputeManager(manager.Manager):
 
     def init_host(self):
         """Initialization for a standalone compute service."""
+        compute_utils.start_event_recorder()
         self.driver.init_host(host=self.host)
         context = nova.context.get_admin_context()
         instances = objects.InstanceList.get_by_host(
@@ -1333,6 +1334,7 @@ class ComputeManager(manager.Manager):
         self.driver.register_event_listener(None)
         self.instance_events.cancel_all_events()
         self.driver.cleanup_host(host=self.host)
+        compute_utils.stop_event_recorder()
 
     def pre_start_hook(self):
         """After the service is initialized, but before we fully bring
@@ -6636,6 +6638,24 @@ class ComputeManager(manager.Manager):
             else:
                 self._process_instance_event(instance, event)
 
+    @wrap_exception()
+    def cache_images(self, context, image_ids, pin=False):
+        """Fetch images into the image cache of this host."""
+        try:
+            self.driver.cache_images(context, image_ids, pin=pin)
+        except NotImplementedError:
+            LOG.warning(_LW('Caching images is not supported by the %s '
+                            'driver'), self.driver.__class__.__name__)
+
+    @wrap_exception()
+    def unpin_images(self, context, image_ids):
+        """Let pinned images be removed from the image cache of this host."""
+        try:
+            self.driver.unpin_images(context, image_ids)
+        except NotImplementedError:
+            LOG.warning(_LW('Caching images is not supported by the %s '
+                            'driver'), self.driver.__class__.__name__)
+
     @periodic_task.periodic_task(spacing=CONF.image_cache_manager_interval,
                                  external_process_ok=True)
     def _run_image_cache_manager_pass(self, context):
@@ -17,6 +17,7 @@ import nova.compute.manager
 import nova.compute.monitors
 import nova.compute.resource_tracker
 import nova.compute.rpcapi
+import nova.compute.utils
 import nova.conf
 
 
@@ -34,6 +35,7 @@ def list_opts():
              nova.compute.resource_tracker.resource_tracker_opts,
              nova.compute.resource_tracker.allocation_ratio_opts,
              nova.compute.rpcapi.rpcapi_opts,
+             nova.compute.utils.event_recorder_opts,
          )),
         ('upgrade_levels',
          itertools.chain(
@@ -328,6 +328,7 @@ class ComputeAPI(object):
         * 4.9  - Add live_migration_force_complete()
         * 4.10  - Add live_migration_abort()
         * 4.11 - Allow block_migration and disk_over_commit be None
+        * 4.12 - Add cache_images() and unpin_images()
     '''
 
     VERSION_ALIASES = {
@@ -427,6 +428,11 @@ class ComputeAPI(object):
                                     version=version)
         cctxt.cast(ctxt, 'attach_volume', instance=instance, bdm=bdm)
 
+    def cache_images(self, ctxt, host, image_ids, pin=False):
+        version = '4.12'
+        cctxt = self.client.prepare(server=host, version=version)
+        cctxt.cast(ctxt, 'cache_images', image_ids=image_ids, pin=pin)
+
     def change_instance_metadata(self, ctxt, instance, diff):
         version = '4.0'
         cctxt = self.client.prepare(server=_compute_host(None, instance),
@@ -937,6 +943,11 @@ class ComputeAPI(object):
                    instance=instance, bdms=bdms,
                    reservations=reservations)
 
+    def unpin_images(self, ctxt, host, image_ids):
+        version = '4.12'
+        cctxt = self.client.prepare(server=host, version=version)
+        cctxt.cast(ctxt, 'unpin_images', image_ids=image_ids)
+
     def unpause_instance(self, ctxt, instance):
         version = '4.0'
         cctxt = self.client.prepare(server=_compute_host(None, instance),
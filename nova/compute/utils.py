@@ -14,19 +14,24 @@
 
 """Compute-related Utilities and helpers."""
 
+import collections
 import itertools
 import string
+import threading
 import traceback
 
 import netifaces
 from oslo_config import cfg
 from oslo_log import log
+from oslo_service import loopingcall
 import six
 
 from nova import block_device
 from nova.compute import power_state
 from nova.compute import task_states
+from nova import context as nova_context
 from nova import exception
+from nova.i18n import _LE
 from nova.i18n import _LW
 from nova.network import model as network_model
 from nova import notifications
@@ -35,10 +40,32 @@ from nova import rpc
 from nova import utils
 from nova.virt import driver
 
+event_recorder_opts = [
+    cfg.IntOpt('instance_event_flush_interval',
+               default=0,
+               min=0,
+               help='Number of seconds nova-compute may buffer the start and '
+                    'finish of instance action events before writing them '
+                    'to the database in one batch. The events of an '
+                    'operation completing within the interval are written '
+                    'as a single row. Buffered events are written when the '
+                    'service stops, but are lost if it crashes. 0 writes '
+                    'every event right away. All nova-conductor services '
+                    'must be upgraded before this is enabled.'),
+    cfg.IntOpt('instance_event_flush_size',
+               default=100,
+               min=1,
+               help='Number of buffered instance action events that triggers '
+                    'a write before instance_event_flush_interval elapses.'),
+]
+
 CONF = cfg.CONF
+CONF.register_opts(event_recorder_opts)
 CONF.import_opt('host', 'nova.netconf')
 LOG = log.getLogger(__name__)
 
+_EVENT_RECORDER = None
+
 
 def exception_to_dict(fault, message=None):
     """Converts exceptions to a dict for use in notifications."""
@@ -502,6 +529,105 @@ def remove_shelved_keys_from_system_metadata(instance):
             del (instance.system_metadata[key])
 
 
+class BufferedEventRecorder(object):
+    """Buffers instance action events and records them in batches.
+
+    The start and finish of an event are merged while they are buffered,
+    so an operation finishing before the buffer is flushed costs a single
+    row. The buffer is flushed periodically, once it holds flush_size
+    events and when the recorder is stopped.
+    """
+
+    def __init__(self, flush_interval, flush_size):
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self._events = collections.OrderedDict()
+        self._lock = threading.Lock()
+        # NOTE: Batches are recorded one at a time and in order, so that the
+        # finish of an event is never recorded before its start.
+        self._flush_lock = threading.Lock()
+        self._timer = None
+
+    def start(self):
+        self._timer = loopingcall.FixedIntervalLoopingCall(self.flush)
+        self._timer.start(interval=self.flush_interval,
+                          initial_delay=self.flush_interval)
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.stop()
+            self._timer = None
+        self.flush()
+
+    def _add(self, context, values):
+        key = (values['request_id'], values['instance_uuid'],
+               values['event'])
+        with self._lock:
+            event = self._events.get(key)
+            if event is None:
+                # NOTE: The events are recorded with an admin context, so
+                # remember whether the original context allowed falling back
+                # to the last action of the instance.
+                values['use_last_action'] = not context.project_id
+                self._events[key] = values
+            else:
+                event.update(values)
+            full = len(self._events) >= self.flush_size
+        if full:
+            self.flush()
+
+    def event_start(self, context, instance_uuid, event_name):
+        values = objects.InstanceActionEvent.pack_action_event_start(
+            context, instance_uuid, event_name)
+        values['start_time'] = utils.strtime(values['start_time'])
+        self._add(context, values)
+
+    def event_finish(self, context, instance_uuid, event_name, exc_val=None,
+                     exc_tb=None):
+        if exc_val:
+            exc_val = six.text_type(exc_val)
+        if exc_tb and not isinstance(exc_tb, six.string_types):
+            exc_tb = ''.join(traceback.format_tb(exc_tb))
+        values = objects.InstanceActionEvent.pack_action_event_finish(
+            context, instance_uuid, event_name, exc_val=exc_val,
+            exc_tb=exc_tb)
+        values['finish_time'] = utils.strtime(values['finish_time'])
+        self._add(context, values)
+
+    def flush(self):
+        """Record the buffered events."""
+        with self._flush_lock:
+            with self._lock:
+                events = list(self._events.values())
+                self._events.clear()
+            if not events:
+                return
+            try:
+                objects.InstanceActionEventList.record_events(
+                    nova_context.get_admin_context(), events)
+            except Exception:
+                LOG.exception(_LE('Failed to record %d instance action '
+                                  'events'), len(events))
+
+
+def start_event_recorder():
+    """Buffer the instance action events reported by this service."""
+    global _EVENT_RECORDER
+    if CONF.instance_event_flush_interval and _EVENT_RECORDER is None:
+        _EVENT_RECORDER = BufferedEventRecorder(
+            CONF.instance_event_flush_interval,
+            CONF.instance_event_flush_size)
+        _EVENT_RECORDER.start()
+
+
+def stop_event_recorder():
+    """Record the buffered instance action events and stop buffering."""
+    global _EVENT_RECORDER
+    recorder, _EVENT_RECORDER = _EVENT_RECORDER, None
+    if recorder is not None:
+        recorder.stop()
+
+
 class EventReporter(object):
     """Context manager to report instance action events."""
 
@@ -511,17 +637,26 @@ class EventReporter(object):
         self.instance_uuids = instance_uuids
 
     def __enter__(self):
+        recorder = _EVENT_RECORDER
         for uuid in self.instance_uuids:
-            objects.InstanceActionEvent.event_start(
-                self.context, uuid, self.event_name, want_result=False)
+            if recorder is not None:
+                recorder.event_start(self.context, uuid, self.event_name)
+            else:
+                objects.InstanceActionEvent.event_start(
+                    self.context, uuid, self.event_name, want_result=False)
 
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
+        recorder = _EVENT_RECORDER
         for uuid in self.instance_uuids:
-            objects.InstanceActionEvent.event_finish_with_failure(
-                self.context, uuid, self.event_name, exc_val=exc_val,
-                exc_tb=exc_tb, want_result=False)
+            if recorder is not None:
+                recorder.event_finish(self.context, uuid, self.event_name,
+                                      exc_val=exc_val, exc_tb=exc_tb)
+            else:
+                objects.InstanceActionEvent.event_finish_with_failure(
+                    self.context, uuid, self.event_name, exc_val=exc_val,
+                    exc_tb=exc_tb, want_result=False)
         return False
 
 
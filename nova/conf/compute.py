@@ -55,6 +55,16 @@ compute_opts = [
                     'that images will be automatically converted to volumes '
                     'and boot instances from volumes - it just means that all '
                     'requests that attempt to create a local disk will fail.'),
+    cfg.IntOpt('hypervisor_cache_seconds',
+               default=0,
+               min=0,
+               help='Number of seconds the API may serve the hypervisor '
+                    'statistics and the list of compute nodes used by the '
+                    'hypervisors API from a cache instead of the database. '
+                    'The cache is shared between API workers when the '
+                    '[cache] section configures a memcached backend and is '
+                    'kept per process otherwise. Deleting a compute service '
+                    'invalidates it. 0 disables the cache.'),
 ]
 
 
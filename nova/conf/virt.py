@@ -269,6 +269,30 @@ Interdependencies to other options:
 * ``compute_driver``: Only the libvirt driver uses this option.
 """)
 
+stream_image_downloads = cfg.BoolOpt(
+    'stream_image_downloads',
+    default=False,
+    help="""Stream image downloads through a pipeline writing the image file.
+
+The image data is checksummed while it is downloaded and blocks of zeros are
+skipped instead of written, so raw images are written sparse in a single
+pass and no separate read of the file is needed to verify it.
+
+Possible values:
+
+* True: Image data is streamed, checksummed and written sparse
+* False: Image data is written as it is received
+
+Services which consume this:
+
+* nova-compute
+
+Interdependencies to other options:
+
+* ``[glance] allowed_direct_url_schemes``: Images are still transferred by
+  the direct URL download modules when they are configured.
+""")
+
 injected_network_template = cfg.StrOpt(
     'injected_network_template',
     default=paths.basedir_def('nova/virt/interfaces.template'),
@@ -313,6 +337,7 @@ ALL_OPTS = [vcpu_pin_set,
             firewall_driver,
             allow_same_net_traffic,
             force_raw_images,
+            stream_image_downloads,
             injected_network_template,
             virt_mkfs,
             resize_fs_using_block_device,
@@ -94,13 +94,15 @@ def create_context_manager(connection):
 ###################
 
 
-def select_db_reader_mode(f):
+def select_db_reader_mode(f=None, max_staleness=None):
     """Decorator to select synchronous or asynchronous reader mode.
 
     The kwarg argument 'use_slave' defines reader mode. Asynchronous reader
     will be used if 'use_slave' is True and synchronous reader otherwise.
+    Reads declaring a 'max_staleness' in seconds may also be routed to the
+    asynchronous reader when read replica routing is enabled.
     """
-    return IMPL.select_db_reader_mode(f)
+    return IMPL.select_db_reader_mode(f, max_staleness=max_staleness)
 
 
 ###################
@@ -743,6 +745,16 @@ def instance_get_active_by_window_joined(context, begin, end=None,
                                               columns_to_join=columns_to_join)
 
 
+def instance_get_usage_by_window(context, begin, end, project_id=None):
+    """Get the usage totals of the instances active during a time window.
+
+    One dict of totals is returned per project, optionally only for the
+    given project_id.
+    """
+    return IMPL.instance_get_usage_by_window(context, begin, end,
+                                             project_id=project_id)
+
+
 def instance_get_all_by_host(context, host, columns_to_join=None):
     """Get all instances belonging to a host."""
     return IMPL.instance_get_all_by_host(context, host, columns_to_join)
@@ -1872,6 +1884,11 @@ def action_event_finish(context, values):
     return IMPL.action_event_finish(context, values)
 
 
+def action_events_record(context, events):
+    """Record the start and finish of many instance action events."""
+    return IMPL.action_events_record(context, events)
+
+
 def action_events_get(context, action_id):
     """Get the events by action id."""
     return IMPL.action_events_get(context, action_id)
@@ -41,9 +41,11 @@ from six.moves import range
 import sqlalchemy as sa
 from sqlalchemy import and_
 from sqlalchemy.exc import NoSuchTableError
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy import MetaData
 from sqlalchemy import or_
 from sqlalchemy.orm import aliased
+from sqlalchemy.orm import attributes as orm_attributes
 from sqlalchemy.orm import contains_eager
 from sqlalchemy.orm import joinedload
 from sqlalchemy.orm import joinedload_all
@@ -63,6 +65,7 @@ from nova.compute import task_states
 from nova.compute import vm_states
 import nova.context
 from nova.db.sqlalchemy import models
+from nova.db.sqlalchemy import profiler
 from nova import exception
 from nova.i18n import _, _LI, _LE, _LW
 from nova.objects import fields
@@ -75,6 +78,42 @@ db_opts = [
                help='When set, compute API will consider duplicate hostnames '
                     'invalid within the specified scope, regardless of case. '
                     'Should be empty, "project" or "global".'),
+    cfg.BoolOpt('db_read_replica_routing',
+                default=False,
+                help='When set, read-only DB API calls that declare a '
+                     'staleness tolerance are sent to the database '
+                     'slave_connection as long as the measured replication '
+                     'lag is within that tolerance. Calls fall back to the '
+                     'primary database when the replica lags behind or '
+                     'cannot be reached.'),
+    cfg.DictOpt('db_read_replica_max_staleness',
+                default={},
+                help='Per-call override of the replication lag, in seconds, '
+                     'that a read-only DB API call tolerates, keyed by the '
+                     'name of the decorated function. For example '
+                     '"_get_by_filters_stale_ok_impl:10,'
+                     '_db_instance_get_active_by_window_joined:120". '
+                     'A value of 0 pins the call to the primary database.'),
+    cfg.IntOpt('db_replica_lag_check_interval',
+               default=10,
+               min=1,
+               help='Number of seconds a measured replication lag is '
+                    'reused before the replica is checked again.'),
+    cfg.BoolOpt('db_profiler_enabled',
+                default=False,
+                help='Record per DB API function call counts, row counts, '
+                     'query time and transaction time, attributed to the '
+                     'REST or RPC operation that made the call. The '
+                     'aggregated summary is included in the Guru Meditation '
+                     'Report. This adds overhead to every query and is '
+                     'meant for troubleshooting.'),
+    cfg.FloatOpt('db_profiler_slow_query_threshold',
+                 default=1.0,
+                 min=0,
+                 help='When the DB API profiler is enabled, log queries '
+                      'taking at least this many seconds together with the '
+                      'DB API function, operation and request id that ran '
+                      'them. 0 disables slow query logging.'),
 ]
 
 api_db_opts = [
@@ -168,6 +207,8 @@ def _context_manager_from_context(context):
 def configure(conf):
     main_context_manager.configure(**_get_db_conf(conf.database))
     api_context_manager.configure(**_get_db_conf(conf.api_database))
+    profiler.setup(conf.db_profiler_enabled,
+                   slow_query_threshold=conf.db_profiler_slow_query_threshold)
 
 
 def create_context_manager(connection=None):
@@ -258,15 +299,111 @@ def require_aggregate_exists(f):
     return wrapper
 
 
-def select_db_reader_mode(f):
+class ReplicaLagMonitor(object):
+    """Estimates how far the slave database lags behind the primary.
+
+    The estimate compares the newest services.updated_at heartbeat seen by
+    the primary and by the slave connection, so it only needs read access
+    to the nova database. Measurements are cached for
+    CONF.db_replica_lag_check_interval seconds so that the check itself does
+    not add load to the primary.
+    """
+
+    def __init__(self):
+        self._lag = None
+        self._checked_at = None
+
+    def reset(self):
+        self._lag = None
+        self._checked_at = None
+
+    @staticmethod
+    def _newest_heartbeat(reader_mode):
+        context = nova.context.get_admin_context()
+        with reader_mode.using(context):
+            return context.session.query(
+                func.max(models.Service.updated_at)).scalar()
+
+    def _measure(self):
+        if not CONF.database.slave_connection:
+            # NOTE: the async reader uses the primary without a slave
+            # connection, so there is nothing that can lag behind.
+            return 0
+        try:
+            primary = self._newest_heartbeat(main_context_manager.reader)
+            replica = self._newest_heartbeat(main_context_manager.async)
+        except db_exc.DBError:
+            LOG.warning(_LW('Unable to measure database replication lag, '
+                            'sending reads to the primary database'),
+                        exc_info=True)
+            return None
+        if primary is None:
+            return 0
+        if replica is None:
+            return None
+        return max(0, timeutils.delta_seconds(replica, primary))
+
+    def get_lag(self):
+        """Return the replication lag in seconds or None if unknown."""
+        now = timeutils.utcnow()
+        if (self._checked_at is None or
+                timeutils.delta_seconds(self._checked_at, now) >=
+                CONF.db_replica_lag_check_interval):
+            self._lag = self._measure()
+            self._checked_at = now
+        return self._lag
+
+
+_replica_lag_monitor = ReplicaLagMonitor()
+
+
+def _get_max_staleness(f, max_staleness):
+    overrides = CONF.db_read_replica_max_staleness
+    if f.__name__ in overrides:
+        try:
+            return int(overrides[f.__name__])
+        except ValueError:
+            LOG.warning(_LW('Ignoring invalid db_read_replica_max_staleness '
+                            'value %(value)s for %(name)s'),
+                        {'value': overrides[f.__name__], 'name': f.__name__})
+    return max_staleness
+
+
+def _select_reader_mode(f, use_slave, max_staleness):
+    if use_slave:
+        return main_context_manager.async
+    if not CONF.db_read_replica_routing:
+        return main_context_manager.reader
+    max_staleness = _get_max_staleness(f, max_staleness)
+    if not max_staleness:
+        return main_context_manager.reader
+    lag = _replica_lag_monitor.get_lag()
+    if lag is None or lag > max_staleness:
+        LOG.debug('Replication lag %(lag)s exceeds the %(max)ss tolerated by '
+                  '%(name)s, reading from the primary database',
+                  {'lag': lag, 'max': max_staleness, 'name': f.__name__})
+        return main_context_manager.reader
+    return main_context_manager.async
+
+
+def select_db_reader_mode(f=None, max_staleness=None):
     """Decorator to select synchronous or asynchronous reader mode.
 
     The kwarg argument 'use_slave' defines reader mode. Asynchronous reader
     will be used if 'use_slave' is True and synchronous reader otherwise.
     If 'use_slave' is not specified default value 'False' will be used.
 
+    The decorator can also be called with a 'max_staleness' argument, the
+    number of seconds of replication lag the wrapped read tolerates. When
+    CONF.db_read_replica_routing is enabled such reads are sent to the
+    asynchronous reader while the measured lag stays within that tolerance,
+    even if 'use_slave' is False.
+
     Wrapped function must have a context in the arguments.
     """
+    if f is None:
+        return functools.partial(select_db_reader_mode,
+                                 max_staleness=max_staleness)
 
     @functools.wraps(f)
     def wrapper(*args, **kwargs):
@@ -275,11 +412,7 @@ def select_db_reader_mode(f):
 
         context = keyed_args['context']
         use_slave = keyed_args.get('use_slave', False)
-
-        if use_slave:
-            reader_mode = main_context_manager.async
-        else:
-            reader_mode = main_context_manager.reader
+        reader_mode = _select_reader_mode(f, use_slave, max_staleness)
 
         with reader_mode.using(context):
             return f(*args, **kwargs)
@@ -2561,6 +2694,75 @@ def instance_get_active_by_window_joined(context, begin, end=None,
     return _instances_fill_metadata(context, query.all(), manual_joins)
 
 
+class _SecondsBetween(sql.expression.FunctionElement):
+    """Number of seconds elapsed between two datetime expressions."""
+
+    type = sa.Float()
+    name = 'seconds_between'
+
+
+@compiles(_SecondsBetween)
+def _compile_seconds_between(element, compiler, **kw):
+    start, stop = list(element.clauses)
+    return 'TIMESTAMPDIFF(MICROSECOND, %s, %s) / 1000000.0' % (
+        compiler.process(start), compiler.process(stop))
+
+
+@compiles(_SecondsBetween, 'postgresql')
+def _compile_seconds_between_postgresql(element, compiler, **kw):
+    start, stop = list(element.clauses)
+    return 'EXTRACT(EPOCH FROM (%s - %s))' % (
+        compiler.process(stop), compiler.process(start))
+
+
+@compiles(_SecondsBetween, 'sqlite')
+def _compile_seconds_between_sqlite(element, compiler, **kw):
+    start, stop = list(element.clauses)
+    return '((julianday(%s) - julianday(%s)) * 86400.0)' % (
+        compiler.process(stop), compiler.process(start))
+
+
+@require_context
+@pick_context_manager_reader_allow_async
+def instance_get_usage_by_window(context, begin, end, project_id=None):
+    """Return the usage of the instances active during a window per project.
+
+    This computes in the database the totals that the simple tenant usage
+    API otherwise computes from every instance active during the window.
+    """
+    instance = models.Instance
+    # Only charge for the part of the lifetime of the instances that is
+    # within the window.
+    start = sa.case([(instance.launched_at > begin, instance.launched_at)],
+                    else_=begin)
+    stop = sa.case([(and_(instance.terminated_at != null(),
+                          instance.terminated_at < end),
+                     instance.terminated_at)],
+                   else_=end)
+    hours = _SecondsBetween(start, stop) / 3600.0
+
+    query = context.session.query(
+        instance.project_id,
+        func.sum(hours),
+        func.sum(hours * instance.vcpus),
+        func.sum(hours * instance.memory_mb),
+        func.sum(hours * (instance.root_gb + instance.ephemeral_gb)))
+    # NOTE: Same window as instance_get_active_by_window_joined().
+    query = query.filter(or_(instance.terminated_at == null(),
+                             instance.terminated_at > begin))
+    query = query.filter(instance.launched_at < end)
+    if project_id:
+        query = query.filter_by(project_id=project_id)
+    query = query.group_by(instance.project_id)
+
+    return [{'project_id': row[0],
+             'hours': float(row[1] or 0),
+             'vcpus_hours': float(row[2] or 0),
+             'memory_mb_hours': float(row[3] or 0),
+             'local_gb_hours': float(row[4] or 0)}
+            for row in query.all()]
+
+
 def _instance_get_all_query(context, project_only=False, joins=None):
     if joins is None:
         joins = ['info_cache', 'security_groups']
@@ -2707,38 +2909,100 @@ def instance_update_and_get_original(context, instance_uuid, values,
         context, instance_uuid, values, expected, original=instance_ref))
 
 
+def _instance_metadata_diff(existing, metadata, delete):
+    """Compare existing and requested metadata key/value pairs.
+
+    Returns a tuple of the pairs to add, the pairs whose value changed and
+    the keys to delete. Pairs whose value did not change are left out so
+    that no-op writes can be skipped.
+    """
+    to_add = {}
+    to_update = {}
+    for key, value in metadata.items():
+        if key not in existing:
+            to_add[key] = value
+        elif existing[key] != value:
+            to_update[key] = value
+    to_delete = ([key for key in existing if key not in metadata]
+                 if delete else [])
+    return to_add, to_update, to_delete
+
+
+def _instance_metadata_bulk_apply(context, model, instance_uuid, to_add,
+                                  to_update, to_delete, hard_delete=False,
+                                  read_deleted=None):
+    """Apply a metadata diff with at most one statement per kind of change.
+
+    Deleted keys are removed with a single (soft) DELETE, changed values are
+    written with a single UPDATE using a CASE expression and new keys are
+    added with a single multi-row INSERT.
+    """
+    query = model_query(context, model, read_deleted=read_deleted).\
+        filter_by(instance_uuid=instance_uuid)
+
+    if to_delete:
+        condemned = query.filter(model.key.in_(to_delete))
+        if hard_delete:
+            condemned.delete(synchronize_session=False)
+        else:
+            condemned.soft_delete(synchronize_session=False)
+
+    if to_update:
+        query.filter(model.key.in_(list(to_update))).update(
+            {'value': sa.case(list(to_update.items()), value=model.key)},
+            synchronize_session=False)
+
+    if to_add:
+        now = timeutils.utcnow()
+        context.session.execute(model.__table__.insert().values(
+            [{'created_at': now, 'deleted': 0, 'instance_uuid': instance_uuid,
+              'key': key, 'value': value}
+             for key, value in to_add.items()]))
+
+
 # NOTE(danms): This updates the instance's metadata list in-place and in
 # the database to avoid stale data and refresh issues. It assumes the
 # delete=True behavior of instance_metadata_update(...)
 def _instance_metadata_update_in_place(context, instance, metadata_type, model,
                                        metadata):
-    metadata = dict(metadata)
-    to_delete = []
-    for keyvalue in instance[metadata_type]:
-        key = keyvalue['key']
-        if key in metadata:
-            keyvalue['value'] = metadata.pop(key)
-        elif key not in metadata:
-            to_delete.append(keyvalue)
+    items = instance[metadata_type]
+    existing = {item['key']: item['value'] for item in items}
+    to_add, to_update, to_delete = _instance_metadata_diff(existing,
+                                                           metadata, True)
+    if not (to_add or to_update or to_delete):
+        return
 
     # NOTE: we have to hard_delete here otherwise we will get more than one
     # system_metadata record when we read deleted for an instance;
     # regular metadata doesn't have the same problem because we don't
-    # allow reading deleted regular metadata anywhere.
-    if metadata_type == 'system_metadata':
-        for condemned in to_delete:
-            context.session.delete(condemned)
-            instance[metadata_type].remove(condemned)
-    else:
-        for condemned in to_delete:
-            condemned.soft_delete(context.session)
-
-    for key, value in metadata.items():
-        newitem = model()
-        newitem.update({'key': key, 'value': value,
-                        'instance_uuid': instance['uuid']})
-        context.session.add(newitem)
-        instance[metadata_type].append(newitem)
+    # allow reading deleted regular metadata anywhere. The system_metadata
+    # relationship does not filter on deleted so neither do we.
+    hard_delete = metadata_type == 'system_metadata'
+    _instance_metadata_bulk_apply(
+        context, model, instance['uuid'], to_add, to_update, to_delete,
+        hard_delete=hard_delete,
+        read_deleted='yes' if hard_delete else 'no')
+
+    # The rows were written outside of the ORM, so bring the loaded
+    # collection in line with the database without flushing it again.
+    kept = []
+    for item in items:
+        key = item['key']
+        if key in to_delete:
+            if hard_delete:
+                context.session.expunge(item)
+            else:
+                context.session.expire(item)
+            continue
+        if key in to_update:
+            orm_attributes.set_committed_value(item, 'value', to_update[key])
+        kept.append(item)
+    if to_add:
+        kept.extend(model_query(context, model, read_deleted='no').
+                    filter_by(instance_uuid=instance['uuid']).
+                    filter(model.key.in_(list(to_add))).
+                    all())
+    orm_attributes.set_committed_value(instance, metadata_type, kept)
 
 
 def _instance_update(context, instance_uuid, values, expected, original=None):
@@ -5312,27 +5576,19 @@ def instance_metadata_delete(context, instance_uuid, key):
 @oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
 @pick_context_manager_writer
 def instance_metadata_update(context, instance_uuid, metadata, delete):
-    all_keys = metadata.keys()
-    if delete:
-        _instance_metadata_get_query(context, instance_uuid).\
-            filter(~models.InstanceMetadata.key.in_(all_keys)).\
-            soft_delete(synchronize_session=False)
-
-    already_existing_keys = []
-    meta_refs = _instance_metadata_get_query(context, instance_uuid).\
-        filter(models.InstanceMetadata.key.in_(all_keys)).\
-        all()
-
-    for meta_ref in meta_refs:
-        already_existing_keys.append(meta_ref.key)
-        meta_ref.update({"value": metadata[meta_ref.key]})
-
-    new_keys = set(all_keys) - set(already_existing_keys)
-    for key in new_keys:
-        meta_ref = models.InstanceMetadata()
-        meta_ref.update({"key": key, "value": metadata[key],
-                         "instance_uuid": instance_uuid})
-        context.session.add(meta_ref)
+    query = _instance_metadata_get_query(context, instance_uuid).\
+        with_entities(models.InstanceMetadata.key,
+                      models.InstanceMetadata.value)
+    if not delete:
+        query = query.filter(models.InstanceMetadata.key.in_(
+            list(metadata)))
+    existing = dict(query.all())
+
+    to_add, to_update, to_delete = _instance_metadata_diff(existing,
+                                                           metadata, delete)
+    _instance_metadata_bulk_apply(context, models.InstanceMetadata,
+                                  instance_uuid, to_add, to_update,
+                                  to_delete)
 
     return metadata
 
@@ -5364,27 +5620,19 @@ def instance_system_metadata_get(context, instance_uuid):
 @require_context
 @pick_context_manager_writer
 def instance_system_metadata_update(context, instance_uuid, metadata, delete):
-    all_keys = metadata.keys()
-    if delete:
-        _instance_system_metadata_get_query(context, instance_uuid).\
-            filter(~models.InstanceSystemMetadata.key.in_(all_keys)).\
-            soft_delete(synchronize_session=False)
-
-    already_existing_keys = []
-    meta_refs = _instance_system_metadata_get_query(context, instance_uuid).\
-        filter(models.InstanceSystemMetadata.key.in_(all_keys)).\
-        all()
-
-    for meta_ref in meta_refs:
-        already_existing_keys.append(meta_ref.key)
-        meta_ref.update({"value": metadata[meta_ref.key]})
-
-    new_keys = set(all_keys) - set(already_existing_keys)
-    for key in new_keys:
-        meta_ref = models.InstanceSystemMetadata()
-        meta_ref.update({"key": key, "value": metadata[key],
-                         "instance_uuid": instance_uuid})
-        context.session.add(meta_ref)
+    query = _instance_system_metadata_get_query(context, instance_uuid).\
+        with_entities(models.InstanceSystemMetadata.key,
+                      models.InstanceSystemMetadata.value)
+    if not delete:
+        query = query.filter(models.InstanceSystemMetadata.key.in_(
+            list(metadata)))
+    existing = dict(query.all())
+
+    to_add, to_update, to_delete = _instance_metadata_diff(existing,
+                                                           metadata, delete)
+    _instance_metadata_bulk_apply(context, models.InstanceSystemMetadata,
+                                  instance_uuid, to_add, to_update,
+                                  to_delete)
 
     return metadata
 
@@ -6062,10 +6310,7 @@ def _action_get_last_created_by_instance_uuid(context, instance_uuid):
     return result
 
 
-@pick_context_manager_writer
-def action_event_start(context, values):
-    """Start an event on an instance action."""
-    convert_objects_related_datetimes(values, 'start_time')
+def _action_get_for_event(context, values, use_last_action):
     action = _action_get_by_request_id(context, values['instance_uuid'],
                                        values['request_id'])
     # When nova-compute restarts, the context is generated again in
@@ -6074,7 +6319,7 @@ def action_event_start(context, values):
     # according to request_id. Try to get the last created action so that
     # init_instance can continue to finish the recovery action, like:
     # powering_off, unpausing, and so on.
-    if not action and not context.project_id:
+    if not action and use_last_action:
         action = _action_get_last_created_by_instance_uuid(
             context, values['instance_uuid'])
 
@@ -6082,7 +6327,10 @@ def action_event_start(context, values):
         raise exception.InstanceActionNotFound(
                                     request_id=values['request_id'],
                                     instance_uuid=values['instance_uuid'])
+    return action
 
+
+def _action_event_start(context, action, values):
     values['action_id'] = action['id']
 
     event_ref = models.InstanceActionEvent()
@@ -6091,27 +6339,7 @@ def action_event_start(context, values):
     return event_ref
 
 
-@pick_context_manager_writer
-def action_event_finish(context, values):
-    """Finish an event on an instance action."""
-    convert_objects_related_datetimes(values, 'start_time', 'finish_time')
-    action = _action_get_by_request_id(context, values['instance_uuid'],
-                                       values['request_id'])
-    # When nova-compute restarts, the context is generated again in
-    # init_host workflow, the request_id was different with the request_id
-    # recorded in InstanceAction, so we can't get the original record
-    # according to request_id. Try to get the last created action so that
-    # init_instance can continue to finish the recovery action, like:
-    # powering_off, unpausing, and so on.
-    if not action and not context.project_id:
-        action = _action_get_last_created_by_instance_uuid(
-            context, values['instance_uuid'])
-
-    if not action:
-        raise exception.InstanceActionNotFound(
-                                    request_id=values['request_id'],
-                                    instance_uuid=values['instance_uuid'])
-
+def _action_event_finish(context, action, values):
     event_ref = model_query(context, models.InstanceActionEvent).\
                             filter_by(action_id=action['id']).\
                             filter_by(event=values['event']).\
@@ -6128,6 +6356,52 @@ def action_event_finish(context, values):
     return event_ref
 
 
+@pick_context_manager_writer
+def action_event_start(context, values):
+    """Start an event on an instance action."""
+    convert_objects_related_datetimes(values, 'start_time')
+    action = _action_get_for_event(context, values,
+                                   use_last_action=not context.project_id)
+    return _action_event_start(context, action, values)
+
+
+@pick_context_manager_writer
+def action_event_finish(context, values):
+    """Finish an event on an instance action."""
+    convert_objects_related_datetimes(values, 'start_time', 'finish_time')
+    action = _action_get_for_event(context, values,
+                                   use_last_action=not context.project_id)
+    return _action_event_finish(context, action, values)
+
+
+@pick_context_manager_writer
+def action_events_record(context, events):
+    """Record the start and finish of many instance action events at once.
+
+    Each item of events holds the values of action_event_start(),
+    action_event_finish() or both, when the event both started and finished
+    since it was last recorded, and a use_last_action flag standing for the
+    context those would have been called with. Events which cannot be
+    matched to their action are logged and skipped.
+    """
+    for values in events:
+        values = dict(values)
+        use_last_action = values.pop('use_last_action', False)
+        convert_objects_related_datetimes(values, 'start_time', 'finish_time')
+        try:
+            action = _action_get_for_event(context, values, use_last_action)
+            if values.get('start_time'):
+                _action_event_start(context, action, values)
+                if values.get('result', '').lower() == 'error':
+                    action.update({'message': 'Error'})
+            else:
+                _action_event_finish(context, action, values)
+        except (exception.InstanceActionNotFound,
+                exception.InstanceActionEventNotFound) as e:
+            LOG.warning(_LW('Unable to record instance action event: %s'),
+                        e.format_message())
+
+
 @pick_context_manager_reader
 def action_events_get(context, action_id):
     events = model_query(context, models.InstanceActionEvent).\
@@ -0,0 +1,266 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Opt-in profiler attributing database load to DB API functions.
+
+When enabled, every statement executed and every transaction run through
+SQLAlchemy is attributed to the outermost public function of
+nova.db.sqlalchemy.api on the call stack, and to the REST or RPC operation
+and request id that triggered it. The aggregated summary is added to the
+Guru Meditation Report of the service.
+"""
+
+import collections
+import functools
+import sys
+import threading
+import time
+
+from oslo_context import context as common_context
+from oslo_log import log as logging
+from oslo_reports import guru_meditation_report as gmr
+from oslo_reports.models import with_default_views as mwdv
+import sqlalchemy as sa
+
+from nova.i18n import _LW
+
+
+LOG = logging.getLogger(__name__)
+
+_DB_API_MODULE = 'nova.db.sqlalchemy.api'
+# NOTE: Names of the decorator closures defined in the DB API module. They
+# are never the function doing the work so they are skipped when attributing.
+_DB_API_WRAPPERS = frozenset(['wrapper', 'wrapped'])
+_UNKNOWN = '<unknown>'
+_QUERY_INFO_KEY = 'nova_profiler_query'
+_TXN_INFO_KEY = 'nova_profiler_txn'
+
+_local = threading.local()
+
+
+class DBAPIStats(object):
+    """Counters for one DB API function called by one operation."""
+
+    __slots__ = ('calls', 'queries', 'rows', 'query_time', 'max_query_time',
+                 'transaction_time', 'last_request_id')
+
+    def __init__(self):
+        self.calls = 0
+        self.queries = 0
+        self.rows = 0
+        self.query_time = 0.0
+        self.max_query_time = 0.0
+        self.transaction_time = 0.0
+        self.last_request_id = None
+
+
+class DBAPIProfiler(object):
+    """Collects per DB API function statistics from SQLAlchemy events."""
+
+    def __init__(self, slow_query_threshold=0):
+        self.slow_query_threshold = slow_query_threshold
+        self._lock = threading.Lock()
+        self._stats = collections.defaultdict(DBAPIStats)
+        self._listening = False
+
+    def start(self):
+        if self._listening:
+            return
+        # NOTE: Listening on the Engine class covers every engine, including
+        # the ones enginefacade creates lazily for cell and API databases.
+        sa.event.listen(sa.engine.Engine, 'before_cursor_execute',
+                        self._before_cursor_execute)
+        sa.event.listen(sa.engine.Engine, 'after_cursor_execute',
+                        self._after_cursor_execute)
+        sa.event.listen(sa.engine.Engine, 'begin', self._begin)
+        sa.event.listen(sa.engine.Engine, 'commit', self._end)
+        sa.event.listen(sa.engine.Engine, 'rollback', self._end)
+        self._listening = True
+
+    def stop(self):
+        if not self._listening:
+            return
+        sa.event.remove(sa.engine.Engine, 'before_cursor_execute',
+                        self._before_cursor_execute)
+        sa.event.remove(sa.engine.Engine, 'after_cursor_execute',
+                        self._after_cursor_execute)
+        sa.event.remove(sa.engine.Engine, 'begin', self._begin)
+        sa.event.remove(sa.engine.Engine, 'commit', self._end)
+        sa.event.remove(sa.engine.Engine, 'rollback', self._end)
+        self._listening = False
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def _get_stats(self, function):
+        return self._stats[(function, get_operation())]
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters,
+                               context, executemany):
+        conn.info.setdefault(_QUERY_INFO_KEY, []).append(
+            (time.time(), find_db_api_function()))
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters,
+                              context, executemany):
+        try:
+            start, function = conn.info[_QUERY_INFO_KEY].pop()
+        except (KeyError, IndexError):
+            return
+        elapsed = time.time() - start
+        rows = max(cursor.rowcount or 0, 0)
+        request_id = get_request_id()
+        with self._lock:
+            stats = self._get_stats(function)
+            stats.queries += 1
+            stats.rows += rows
+            stats.query_time += elapsed
+            stats.max_query_time = max(stats.max_query_time, elapsed)
+            stats.last_request_id = request_id
+        if self.slow_query_threshold and elapsed >= self.slow_query_threshold:
+            LOG.warning(_LW('Slow query in %(function)s took %(elapsed).3fs '
+                            '(operation %(operation)s, request %(request)s): '
+                            '%(statement)s'),
+                        {'function': function, 'elapsed': elapsed,
+                         'operation': get_operation(), 'request': request_id,
+                         'statement': statement[:512]})
+
+    def _begin(self, conn):
+        conn.info[_TXN_INFO_KEY] = (time.time(), find_db_api_function())
+
+    def _end(self, conn):
+        txn = conn.info.pop(_TXN_INFO_KEY, None)
+        if txn is None:
+            return
+        start, function = txn
+        with self._lock:
+            stats = self._get_stats(function)
+            stats.calls += 1
+            stats.transaction_time += time.time() - start
+
+    def get_summary(self):
+        """Return the collected statistics aggregated per DB API function.
+
+        Functions are ordered by the total time spent in their queries, the
+        most expensive first.
+        """
+        summary = {}
+        with self._lock:
+            for (function, operation), stats in self._stats.items():
+                entry = summary.setdefault(function, {
+                    'function': function, 'calls': 0, 'queries': 0,
+                    'rows': 0, 'query_time': 0.0, 'max_query_time': 0.0,
+                    'transaction_time': 0.0, 'operations': {}})
+                entry['calls'] += stats.calls
+                entry['queries'] += stats.queries
+                entry['rows'] += stats.rows
+                entry['query_time'] += stats.query_time
+                entry['max_query_time'] = max(entry['max_query_time'],
+                                              stats.max_query_time)
+                entry['transaction_time'] += stats.transaction_time
+                entry['operations'][operation] = {
+                    'calls': stats.calls,
+                    'queries': stats.queries,
+                    'query_time': round(stats.query_time, 6),
+                    'last_request_id': stats.last_request_id}
+        for entry in summary.values():
+            for key in ('query_time', 'max_query_time', 'transaction_time'):
+                entry[key] = round(entry[key], 6)
+        return sorted(summary.values(), key=lambda e: e['query_time'],
+                      reverse=True)
+
+
+_PROFILER = None
+_REPORT_REGISTERED = False
+
+
+def find_db_api_function():
+    """Return the outermost public DB API function on the call stack."""
+    frame = sys._getframe(1)
+    found = None
+    while frame is not None:
+        if frame.f_globals.get('__name__') == _DB_API_MODULE:
+            name = frame.f_code.co_name
+            if name not in _DB_API_WRAPPERS:
+                if not name.startswith('_') or found is None:
+                    found = name
+        frame = frame.f_back
+    return found or _UNKNOWN
+
+
+def set_operation(operation):
+    """Tag the DB API calls made by this thread with an operation name."""
+    if _PROFILER is not None:
+        _local.operation = operation
+
+
+def get_operation():
+    return getattr(_local, 'operation', None) or _UNKNOWN
+
+
+def get_request_id():
+    ctxt = common_context.get_current()
+    return getattr(ctxt, 'request_id', None)
+
+
+class _ProfiledEndpoint(object):
+    """RPC endpoint proxy tagging DB API calls with the RPC method name."""
+
+    def __init__(self, endpoint):
+        self._endpoint = endpoint
+        self._name = endpoint.__class__.__name__
+
+    def __getattr__(self, name):
+        attr = getattr(self._endpoint, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def wrapper(*args, **kwargs):
+            set_operation('%s.%s' % (self._name, name))
+            return attr(*args, **kwargs)
+        return wrapper
+
+
+def wrap_endpoints(endpoints):
+    """Wrap RPC endpoints so that DB API calls are tagged when profiling."""
+    if _PROFILER is None:
+        return endpoints
+    return [_ProfiledEndpoint(endpoint) for endpoint in endpoints]
+
+
+def get_profiler():
+    return _PROFILER
+
+
+def report_generator():
+    summary = _PROFILER.get_summary() if _PROFILER is not None else []
+    return mwdv.ModelWithDefaultViews(
+        data=collections.OrderedDict((e['function'], e) for e in summary))
+
+
+def setup(enabled, slow_query_threshold=0):
+    """Enable or disable the DB API profiler for this process."""
+    global _PROFILER, _REPORT_REGISTERED
+    if not enabled:
+        if _PROFILER is not None:
+            _PROFILER.stop()
+            _PROFILER = None
+        return
+    if _PROFILER is None:
+        _PROFILER = DBAPIProfiler()
+    if not _REPORT_REGISTERED:
+        gmr.TextGuruMeditation.register_section('DB API Profile',
+                                                report_generator)
+        _REPORT_REGISTERED = True
+    _PROFILER.slow_query_threshold = slow_query_threshold
+    _PROFILER.start()
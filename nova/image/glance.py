@@ -34,13 +34,15 @@ from oslo_service import sslutils
 from oslo_utils import excutils
 from oslo_utils import netutils
 from oslo_utils import timeutils
+from oslo_utils import units
 import six
 from six.moves import range
 import six.moves.urllib.parse as urlparse
 
 from nova import exception
-from nova.i18n import _LE, _LI, _LW
+from nova.i18n import _, _LE, _LI, _LW
 import nova.image.download as image_xfers
+from nova.image import ranged_download
 from nova import objects
 from nova import signature_utils
 
@@ -91,6 +93,19 @@ should be fully qualified urls of the form
                 default=False,
                 help='Require Nova to perform signature verification on '
                      'each image downloaded from Glance.'),
+    cfg.IntOpt('download_concurrency',
+               default=1,
+               min=1,
+               help='Number of range requests used concurrently to download '
+                    'an image to a file. Images are downloaded with a single '
+                    'request when this is 1, when they are smaller than '
+                    'download_range_size or when the glance server does not '
+                    'serve the v2 API or does not support range requests.'),
+    cfg.IntOpt('download_range_size',
+               default=64,
+               min=1,
+               help='Size in MiB of the ranges of an image downloaded '
+                    'concurrently.'),
     ]
 
 LOG = logging.getLogger(__name__)
@@ -371,11 +386,6 @@ class GlanceImageService(object):
                     except Exception:
                         LOG.exception(_LE("Download image error"))
 
-        try:
-            image_chunks = self._client.call(context, 1, 'data', image_id)
-        except Exception:
-            _reraise_translated_image_exception(image_id)
-
         # Retrieve properties for verification of Glance image signature
         verifier = None
         if CONF.glance.verify_glance_signatures:
@@ -403,6 +413,16 @@ class GlanceImageService(object):
                     LOG.error(_LE('Image signature verification failed '
                                   'for image: %s'), image_id)
 
+        if (CONF.glance.download_concurrency > 1 and data is None and
+                dst_path is not None):
+            if self._download_ranges(context, image_id, dst_path, verifier):
+                return
+
+        try:
+            image_chunks = self._client.call(context, 1, 'data', image_id)
+        except Exception:
+            _reraise_translated_image_exception(image_id)
+
         close_file = False
         if data is None and dst_path:
             data = open(dst_path, 'wb')
@@ -448,6 +468,53 @@ class GlanceImageService(object):
                 if close_file:
                     data.close()
 
+    def _download_ranges(self, context, image_id, dst_path, verifier):
+        """Download an image to a file with concurrent range requests.
+
+        :returns: True if the image was downloaded, False if it is too small
+                  to be split or the glance server does not serve the v2 image
+                  data or support range requests
+        """
+        image = self.show(context, image_id)
+        range_size = CONF.glance.download_range_size * units.Mi
+        size = image.get('size') or 0
+        if size <= range_size:
+            return False
+
+        endpoint = next(get_api_servers())
+        url = '%s/v2/images/%s/file' % (endpoint.rstrip('/'), image_id)
+        verify = True
+        sslutils.is_enabled(CONF)
+        if CONF.glance.api_insecure:
+            verify = False
+        elif CONF.ssl.ca_file:
+            verify = CONF.ssl.ca_file
+        downloader = ranged_download.RangedDownloader(
+            url, generate_identity_headers(context), image_id, size,
+            CONF.glance.download_concurrency, range_size,
+            num_retries=max(CONF.glance.num_retries, 0), verify=verify)
+        checksum = downloader.download(dst_path, verifier=verifier)
+        if checksum is None:
+            return False
+
+        try:
+            if image.get('checksum') and checksum != image['checksum']:
+                raise exception.ImageUnacceptable(
+                    image_id=image_id,
+                    reason=_('checksum %(actual)s does not match the '
+                             'expected checksum %(expected)s') %
+                    {'actual': checksum, 'expected': image['checksum']})
+            if verifier:
+                verifier.verify()
+                LOG.info(_LI('Image signature verification succeeded '
+                             'for image %s'), image_id)
+        except cryptography.exceptions.InvalidSignature:
+            with excutils.save_and_reraise_exception():
+                open(dst_path, 'wb').close()
+                LOG.error(_LE('Image signature verification failed '
+                              'for image: %s'), image_id)
+        return True
+
     def create(self, context, image_meta, data=None):
         """Store the image data and return the new image object."""
         sent_service_image_meta = _translate_to_glance(image_meta)
@@ -0,0 +1,244 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Parallel download of image data with HTTP range requests.
+
+A single image download is limited to the throughput of one TCP stream.
+The image is instead split in ranges fetched concurrently over several
+connections and written in place into a preallocated file. The data is
+checksummed, and passed to the signature verifier, in order as the leading
+ranges of the image complete.
+"""
+
+import hashlib
+import os
+import re
+import sys
+import threading
+
+import eventlet
+from oslo_log import log as logging
+import requests
+import six
+
+from nova import exception
+from nova.i18n import _, _LW
+
+
+LOG = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+_CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+
+
+class _OrderedDigest(object):
+    """Digest of a file whose ranges are written out of order.
+
+    Ranges are read back, from the page cache in practice, and added to the
+    checksum and signature verifier once every range before them has been
+    written.
+    """
+
+    def __init__(self, path, verifier=None):
+        self.path = path
+        self.verifier = verifier
+        self.checksum = hashlib.md5()
+        self.offset = 0
+        self._completed = {}
+        self._lock = threading.Lock()
+
+    def _update(self, start, end):
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                self.checksum.update(chunk)
+                if self.verifier:
+                    self.verifier.update(chunk)
+                remaining -= len(chunk)
+
+    def range_completed(self, start, end):
+        with self._lock:
+            self._completed[start] = end
+            while self.offset in self._completed:
+                end = self._completed.pop(self.offset)
+                self._update(self.offset, end)
+                self.offset = end
+
+
+class RangedDownloader(object):
+    """Download an image with concurrent range requests.
+
+    :param url: URL of the image data
+    :param headers: headers to send with every request, such as the
+                    identity headers
+    :param image_id: id of the image, for error messages
+    :param size: size of the image in bytes
+    :param concurrency: maximum number of ranges fetched at once
+    :param range_size: size of each range in bytes
+    :param num_retries: number of times a range is retried on a connection
+                        error
+    :param verify: passed to requests, whether or how to verify the TLS
+                   certificate of the server
+    """
+
+    def __init__(self, url, headers, image_id, size, concurrency, range_size,
+                 num_retries=0, verify=True):
+        self.url = url
+        self.headers = headers
+        self.image_id = image_id
+        self.size = size
+        self.concurrency = concurrency
+        self.range_size = range_size
+        self.num_retries = num_retries
+        self.verify = verify
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=concurrency)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    def _ranges(self):
+        for start in six.moves.range(0, self.size, self.range_size):
+            yield start, min(start + self.range_size, self.size)
+
+    def _request(self, start, end, probe=False):
+        headers = dict(self.headers)
+        headers['Range'] = 'bytes=%d-%d' % (start, end - 1)
+        try:
+            resp = self._session.get(self.url, headers=headers, stream=True,
+                                     verify=self.verify)
+        except requests.RequestException as e:
+            raise exception.GlanceConnectionFailed(
+                server=self.url, reason=six.text_type(e))
+        if probe and resp.status_code in (404, 501):
+            # NOTE: The image was found through the image API already, this
+            # means that the glance v2 API is disabled, or that the data
+            # cannot be served this way. Let the caller fall back to the
+            # single stream download.
+            resp.close()
+            return None
+        if resp.status_code in (401, 403):
+            resp.close()
+            raise exception.ImageNotAuthorized(image_id=self.image_id)
+        if resp.status_code == 404:
+            resp.close()
+            raise exception.ImageNotFound(image_id=self.image_id)
+        if resp.status_code not in (200, 206):
+            resp.close()
+            raise exception.GlanceConnectionFailed(
+                server=self.url,
+                reason=_('unexpected status %d') % resp.status_code)
+        return resp
+
+    def _supports_range(self, resp, start, end):
+        if resp.status_code != 206:
+            return False
+        match = _CONTENT_RANGE_RE.match(
+            resp.headers.get('Content-Range', ''))
+        return (match is not None and int(match.group(1)) == start and
+                int(match.group(2)) == end - 1)
+
+    def _write(self, resp, dst_path, start, end):
+        written = 0
+        try:
+            with open(dst_path, 'r+b') as f:
+                f.seek(start)
+                for chunk in resp.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+                    written += len(chunk)
+        except requests.RequestException as e:
+            raise exception.GlanceConnectionFailed(
+                server=self.url, reason=six.text_type(e))
+        finally:
+            resp.close()
+        if written != end - start:
+            raise exception.GlanceConnectionFailed(
+                server=self.url,
+                reason=_('received %(written)d bytes of range %(start)d-'
+                         '%(end)d') % {'written': written, 'start': start,
+                                       'end': end - 1})
+
+    def _fetch(self, dst_path, digest, start, end, resp=None):
+        attempt = 0
+        while True:
+            try:
+                if resp is None:
+                    resp = self._request(start, end)
+                    if not self._supports_range(resp, start, end):
+                        resp.close()
+                        raise exception.GlanceConnectionFailed(
+                            server=self.url,
+                            reason=_('range request was not honoured'))
+                self._write(resp, dst_path, start, end)
+                break
+            except exception.GlanceConnectionFailed:
+                resp = None
+                attempt += 1
+                if attempt > self.num_retries:
+                    raise
+                LOG.warning(_LW('Retrying range %(start)d-%(end)d of image '
+                                '%(image_id)s'),
+                            {'start': start, 'end': end - 1,
+                             'image_id': self.image_id})
+        digest.range_completed(start, end)
+
+    def _fetch_in_thread(self, *args, **kwargs):
+        # NOTE: Return the failure to download() rather than raising it from
+        # the green thread, which would log it a second time.
+        try:
+            self._fetch(*args, **kwargs)
+        except Exception:
+            return sys.exc_info()
+
+    def download(self, dst_path, verifier=None):
+        """Download the image into dst_path.
+
+        :returns: the hex MD5 checksum of the image, or None if the server
+                  does not support range requests, in which case nothing
+                  was written
+        """
+        ranges = list(self._ranges())
+        start, end = ranges[0]
+        resp = self._request(start, end, probe=True)
+        if resp is None or not self._supports_range(resp, start, end):
+            if resp is not None:
+                resp.close()
+            LOG.debug('Range requests are not supported for image %s',
+                      self.image_id)
+            return None
+
+        with open(dst_path, 'wb') as f:
+            # NOTE: Ranges are written in place, allocate the whole file
+            # first so that it is not extended by every out of order write.
+            if hasattr(os, 'posix_fallocate'):
+                os.posix_fallocate(f.fileno(), 0, self.size)
+            else:
+                f.truncate(self.size)
+
+        digest = _OrderedDigest(dst_path, verifier=verifier)
+        pool = eventlet.GreenPool(self.concurrency)
+        threads = [pool.spawn(self._fetch_in_thread, dst_path, digest,
+                              start, end, resp=resp)]
+        for start, end in ranges[1:]:
+            threads.append(pool.spawn(self._fetch_in_thread, dst_path,
+                                      digest, start, end))
+        for thread in threads:
+            exc_info = thread.wait()
+            if exc_info is not None:
+                for other in threads:
+                    other.kill()
+                six.reraise(*exc_info)
+        return digest.checksum.hexdigest()
@@ -86,7 +86,7 @@ class BandwidthUsageList(base.ObjectListBase, base.NovaObject):
     }
 
     @staticmethod
-    @db.select_db_reader_mode
+    @db.select_db_reader_mode(max_staleness=60)
     def _db_bw_usage_get_by_uuids(context, uuids, start_period,
                                   use_slave=False):
         return db.bw_usage_get_by_uuids(context, uuids=uuids,
@@ -0,0 +1,85 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Encoding of object primitives stored in database text columns.
+
+Blobs such as instance_extra.numa_topology or compute_nodes.pci_stats have
+always been stored as JSON. They can optionally be written in a compact
+encoding instead: the serialized primitive is compressed and base64 encoded
+behind a versioned prefix so that it still fits the existing text columns.
+Readers accept every encoding, so rows written before the encoding was
+changed keep working.
+"""
+
+import base64
+import zlib
+
+from oslo_config import cfg
+from oslo_serialization import jsonutils
+from oslo_serialization import msgpackutils
+import six
+
+
+blob_opts = [
+    cfg.StrOpt('db_blob_encoding',
+               default='json',
+               choices=['json', 'zlib', 'msgpack'],
+               help='Encoding used when writing serialized objects such as '
+                    'NUMA topologies, PCI requests and pools, flavors and '
+                    'CPU models to the database. "json" is the historical '
+                    'format, "zlib" stores compressed JSON and "msgpack" '
+                    'stores compressed msgpack. Every service can read all '
+                    'encodings, so only change this once all services have '
+                    'been upgraded.'),
+    cfg.IntOpt('db_blob_compress_min_size',
+               default=512,
+               min=0,
+               help='Serialized objects smaller than this many bytes are '
+                    'always written as JSON, since compressing them saves '
+                    'little.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(blob_opts)
+
+ZLIB_PREFIX = 'zlib1:'
+MSGPACK_PREFIX = 'msgpack1:'
+
+
+def _pack(prefix, data):
+    return prefix + base64.b64encode(zlib.compress(data)).decode('ascii')
+
+
+def _unpack(prefix, blob):
+    return zlib.decompress(base64.b64decode(blob[len(prefix):]))
+
+
+def dumps(primitive):
+    """Serialize a primitive for storage in a database text column."""
+    data = jsonutils.dumps(primitive)
+    encoding = CONF.db_blob_encoding
+    if encoding == 'json' or len(data) < CONF.db_blob_compress_min_size:
+        return data
+    if encoding == 'msgpack':
+        return _pack(MSGPACK_PREFIX, msgpackutils.dumps(primitive))
+    return _pack(ZLIB_PREFIX, data.encode('utf-8'))
+
+
+def loads(blob):
+    """Deserialize a primitive written by dumps() with any encoding."""
+    if isinstance(blob, six.binary_type):
+        blob = blob.decode('utf-8')
+    if blob.startswith(ZLIB_PREFIX):
+        return jsonutils.loads(_unpack(ZLIB_PREFIX, blob).decode('utf-8'))
+    if blob.startswith(MSGPACK_PREFIX):
+        return msgpackutils.loads(_unpack(MSGPACK_PREFIX, blob))
+    return jsonutils.loads(blob)
@@ -323,7 +323,7 @@ class BlockDeviceMappingList(base.ObjectListBase, base.NovaObject):
                 context, cls, bdms, 'instance_uuid')
 
     @staticmethod
-    @db.select_db_reader_mode
+    @db.select_db_reader_mode(max_staleness=30)
     def _db_block_device_mapping_get_all_by_instance_uuids(
             context, instance_uuids, use_slave=False):
         return db.block_device_mapping_get_all_by_instance_uuids(
@@ -22,6 +22,7 @@ from nova import db
 from nova import exception
 from nova import objects
 from nova.objects import base
+from nova.objects import blob
 from nova.objects import fields
 from nova.objects import pci_device_pool
 
@@ -304,7 +305,7 @@ class ComputeNode(base.NovaPersistentObject, base.NovaObject,
         if 'pci_device_pools' in updates:
             pools = updates.pop('pci_device_pools')
             if pools is not None:
-                pools = jsonutils.dumps(pools.obj_to_primitive())
+                pools = blob.dumps(pools.obj_to_primitive())
             updates['pci_stats'] = pools
 
     @base.remotable
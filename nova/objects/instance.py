@@ -17,7 +17,6 @@ import contextlib
 from oslo_config import cfg
 from oslo_db import exception as db_exc
 from oslo_log import log as logging
-from oslo_serialization import jsonutils
 from oslo_utils import timeutils
 from oslo_utils import versionutils
 
@@ -30,6 +29,7 @@ from nova.i18n import _LE
 from nova import notifications
 from nova import objects
 from nova.objects import base
+from nova.objects import blob
 from nova.objects import fields
 from nova import utils
 
@@ -260,7 +260,7 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
     def _flavor_from_db(self, db_flavor):
         """Load instance flavor information from instance_extra."""
 
-        flavor_info = jsonutils.loads(db_flavor)
+        flavor_info = blob.loads(db_flavor)
 
         self.flavor = objects.Flavor.obj_from_primitive(flavor_info['cur'])
         if flavor_info['old']:
@@ -453,12 +453,11 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
                 'old': old,
                 'new': new,
             }
-            updates['extra']['flavor'] = jsonutils.dumps(flavor_info)
+            updates['extra']['flavor'] = blob.dumps(flavor_info)
         vcpu_model = updates.pop('vcpu_model', None)
         expected_attrs.append('vcpu_model')
         if vcpu_model:
-            updates['extra']['vcpu_model'] = (
-                jsonutils.dumps(vcpu_model.obj_to_primitive()))
+            updates['extra']['vcpu_model'] = vcpu_model.to_json()
         else:
             updates['extra']['vcpu_model'] = None
         db_inst = db.instance_create(self._context, updates)
@@ -544,7 +543,7 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
         }
         db.instance_extra_update_by_uuid(
             context, self.uuid,
-            {'flavor': jsonutils.dumps(flavor_info)})
+            {'flavor': blob.dumps(flavor_info)})
         self.obj_reset_changes(['flavor', 'old_flavor', 'new_flavor'])
 
     def _save_old_flavor(self, context):
@@ -560,7 +559,7 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
         # fields
         if 'vcpu_model' in self.obj_what_changed():
             if self.vcpu_model:
-                update = jsonutils.dumps(self.vcpu_model.obj_to_primitive())
+                update = self.vcpu_model.to_json()
             else:
                 update = None
             db.instance_extra_update_by_uuid(
@@ -803,9 +802,7 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
             self.vcpu_model = objects.VirtCPUModel.get_by_instance_uuid(
                 self._context, self.uuid)
         else:
-            db_vcpu_model = jsonutils.loads(db_vcpu_model)
-            self.vcpu_model = objects.VirtCPUModel.obj_from_primitive(
-                db_vcpu_model)
+            self.vcpu_model = objects.VirtCPUModel.from_json(db_vcpu_model)
 
     def _load_ec2_ids(self):
         self.ec2_ids = objects.EC2Ids.get_by_instance(self._context, self)
@@ -1019,11 +1016,8 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
     }
 
     @classmethod
-    @db.select_db_reader_mode
-    def _get_by_filters_impl(cls, context, filters,
-                       sort_key='created_at', sort_dir='desc', limit=None,
-                       marker=None, expected_attrs=None, use_slave=False,
-                       sort_keys=None, sort_dirs=None):
+    def _get_by_filters_db(cls, context, filters, sort_key, sort_dir, limit,
+                           marker, expected_attrs, sort_keys, sort_dirs):
         if sort_keys or sort_dirs:
             db_inst_list = db.instance_get_all_by_filters_sort(
                 context, filters, limit=limit, marker=marker,
@@ -1036,6 +1030,27 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
         return _make_instance_list(context, cls(), db_inst_list,
                                    expected_attrs)
 
+    @classmethod
+    @db.select_db_reader_mode
+    def _get_by_filters_impl(cls, context, filters,
+                       sort_key='created_at', sort_dir='desc', limit=None,
+                       marker=None, expected_attrs=None, use_slave=False,
+                       sort_keys=None, sort_dirs=None):
+        return cls._get_by_filters_db(context, filters, sort_key, sort_dir,
+                                      limit, marker, expected_attrs,
+                                      sort_keys, sort_dirs)
+
+    @classmethod
+    @db.select_db_reader_mode(max_staleness=30)
+    def _get_by_filters_stale_ok_impl(cls, context, filters,
+                                      sort_key='created_at', sort_dir='desc',
+                                      limit=None, marker=None,
+                                      expected_attrs=None, sort_keys=None,
+                                      sort_dirs=None):
+        return cls._get_by_filters_db(context, filters, sort_key, sort_dir,
+                                      limit, marker, expected_attrs,
+                                      sort_keys, sort_dirs)
+
     @base.remotable_classmethod
     def get_by_filters(cls, context, filters,
                        sort_key='created_at', sort_dir='desc', limit=None,
@@ -1046,6 +1061,23 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
             limit=limit, marker=marker, expected_attrs=expected_attrs,
             use_slave=use_slave, sort_keys=sort_keys, sort_dirs=sort_dirs)
 
+    @classmethod
+    def get_by_filters_stale_ok(cls, context, filters,
+                                sort_key='created_at', sort_dir='desc',
+                                limit=None, marker=None, expected_attrs=None,
+                                sort_keys=None, sort_dirs=None):
+        """Like get_by_filters, for listings that tolerate replication lag.
+
+        The instances may be read from the database replica, and miss the
+        changes of the last seconds. This is only meant for read-only API
+        listings, never for a read that decisions such as scheduling
+        policies or quotas are based on.
+        """
+        return cls._get_by_filters_stale_ok_impl(
+            context, filters, sort_key=sort_key, sort_dir=sort_dir,
+            limit=limit, marker=marker, expected_attrs=expected_attrs,
+            sort_keys=sort_keys, sort_dirs=sort_dirs)
+
     @staticmethod
     @db.select_db_reader_mode
     def _db_instance_get_all_by_host(context, host, columns_to_join,
@@ -1094,7 +1126,7 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
                                    expected_attrs)
 
     @staticmethod
-    @db.select_db_reader_mode
+    @db.select_db_reader_mode(max_staleness=60)
     def _db_instance_get_active_by_window_joined(
             context, begin, end, project_id, host, columns_to_join,
             use_slave=False):
@@ -1145,6 +1177,34 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
                                                 expected_attrs,
                                                 use_slave=use_slave)
 
+    @staticmethod
+    @db.select_db_reader_mode(max_staleness=60)
+    def _db_instance_get_usage_by_window(context, begin, end, project_id,
+                                         use_slave=False):
+        return db.instance_get_usage_by_window(context, begin, end,
+                                               project_id=project_id)
+
+    @classmethod
+    def get_usage_by_window(cls, context, begin, end, project_id=None,
+                            use_slave=False):
+        """Get the usage of the instances active during a time window.
+
+        The usage is summed up per project by the database rather than
+        loading every instance.
+
+        :param:context: nova request context
+        :param:begin: datetime for the start of the time window
+        :param:end: datetime for the end of the time window
+        :param:project_id: used to filter instances by project
+        :param use_slave if True, ship this query off to a DB slave
+        :returns: list of dicts with the project_id and its hours,
+                  vcpus_hours, memory_mb_hours and local_gb_hours totals
+
+        """
+        return cls._db_instance_get_usage_by_window(context, begin, end,
+                                                    project_id,
+                                                    use_slave=use_slave)
+
     @base.remotable_classmethod
     def get_by_security_group_id(cls, context, security_group_id):
         db_secgroup = db.security_group_get(
@@ -205,7 +205,8 @@ class InstanceActionEvent(base.NovaPersistentObject, base.NovaObject,
 
 @base.NovaObjectRegistry.register
 class InstanceActionEventList(base.ObjectListBase, base.NovaObject):
-    VERSION = '1.1'
+    # Version 1.2: Added record_events()
+    VERSION = '1.2'
     fields = {
         'objects': fields.ListOfObjectsField('InstanceActionEvent'),
         }
@@ -215,3 +216,14 @@ class InstanceActionEventList(base.ObjectListBase, base.NovaObject):
         db_events = db.action_events_get(context, action_id)
         return base.obj_make_list(context, cls(context),
                                   objects.InstanceActionEvent, db_events)
+
+    @base.remotable_classmethod
+    def record_events(cls, context, events):
+        """Record the start and finish of many events in one transaction.
+
+        :param events: list of dicts packed by
+                       InstanceActionEvent.pack_action_event_start(),
+                       pack_action_event_finish() or both, with datetimes
+                       as strings and a use_last_action flag
+        """
+        db.action_events_record(context, events)
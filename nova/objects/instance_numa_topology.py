@@ -12,12 +12,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-from oslo_serialization import jsonutils
 from oslo_utils import versionutils
 
 from nova import db
 from nova import exception
 from nova.objects import base
+from nova.objects import blob
 from nova.objects import fields as obj_fields
 from nova.virt import hardware
 
@@ -165,10 +165,10 @@ class InstanceNUMATopology(base.NovaObject,
 
     @classmethod
     def obj_from_db_obj(cls, instance_uuid, db_obj):
-        primitive = jsonutils.loads(db_obj)
+        primitive = blob.loads(db_obj)
         obj_topology = cls.obj_from_primitive(primitive)
 
-        if 'nova_object.name' not in db_obj:
+        if 'nova_object.name' not in primitive:
             obj_topology.instance_uuid = instance_uuid
             # No benefit to store a list of changed fields
             obj_topology.obj_reset_changes()
@@ -211,7 +211,7 @@ class InstanceNUMATopology(base.NovaObject,
         return cls.obj_from_db_obj(instance_uuid, db_extra['numa_topology'])
 
     def _to_json(self):
-        return jsonutils.dumps(self.obj_to_primitive())
+        return blob.dumps(self.obj_to_primitive())
 
     def __len__(self):
         """Defined so that boolean testing works the same as for lists."""
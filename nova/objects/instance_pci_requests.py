@@ -15,6 +15,7 @@ from oslo_utils import versionutils
 
 from nova import db
 from nova.objects import base
+from nova.objects import blob
 from nova.objects import fields
 
 
@@ -78,7 +79,7 @@ class InstancePCIRequests(base.NovaObject,
         self = cls(context=context, requests=[],
                    instance_uuid=instance_uuid)
         if db_requests is not None:
-            requests = jsonutils.loads(db_requests)
+            requests = blob.loads(db_requests)
         else:
             requests = []
         for request in requests:
@@ -139,12 +140,12 @@ class InstancePCIRequests(base.NovaObject,
             return cls.get_by_instance_uuid(context, instance['uuid'])
 
     def to_json(self):
-        blob = [{'count': x.count,
-                 'spec': x.spec,
-                 'alias_name': x.alias_name,
-                 'is_new': x.is_new,
-                 'request_id': x.request_id} for x in self.requests]
-        return jsonutils.dumps(blob)
+        requests = [{'count': x.count,
+                     'spec': x.spec,
+                     'alias_name': x.alias_name,
+                     'is_new': x.is_new,
+                     'request_id': x.request_id} for x in self.requests]
+        return blob.dumps(requests)
 
     @classmethod
     def from_request_spec_instance_props(cls, pci_requests):
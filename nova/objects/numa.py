@@ -12,10 +12,10 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-from oslo_serialization import jsonutils
 
 from nova import exception
 from nova.objects import base
+from nova.objects import blob
 from nova.objects import fields
 from nova.virt import hardware
 
@@ -199,12 +199,11 @@ class NUMATopology(base.NovaObject,
         return obj_topology
 
     def _to_json(self):
-        return jsonutils.dumps(self.obj_to_primitive())
+        return blob.dumps(self.obj_to_primitive())
 
     @classmethod
     def obj_from_db_obj(cls, db_obj):
-        return cls.obj_from_primitive(
-            jsonutils.loads(db_obj))
+        return cls.obj_from_primitive(blob.loads(db_obj))
 
     def __len__(self):
         """Defined so that boolean testing works the same as for lists."""
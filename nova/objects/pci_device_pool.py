@@ -15,12 +15,12 @@
 
 import copy
 
-from oslo_serialization import jsonutils
 from oslo_utils import versionutils
 import six
 
 from nova import objects
 from nova.objects import base
+from nova.objects import blob
 from nova.objects import fields
 
 
@@ -87,7 +87,7 @@ def from_pci_stats(pci_stats):
     pools = []
     if isinstance(pci_stats, six.string_types):
         try:
-            pci_stats = jsonutils.loads(pci_stats)
+            pci_stats = blob.loads(pci_stats)
         except (ValueError, TypeError):
             pci_stats = None
     if pci_stats:
@@ -29,7 +29,7 @@ LOG = logging.getLogger(__name__)
 
 
 # NOTE(danms): This is the global service version counter
-SERVICE_VERSION = 9
+SERVICE_VERSION = 10
 
 
 # NOTE(danms): This is our SERVICE_VERSION history. The idea is that any
@@ -71,6 +71,8 @@ SERVICE_VERSION_HISTORY = (
     {'compute_rpc': '4.10'},
     # Version 9: Allow block_migration and disk_over_commit be None
     {'compute_rpc': '4.11'},
+    # Version 10: Add cache_images() and unpin_images() to the compute_rpc
+    {'compute_rpc': '4.12'},
 )
 
 
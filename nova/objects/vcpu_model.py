@@ -10,10 +10,10 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-from oslo_serialization import jsonutils
 
 from nova import db
 from nova.objects import base
+from nova.objects import blob
 from nova.objects import fields
 
 
@@ -38,11 +38,11 @@ class VirtCPUModel(base.NovaObject):
         setattr(self, attrname, None)
 
     def to_json(self):
-        return jsonutils.dumps(self.obj_to_primitive())
+        return blob.dumps(self.obj_to_primitive())
 
     @classmethod
     def from_json(cls, jsonstr):
-        return cls.obj_from_primitive(jsonutils.loads(jsonstr))
+        return cls.obj_from_primitive(blob.loads(jsonstr))
 
     @base.remotable_classmethod
     def get_by_instance_uuid(cls, context, instance_uuid):
@@ -50,7 +50,7 @@ class VirtCPUModel(base.NovaObject):
                 context, instance_uuid, columns=['vcpu_model'])
         if not db_extra or not db_extra['vcpu_model']:
             return None
-        return cls.obj_from_primitive(jsonutils.loads(db_extra['vcpu_model']))
+        return cls.from_json(db_extra['vcpu_model'])
 
 
 @base.NovaObjectRegistry.register
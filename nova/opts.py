@@ -40,6 +40,7 @@ import nova.keymgr.barbican
 import nova.keymgr.conf_key_mgr
 import nova.netconf
 import nova.notifications
+import nova.objects.blob
 import nova.objects.network
 import nova.paths
 import nova.quota
@@ -73,6 +74,7 @@ def list_opts():
              nova.exception.exc_log_opts,
              nova.netconf.netconf_opts,
              nova.notifications.notify_opts,
+             nova.objects.blob.blob_opts,
              nova.objects.network.network_opts,
              nova.paths.path_opts,
              nova.quota.quota_opts,
@@ -15,6 +15,7 @@
 
 """Policy Engine For Nova."""
 
+import ast
 import logging
 
 from oslo_config import cfg
@@ -28,12 +29,124 @@ CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
 _ENFORCER = None
 
+# NOTE: Outcomes of the rules which only look at the credentials, keyed by
+# the rule and the values of the credentials it reads. They are cleared
+# whenever the enforcer sets or merges rules, or its Rules object changes.
+_RESULT_CACHE = {}
+_RESULT_CACHE_SIZE = 4096
+_CACHED_RULES = None
+# Rule name -> tuple of the credential keys the rule reads, or None when
+# the outcome of the rule depends on the target.
+_COMPILED_RULES = {}
+_MISSING = object()
+
 
 def reset():
     global _ENFORCER
     if _ENFORCER:
         _ENFORCER.clear()
         _ENFORCER = None
+    _clear_cache()
+
+
+def _clear_cache():
+    global _CACHED_RULES
+    _RESULT_CACHE.clear()
+    _COMPILED_RULES.clear()
+    _CACHED_RULES = None
+
+
+def _uses_target(match):
+    return '%(' in match
+
+
+def _compile_check(check, rules, seen):
+    """Return the credential keys a check reads.
+
+    None is returned when the outcome of the check depends on something
+    else than the credentials, usually the target, or cannot be told.
+    """
+    # NOTE: oslo.policy only exposes the classes of the logical and rule
+    # checks, the other built-in checks are told apart by their name.
+    name = type(check).__name__
+    if name in ('TrueCheck', 'FalseCheck'):
+        return frozenset()
+    if isinstance(check, IsAdminCheck):
+        return frozenset(['is_admin'])
+    if name == 'RoleCheck':
+        if _uses_target(check.match):
+            return None
+        return frozenset(['roles'])
+    if name == 'GenericCheck':
+        if _uses_target(check.match):
+            return None
+        try:
+            ast.literal_eval(check.kind)
+            return frozenset()
+        except ValueError:
+            return frozenset([check.kind.split('.')[0]])
+    if isinstance(check, policy.RuleCheck):
+        if check.match in seen or check.match not in rules:
+            return None
+        return _compile_check(rules[check.match], rules,
+                              seen | set([check.match]))
+    if isinstance(check, policy.NotCheck):
+        return _compile_check(check.rule, rules, seen)
+    if isinstance(check, (policy.AndCheck, policy.OrCheck)):
+        keys = frozenset()
+        for rule in check.rules:
+            rule_keys = _compile_check(rule, rules, seen)
+            if rule_keys is None:
+                return None
+            keys |= rule_keys
+        return keys
+    # NOTE: HttpCheck and checks registered by other projects may look at
+    # anything, so never cache them.
+    return None
+
+
+def _get_cache_key(action, credentials):
+    """Return the key caching the outcome of action, None if uncacheable."""
+    global _CACHED_RULES
+    rules = _ENFORCER.rules
+    if rules is not _CACHED_RULES:
+        _clear_cache()
+        _CACHED_RULES = rules
+    if action not in _COMPILED_RULES:
+        keys = None
+        if action in rules:
+            keys = _compile_check(rules[action], rules, set([action]))
+        _COMPILED_RULES[action] = (tuple(sorted(keys))
+                                   if keys is not None else None)
+    keys = _COMPILED_RULES[action]
+    if keys is None:
+        return None
+    values = []
+    for key in keys:
+        value = credentials.get(key, _MISSING)
+        if isinstance(value, list):
+            value = tuple(value)
+        values.append(value)
+    key = (action, tuple(values))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+class _Enforcer(policy.Enforcer):
+    """Enforcer clearing the cached outcomes when its rules change.
+
+    The rules of the policy.d files are merged into the current Rules object
+    rather than replacing it, so a change of the rules cannot be told from
+    the identity of the Rules object alone.
+    """
+
+    def set_rules(self, rules, overwrite=True, use_conf=False):
+        super(_Enforcer, self).set_rules(rules, overwrite=overwrite,
+                                         use_conf=use_conf)
+        _clear_cache()
 
 
 def init(policy_file=None, rules=None, default_rule=None, use_conf=True):
@@ -50,11 +163,11 @@ def init(policy_file=None, rules=None, default_rule=None, use_conf=True):
 
     global _ENFORCER
     if not _ENFORCER:
-        _ENFORCER = policy.Enforcer(CONF,
-                                    policy_file=policy_file,
-                                    rules=rules,
-                                    default_rule=default_rule,
-                                    use_conf=use_conf)
+        _ENFORCER = _Enforcer(CONF,
+                              policy_file=policy_file,
+                              rules=rules,
+                              default_rule=default_rule,
+                              use_conf=use_conf)
 
 
 def set_rules(rules, overwrite=True, use_conf=False):
@@ -68,6 +181,7 @@ def set_rules(rules, overwrite=True, use_conf=False):
 
     init(use_conf=False)
     _ENFORCER.set_rules(rules, overwrite, use_conf)
+    _clear_cache()
 
 
 def enforce(context, action, target, do_raise=True, exc=None):
@@ -97,8 +211,7 @@ def enforce(context, action, target, do_raise=True, exc=None):
     if not exc:
         exc = exception.PolicyNotAuthorized
     try:
-        result = _ENFORCER.enforce(action, target, credentials,
-                                   do_raise=do_raise, exc=exc, action=action)
+        result = _enforce(action, target, credentials, do_raise, exc)
     except Exception:
         credentials.pop('auth_token', None)
         with excutils.save_and_reraise_exception():
@@ -108,6 +221,27 @@ def enforce(context, action, target, do_raise=True, exc=None):
     return result
 
 
+def _enforce(action, target, credentials, do_raise, exc):
+    # NOTE: Load the rules first so that a changed policy file is noticed
+    # before looking at the cache.
+    _ENFORCER.load_rules()
+    cache_key = _get_cache_key(action, credentials)
+    if cache_key is None:
+        return _ENFORCER.enforce(action, target, credentials,
+                                 do_raise=do_raise, exc=exc, action=action)
+
+    if cache_key in _RESULT_CACHE:
+        result = _RESULT_CACHE[cache_key]
+    else:
+        result = _ENFORCER.enforce(action, target, credentials)
+        if len(_RESULT_CACHE) >= _RESULT_CACHE_SIZE:
+            _RESULT_CACHE.clear()
+        _RESULT_CACHE[cache_key] = result
+    if not result and do_raise:
+        raise exc(action=action)
+    return result
+
+
 def check_is_admin(context):
     """Whether or not roles contains 'admin' role according to policy setting.
 
@@ -31,6 +31,7 @@ import oslo_messaging as messaging
 from oslo_serialization import jsonutils
 
 import nova.context
+from nova.db.sqlalchemy import profiler
 import nova.exception
 
 
@@ -170,7 +171,7 @@ def get_server(target, endpoints, serializer=None):
     serializer = RequestContextSerializer(serializer)
     return messaging.get_rpc_server(TRANSPORT,
                                     target,
-                                    endpoints,
+                                    profiler.wrap_endpoints(endpoints),
                                     executor='eventlet',
                                     serializer=serializer)
 
@@ -20,6 +20,7 @@
 import os
 import random
 import sys
+import time
 
 from oslo_concurrency import processutils
 from oslo_config import cfg
@@ -361,7 +362,9 @@ class WSGIService(service.Service):
         self.topic = None
         self.manager = self._get_manager()
         self.loader = loader or wsgi.Loader()
+        start = time.time()
         self.app = self.loader.load_app(name)
+        self.app_load_time = time.time() - start
         # inherit all compute_api worker counts from osapi_compute
         if name.startswith('openstack_compute_api'):
             wname = 'osapi_compute'
@@ -427,6 +430,7 @@ class WSGIService(service.Service):
         :returns: None
 
         """
+        start = time.time()
         ctxt = context.get_admin_context()
         service_ref = objects.Service.get_by_host_and_binary(ctxt, self.host,
                                                              self.binary)
@@ -449,6 +453,12 @@ class WSGIService(service.Service):
         self.server.start()
         if self.manager:
             self.manager.post_start_hook()
+        # NOTE: The application is loaded once by the parent process, the
+        # workers forked from it only pay for the start.
+        LOG.info(_LI("%(name)s worker %(pid)d started in %(start).2f seconds "
+                     "(application loaded in %(load).2f seconds)"),
+                 {'name': self.name, 'pid': os.getpid(),
+                  'start': time.time() - start, 'load': self.app_load_time})
 
     def stop(self):
         """Stop serving this API.
@@ -53,6 +53,7 @@ from nova.tests import fixtures as nova_fixtures
 from nova.tests.unit import conf_fixture
 from nova.tests.unit import policy_fixture
 from nova import utils
+from nova.virt import images
 
 
 CONF = cfg.CONF
@@ -233,6 +234,10 @@ class TestCase(testtools.TestCase):
         # caching of that value.
         utils._IS_NEUTRON = None
 
+        # NOTE: The qemu-img info of files is cached in nova.virt.images,
+        # which could leak results between tests using the same paths.
+        images.reset_qemu_img_info_cache()
+
         mox_fixture = self.useFixture(moxstubout.MoxStubout())
         self.mox = mox_fixture.mox
         self.stubs = mox_fixture.stubs
@@ -0,0 +1,8 @@
+{
+    "cache_images": {
+        "images": [
+            "%(image_id)s"
+        ],
+        "pin": true
+    }
+}
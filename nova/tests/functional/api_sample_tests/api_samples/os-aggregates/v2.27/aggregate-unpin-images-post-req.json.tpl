@@ -0,0 +1,7 @@
+{
+    "unpin_images": {
+        "images": [
+            "%(image_id)s"
+        ]
+    }
+}
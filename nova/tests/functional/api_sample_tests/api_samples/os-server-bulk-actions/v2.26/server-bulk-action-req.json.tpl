@@ -0,0 +1,9 @@
+{
+    "bulk_action": {
+        "action": "stop",
+        "servers": [
+            "%(server_uuid)s",
+            "%(missing_uuid)s"
+        ]
+    }
+}
@@ -0,0 +1,13 @@
+{
+    "servers": [
+        {
+            "code": 202,
+            "id": "%(uuid)s"
+        },
+        {
+            "code": 404,
+            "id": "%(uuid)s",
+            "message": "Server %(uuid)s could not be found"
+        }
+    ]
+}
@@ -16,6 +16,7 @@
 from oslo_config import cfg
 
 from nova.tests.functional.api_sample_tests import api_sample_base
+from nova.tests.unit.image import fake
 
 CONF = cfg.CONF
 CONF.import_opt('osapi_compute_extension',
@@ -85,3 +86,35 @@ class AggregatesSampleJsonTest(api_sample_base.ApiSampleTestBaseV21):
                                   'aggregate-update-post-req', {})
         self._verify_response('aggregate-update-post-resp',
                               {}, response, 200)
+
+
+class AggregatesV2_27SampleJsonTest(api_sample_base.ApiSampleTestBaseV21):
+    ADMIN_API = True
+    extension_name = "os-aggregates"
+    microversion = '2.27'
+    scenarios = [('v2_27', {'api_major_version': 'v2.1'})]
+
+    def setUp(self):
+        super(AggregatesV2_27SampleJsonTest, self).setUp()
+        self.api.microversion = self.microversion
+        aggregate = self.api.api_post(
+            'os-aggregates',
+            {'aggregate': {'name': 'name', 'availability_zone': 'nova'}}
+        ).body['aggregate']
+        self.aggregate_id = aggregate['id']
+        self.api.api_post('os-aggregates/%s/action' % self.aggregate_id,
+                          {'add_host': {'host': self.compute.host}})
+
+    def test_cache_images(self):
+        subs = {'image_id': fake.get_valid_image_id()}
+        response = self._do_post('os-aggregates/%s/action' %
+                                 self.aggregate_id,
+                                 'aggregate-cache-images-post-req', subs)
+        self.assertEqual(202, response.status_code)
+
+    def test_unpin_images(self):
+        subs = {'image_id': fake.get_valid_image_id()}
+        response = self._do_post('os-aggregates/%s/action' %
+                                 self.aggregate_id,
+                                 'aggregate-unpin-images-post-req', subs)
+        self.assertEqual(202, response.status_code)
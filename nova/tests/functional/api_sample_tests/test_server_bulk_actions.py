@@ -0,0 +1,30 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from nova.tests.functional.api_sample_tests import test_servers
+from nova.tests import uuidsentinel as uuids
+
+
+class ServerBulkActionsSampleJsonTest(test_servers.ServersSampleBase):
+    extension_name = "os-server-bulk-actions"
+    microversion = '2.26'
+    scenarios = [('v2_26', {'api_major_version': 'v2.1'})]
+
+    def setUp(self):
+        super(ServerBulkActionsSampleJsonTest, self).setUp()
+        self.uuid = self._post_server()
+
+    def test_bulk_action(self):
+        subs = {'server_uuid': self.uuid, 'missing_uuid': uuids.missing}
+        response = self._do_post('os-server-bulk-actions',
+                                 'server-bulk-action-req', subs)
+        self._verify_response('server-bulk-action-resp', {}, response, 207)
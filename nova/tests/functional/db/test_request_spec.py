@@ -17,6 +17,7 @@ from nova.objects import request_spec
 from nova import test
 from nova.tests import fixtures
 from nova.tests.unit import fake_request_spec
+from nova.tests import uuidsentinel as uuids
 
 
 class RequestSpecTestCase(test.NoDBTestCase):
@@ -60,3 +61,19 @@ class RequestSpecTestCase(test.NoDBTestCase):
     def test_double_create(self):
         spec = self._create_spec()
         self.assertRaises(exception.ObjectActionError, spec.create)
+
+    def test_create_all(self):
+        specs = []
+        for i in range(3):
+            spec = fake_request_spec.fake_spec_obj(remove_id=True)
+            spec.instance_uuid = getattr(uuids, 'instance%d' % i)
+            specs.append(spec)
+
+        request_spec.RequestSpec.create_all(self.context, specs)
+
+        self.assertEqual(3, len(set(spec.id for spec in specs)))
+        for spec in specs:
+            db_spec = request_spec.RequestSpec.get_by_instance_uuid(
+                self.context, spec.instance_uuid)
+            self.assertEqual(spec.id, db_spec.id)
+            self.assertRaises(exception.ObjectActionError, spec.create)
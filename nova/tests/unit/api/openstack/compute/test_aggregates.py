@@ -791,3 +791,91 @@ class AggregateTestCaseV2(AggregateTestCaseV21):
     def test_create_availabiltiy_zone_with_leading_trailing_spaces_compat_mode(
             self):
         pass
+
+
+class AggregateImageCacheTestCaseV227(test.NoDBTestCase):
+    def setUp(self):
+        super(AggregateImageCacheTestCaseV227, self).setUp()
+        self.controller = aggregates_v21.AggregateController()
+        self.req = fakes.HTTPRequest.blank('/v2/os-aggregates',
+                                           use_admin_context=True,
+                                           version='2.27')
+        self.user_req = fakes.HTTPRequest.blank('/v2/os-aggregates',
+                                                version='2.27')
+        self.context = self.req.environ['nova.context']
+
+    @mock.patch.object(compute_api.AggregateAPI, 'cache_images')
+    def test_cache_images(self, mock_cache):
+        body = {'cache_images': {'images': [uuidsentinel.image],
+                                 'pin': True}}
+        self.controller._cache_images(self.req, '1', body=body)
+        mock_cache.assert_called_once_with(self.context, '1',
+                                           [uuidsentinel.image], pin=True)
+
+    @mock.patch.object(compute_api.AggregateAPI, 'cache_images')
+    def test_cache_images_not_pinned_by_default(self, mock_cache):
+        body = {'cache_images': {'images': [uuidsentinel.image]}}
+        self.controller._cache_images(self.req, '1', body=body)
+        mock_cache.assert_called_once_with(self.context, '1',
+                                           [uuidsentinel.image], pin=False)
+
+    def test_cache_images_no_admin(self):
+        body = {'cache_images': {'images': [uuidsentinel.image]}}
+        self.assertRaises(exception.PolicyNotAuthorized,
+                          self.controller._cache_images,
+                          self.user_req, '1', body=body)
+
+    def test_cache_images_old_microversion(self):
+        req = fakes.HTTPRequest.blank('/v2/os-aggregates',
+                                      use_admin_context=True,
+                                      version='2.26')
+        body = {'cache_images': {'images': [uuidsentinel.image]}}
+        self.assertRaises(exception.VersionNotFoundForAPIMethod,
+                          self.controller._cache_images, req, '1', body=body)
+
+    def test_cache_images_invalid_body(self):
+        for body in ({'cache_images': {'images': []}},
+                     {'cache_images': {'images': ['not-a-uuid']}},
+                     {'cache_images': {'images': [uuidsentinel.image],
+                                       'pin': 'yes'}},
+                     {'cache_images': {}}):
+            self.assertRaises(exception.ValidationError,
+                              self.controller._cache_images,
+                              self.req, '1', body=body)
+
+    @mock.patch.object(compute_api.AggregateAPI, 'cache_images',
+                       side_effect=exception.AggregateNotFound(
+                           aggregate_id='1'))
+    def test_cache_images_aggregate_not_found(self, mock_cache):
+        body = {'cache_images': {'images': [uuidsentinel.image]}}
+        self.assertRaises(exc.HTTPNotFound, self.controller._cache_images,
+                          self.req, '1', body=body)
+
+    @mock.patch.object(compute_api.AggregateAPI, 'cache_images',
+                       side_effect=exception.ImageNotFound(
+                           image_id=uuidsentinel.image))
+    def test_cache_images_image_not_found(self, mock_cache):
+        body = {'cache_images': {'images': [uuidsentinel.image]}}
+        self.assertRaises(exc.HTTPBadRequest, self.controller._cache_images,
+                          self.req, '1', body=body)
+
+    @mock.patch.object(compute_api.AggregateAPI, 'unpin_images')
+    def test_unpin_images(self, mock_unpin):
+        body = {'unpin_images': {'images': [uuidsentinel.image]}}
+        self.controller._unpin_images(self.req, '1', body=body)
+        mock_unpin.assert_called_once_with(self.context, '1',
+                                           [uuidsentinel.image])
+
+    def test_unpin_images_no_admin(self):
+        body = {'unpin_images': {'images': [uuidsentinel.image]}}
+        self.assertRaises(exception.PolicyNotAuthorized,
+                          self.controller._unpin_images,
+                          self.user_req, '1', body=body)
+
+    @mock.patch.object(compute_api.AggregateAPI, 'unpin_images',
+                       side_effect=exception.AggregateNotFound(
+                           aggregate_id='1'))
+    def test_unpin_images_aggregate_not_found(self, mock_unpin):
+        body = {'unpin_images': {'images': [uuidsentinel.image]}}
+        self.assertRaises(exc.HTTPNotFound, self.controller._unpin_images,
+                          self.req, '1', body=body)
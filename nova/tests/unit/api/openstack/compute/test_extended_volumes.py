@@ -198,6 +198,6 @@ class ExtendedVolumesEnforcementV21(test.NoDBTestCase):
     def test_extend_detail_policy_failed(self, mock_extend):
         rule_name = 'os_compute_api:os-extended-volumes'
         self.policy.set_rules({rule_name: "project:non_fake"})
-        # Pass ResponseObj as None, the code shouldn't touch the None.
-        self.controller.detail(self.req, None)
+        list(self.controller.detail(self.req))
         self.assertFalse(mock_extend.called)
+        self.assertEqual([], self.req.get_view_contributors('servers'))
@@ -66,6 +66,11 @@ class ExtensionLoadingTestCase(test.NoDBTestCase):
         app = compute.APIRouterV21()
         self.assertIn('servers', app._loaded_extension_info.extensions)
 
+    @mock.patch('routes.Mapper.create_regs')
+    def test_routes_compiled_on_load(self, mock_create_regs):
+        compute.APIRouterV21()
+        mock_create_regs.assert_called_once_with()
+
     def test_check_bad_extension(self):
         loaded_ext_info = extension_info.LoadedExtensionInfo()
         self.assertFalse(loaded_ext_info._check_extension(fake_bad_extension))
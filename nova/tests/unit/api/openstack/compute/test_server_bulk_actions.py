@@ -0,0 +1,113 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import webob
+
+from nova.api.openstack.compute import server_bulk_actions
+from nova import exception
+from nova import objects
+from nova import test
+from nova.tests.unit.api.openstack import fakes
+from nova.tests.unit import fake_instance
+
+UUID1 = '00000000-0000-0000-0000-000000000001'
+UUID2 = '00000000-0000-0000-0000-000000000002'
+MISSING_UUID = '00000000-0000-0000-0000-000000000003'
+
+
+class ServerBulkActionsTestV21(test.NoDBTestCase):
+    def setUp(self):
+        super(ServerBulkActionsTestV21, self).setUp()
+        self.controller = server_bulk_actions.ServerBulkActionsController()
+        self.req = fakes.HTTPRequest.blank('', version='2.26')
+        self.context = self.req.environ['nova.context']
+        self.instances = objects.InstanceList(objects=[
+            fake_instance.fake_instance_obj(self.context, uuid=UUID1,
+                                            host='host1'),
+            fake_instance.fake_instance_obj(self.context, uuid=UUID2,
+                                            host='host2')])
+
+    def _create(self, action, uuids, **kwargs):
+        body = {'bulk_action': dict(action=action, servers=uuids, **kwargs)}
+        with mock.patch.object(self.controller.compute_api, 'get_all',
+                               return_value=self.instances) as mock_get_all:
+            response = self.controller.create(self.req, body=body)
+        search_opts = mock_get_all.call_args[1]['search_opts']
+        self.assertEqual(sorted(set(uuids)), sorted(search_opts['uuid']))
+        self.assertEqual(self.context.project_id, search_opts['project_id'])
+        return response
+
+    @mock.patch('nova.compute.api.API.stop')
+    def test_stop(self, mock_stop):
+        response = self._create('stop', [UUID1, UUID2, UUID1])
+
+        self.assertEqual(202, response._code)
+        self.assertEqual({'servers': [{'id': UUID1, 'code': 202},
+                                      {'id': UUID2, 'code': 202}]},
+                         response.obj)
+        mock_stop.assert_has_calls([mock.call(self.context, instance)
+                                    for instance in self.instances])
+
+    @mock.patch('nova.compute.api.API.reboot')
+    def test_reboot(self, mock_reboot):
+        response = self._create('reboot', [UUID1, UUID2],
+                                reboot_type='hard')
+
+        self.assertEqual(202, response._code)
+        mock_reboot.assert_has_calls([
+            mock.call(self.context, instance, 'HARD')
+            for instance in self.instances])
+
+    @mock.patch('nova.compute.api.API.start')
+    def test_start_partial_failure(self, mock_start):
+        mock_start.side_effect = [
+            None, exception.InstanceIsLocked(instance_uuid=UUID2)]
+
+        response = self._create('start', [UUID1, UUID2, MISSING_UUID])
+
+        self.assertEqual(207, response._code)
+        servers = response.obj['servers']
+        self.assertEqual([UUID1, UUID2, MISSING_UUID],
+                         [server['id'] for server in servers])
+        self.assertEqual([202, 409, 404],
+                         [server['code'] for server in servers])
+        self.assertNotIn('message', servers[0])
+        self.assertIn('message', servers[1])
+
+    @mock.patch('nova.compute.api.API.start')
+    def test_start_not_authorized(self, mock_start):
+        rules = {'os_compute_api:servers:start': 'project_id:non_fake'}
+        self.policy.set_rules(rules)
+
+        response = self._create('start', [UUID1, UUID2])
+
+        self.assertEqual(207, response._code)
+        self.assertEqual([403, 403], [server['code'] for server in
+                                      response.obj['servers']])
+        self.assertFalse(mock_start.called)
+
+    def test_no_servers_found(self):
+        self.instances = objects.InstanceList(objects=[])
+        self.assertRaises(webob.exc.HTTPNotFound, self._create, 'start',
+                          [MISSING_UUID])
+
+    def test_invalid_action(self):
+        body = {'bulk_action': {'action': 'delete', 'servers': [UUID1]}}
+        self.assertRaises(exception.ValidationError, self.controller.create,
+                          self.req, body=body)
+
+    def test_not_found_before_microversion(self):
+        req = fakes.HTTPRequest.blank('', version='2.25')
+        body = {'bulk_action': {'action': 'start', 'servers': [UUID1]}}
+        self.assertRaises(exception.VersionNotFoundForAPIMethod,
+                          self.controller.create, req, body=body)
@@ -717,7 +717,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          limit=None, marker=None, want_objects=False,
-                         expected_attrs=None, sort_keys=None, sort_dirs=None):
+                         expected_attrs=None, sort_keys=None, sort_dirs=None,
+                         stale_ok=False):
             db_list = [fakes.stub_instance(100, uuid=server_uuid)]
             return instance_obj._make_instance_list(
                 context, objects.InstanceList(), db_list, FIELDS)
@@ -735,7 +736,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          limit=None, marker=None, want_objects=False,
-                         expected_attrs=None, sort_keys=None, sort_dirs=None):
+                         expected_attrs=None, sort_keys=None, sort_dirs=None,
+                         stale_ok=False):
             self.assertIsNotNone(search_opts)
             self.assertIn('image', search_opts)
             self.assertEqual(search_opts['image'], '12345')
@@ -878,7 +880,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          limit=None, marker=None, want_objects=False,
-                         expected_attrs=None, sort_keys=None, sort_dirs=None):
+                         expected_attrs=None, sort_keys=None, sort_dirs=None,
+                         stale_ok=False):
             self.assertIsNotNone(search_opts)
             self.assertIn('flavor', search_opts)
             # flavor is an integer ID
@@ -915,7 +918,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          limit=None, marker=None, want_objects=False,
-                         expected_attrs=None, sort_keys=None, sort_dirs=None):
+                         expected_attrs=None, sort_keys=None, sort_dirs=None,
+                         stale_ok=False):
             self.assertIsNotNone(search_opts)
             self.assertIn('vm_state', search_opts)
             self.assertEqual(search_opts['vm_state'], [vm_states.ACTIVE])
@@ -936,7 +940,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          limit=None, marker=None, want_objects=False,
-                         expected_attrs=None, sort_keys=None, sort_dirs=None):
+                         expected_attrs=None, sort_keys=None, sort_dirs=None,
+                         stale_ok=False):
             self.assertIsNotNone(search_opts)
             self.assertIn('task_state', search_opts)
             self.assertEqual([task_states.REBOOT_PENDING,
@@ -961,7 +966,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          limit=None, marker=None, want_objects=False,
-                         expected_attrs=None, sort_keys=None, sort_dirs=None):
+                         expected_attrs=None, sort_keys=None, sort_dirs=None,
+                         stale_ok=False):
             self.assertIn('vm_state', search_opts)
             self.assertEqual(search_opts['vm_state'],
                              [vm_states.ACTIVE, vm_states.STOPPED])
@@ -995,7 +1001,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          limit=None, marker=None, want_objects=False,
-                         expected_attrs=None, sort_keys=None, sort_dirs=None):
+                         expected_attrs=None, sort_keys=None, sort_dirs=None,
+                         stale_ok=False):
             self.assertIn('vm_state', search_opts)
             self.assertEqual(search_opts['vm_state'], ['deleted'])
 
@@ -1034,7 +1041,7 @@ class ServersControllerTest(ControllerTest):
             mock.ANY, search_opts=expected_search_opts, limit=mock.ANY,
             expected_attrs=['flavor', 'info_cache', 'metadata', 'pci_devices'],
             marker=mock.ANY, want_objects=mock.ANY,
-            sort_keys=mock.ANY, sort_dirs=mock.ANY)
+            sort_keys=mock.ANY, sort_dirs=mock.ANY, stale_ok=True)
 
     @mock.patch.object(compute_api.API, 'get_all')
     def test_get_servers_deleted_filter_invalid_str(self, mock_get_all):
@@ -1058,14 +1065,15 @@ class ServersControllerTest(ControllerTest):
             mock.ANY, search_opts=expected_search_opts, limit=mock.ANY,
             expected_attrs=['flavor', 'info_cache', 'metadata', 'pci_devices'],
             marker=mock.ANY, want_objects=mock.ANY,
-            sort_keys=mock.ANY, sort_dirs=mock.ANY)
+            sort_keys=mock.ANY, sort_dirs=mock.ANY, stale_ok=True)
 
     def test_get_servers_allows_name(self):
         server_uuid = str(uuid.uuid4())
 
         def fake_get_all(compute_self, context, search_opts=None,
                          limit=None, marker=None, want_objects=False,
-                         expected_attrs=None, sort_keys=None, sort_dirs=None):
+                         expected_attrs=None, sort_keys=None, sort_dirs=None,
+                         stale_ok=False):
             self.assertIsNotNone(search_opts)
             self.assertIn('name', search_opts)
             self.assertEqual(search_opts['name'], 'whee.*')
@@ -1095,7 +1103,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          limit=None, marker=None, want_objects=False,
-                         expected_attrs=None, sort_keys=None, sort_dirs=None):
+                         expected_attrs=None, sort_keys=None, sort_dirs=None,
+                         stale_ok=False):
             self.assertIsNotNone(search_opts)
             self.assertIn('changes-since', search_opts)
             changes_since = datetime.datetime(2011, 1, 24, 17, 8, 1,
@@ -1128,7 +1137,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          limit=None, marker=None, want_objects=False,
-                         expected_attrs=None, sort_keys=None, sort_dirs=None):
+                         expected_attrs=None, sort_keys=None, sort_dirs=None,
+                         stale_ok=False):
             self.assertIsNotNone(search_opts)
             # Allowed by user
             self.assertIn('name', search_opts)
@@ -1158,7 +1168,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          limit=None, marker=None, want_objects=False,
-                         expected_attrs=None, sort_keys=None, sort_dirs=None):
+                         expected_attrs=None, sort_keys=None, sort_dirs=None,
+                         stale_ok=False):
             self.assertIsNotNone(search_opts)
             # Allowed by user
             self.assertIn('name', search_opts)
@@ -1187,7 +1198,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          limit=None, marker=None, want_objects=False,
-                         expected_attrs=None, sort_keys=None, sort_dirs=None):
+                         expected_attrs=None, sort_keys=None, sort_dirs=None,
+                         stale_ok=False):
             self.assertIsNotNone(search_opts)
             self.assertIn('ip', search_opts)
             self.assertEqual(search_opts['ip'], '10\..*')
@@ -1210,7 +1222,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          limit=None, marker=None, want_objects=False,
-                         expected_attrs=None, sort_keys=None, sort_dirs=None):
+                         expected_attrs=None, sort_keys=None, sort_dirs=None,
+                         stale_ok=False):
             self.assertIsNotNone(search_opts)
             self.assertIn('ip6', search_opts)
             self.assertEqual(search_opts['ip6'], 'ffff.*')
@@ -1234,7 +1247,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          limit=None, marker=None, want_objects=False,
-                         expected_attrs=None, sort_keys=None, sort_dirs=None):
+                         expected_attrs=None, sort_keys=None, sort_dirs=None,
+                         stale_ok=False):
             self.assertIsNotNone(search_opts)
             self.assertIn('ip6', search_opts)
             self.assertEqual(search_opts['ip6'], 'ffff.*')
@@ -1317,7 +1331,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          limit=None, marker=None, want_objects=False,
-                         expected_attrs=None, sort_keys=None, sort_dirs=None):
+                         expected_attrs=None, sort_keys=None, sort_dirs=None,
+                         stale_ok=False):
             self.assertEqual(['pci_devices'], expected_attrs)
             return []
 
@@ -3926,6 +3941,18 @@ class ServersViewBuilderTest(test.TestCase):
         output = self.view_builder.show(self.request, self.instance)
         self.assertThat(output, matchers.DictMatches(expected_server))
 
+    def test_build_server_list_detail_with_view_contributors(self):
+        def contribute(server, instance):
+            server['extra'] = instance['uuid']
+
+        self.request.add_view_contributor('servers', contribute)
+        self.request.add_view_contributor('flavors', mock.Mock())
+        output = self.view_builder.detail(self.request, [self.instance])
+
+        server = output['servers'][0]
+        self.assertEqual(self.uuid, server['extra'])
+        self.assertEqual('test_server', server['name'])
+
 
 class ServersAllExtensionsTestCase(test.TestCase):
     """Servers tests using default API router with all extensions enabled.
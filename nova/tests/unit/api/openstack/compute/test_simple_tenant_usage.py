@@ -311,6 +311,53 @@ class SimpleTenantUsageControllerTestV2(SimpleTenantUsageControllerTestV21):
     controller = simple_tenant_usage_v2.SimpleTenantUsageController()
 
 
+class SimpleTenantUsageAggregateInDBTestV21(test.NoDBTestCase):
+    controller = simple_tenant_usage_v21.SimpleTenantUsageController()
+
+    def setUp(self):
+        super(SimpleTenantUsageAggregateInDBTestV21, self).setUp()
+        self.flags(simple_tenant_usage_aggregate_in_db=True)
+        self.context = context.RequestContext('fakeadmin_0', 'faketenant_0',
+                                              is_admin=True)
+
+    def _get_tenant_usages(self, detailed):
+        req = fakes.HTTPRequest.blank('?detailed=%s&start=%s&end=%s' %
+                    (detailed, START.isoformat(), STOP.isoformat()))
+        req.environ['nova.context'] = self.context
+        return self.controller.index(req)['tenant_usages']
+
+    @mock.patch.object(objects.InstanceList, 'get_active_by_window_joined')
+    @mock.patch.object(objects.InstanceList, 'get_usage_by_window')
+    def test_simple_index(self, mock_usage, mock_get_active):
+        mock_usage.return_value = [{'project_id': 'faketenant_0',
+                                    'hours': HOURS,
+                                    'vcpus_hours': VCPUS * HOURS,
+                                    'memory_mb_hours': MEMORY_MB * HOURS,
+                                    'local_gb_hours': ROOT_GB * HOURS}]
+
+        usages = self._get_tenant_usages('0')
+
+        self.assertEqual(1, len(usages))
+        self.assertEqual({'tenant_id': 'faketenant_0',
+                          'total_hours': HOURS,
+                          'total_vcpus_usage': VCPUS * HOURS,
+                          'total_memory_mb_usage': MEMORY_MB * HOURS,
+                          'total_local_gb_usage': ROOT_GB * HOURS,
+                          'start': timeutils.normalize_time(START),
+                          'stop': timeutils.normalize_time(STOP)},
+                         usages[0])
+        self.assertFalse(mock_get_active.called)
+
+    @mock.patch.object(objects.InstanceList, 'get_active_by_window_joined',
+                       return_value=[])
+    @mock.patch.object(objects.InstanceList, 'get_usage_by_window')
+    def test_detailed_index_loads_instances(self, mock_usage,
+                                            mock_get_active):
+        self.assertEqual([], list(self._get_tenant_usages('1')))
+        self.assertTrue(mock_get_active.called)
+        self.assertFalse(mock_usage.called)
+
+
 class SimpleTenantUsageUtilsV21(test.NoDBTestCase):
     simple_tenant_usage = simple_tenant_usage_v21
 
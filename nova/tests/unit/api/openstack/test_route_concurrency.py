@@ -0,0 +1,114 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import webob
+
+from nova.api.openstack import route_concurrency
+from nova.api.openstack import wsgi
+from nova import test
+from nova.tests.unit.api.openstack import fakes
+
+
+class FakeController(object):
+    def index(self, req):
+        return {'items': []}
+
+    def show(self, req, id):
+        return {'item': id}
+
+
+class RouteLimiterTestCase(test.NoDBTestCase):
+    def test_acquire_release(self):
+        limiter = route_concurrency.RouteLimiter('foo', 1, 0, 0)
+        self.assertIsNone(limiter.acquire())
+        self.assertEqual(1, limiter.get_stats()['in_flight'])
+        limiter.release()
+        self.assertEqual(0, limiter.get_stats()['in_flight'])
+        self.assertEqual(1, limiter.get_stats()['max_in_flight'])
+
+    def test_queue_full_rejected(self):
+        self.flags(osapi_route_retry_after=7)
+        limiter = route_concurrency.RouteLimiter('foo', 1, 0, 10)
+        self.assertIsNone(limiter.acquire())
+        error = limiter.acquire()
+        self.assertIsInstance(error, webob.exc.HTTPTooManyRequests)
+        self.assertEqual('7', error.headers['Retry-After'])
+        self.assertEqual(1, limiter.get_stats()['rejected'])
+
+    def test_queue_timeout(self):
+        limiter = route_concurrency.RouteLimiter('foo', 1, 1, 0)
+        self.assertIsNone(limiter.acquire())
+        error = limiter.acquire()
+        self.assertIsInstance(error, webob.exc.HTTPServiceUnavailable)
+        stats = limiter.get_stats()
+        self.assertEqual(1, stats['timed_out'])
+        self.assertEqual(0, stats['waiting'])
+        self.assertEqual(1, stats['max_waiting'])
+
+
+class GetLimiterTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(GetLimiterTestCase, self).setUp()
+        self.addCleanup(route_concurrency.reset)
+        self.controller = FakeController()
+
+    def test_no_limits(self):
+        self.assertIsNone(route_concurrency.get_limiter(self.controller.show))
+
+    def test_method_limit_takes_precedence(self):
+        self.flags(osapi_route_concurrency={'FakeController': '5',
+                                            'FakeController.show': '2'})
+        limiter = route_concurrency.get_limiter(self.controller.show)
+        self.assertEqual('FakeController.show', limiter.name)
+        self.assertEqual(2, limiter.limit)
+        limiter = route_concurrency.get_limiter(self.controller.index)
+        self.assertEqual('FakeController', limiter.name)
+        self.assertEqual(5, limiter.limit)
+        self.assertIs(limiter,
+                      route_concurrency.get_limiter(self.controller.index))
+        self.assertEqual(['FakeController', 'FakeController.show'],
+                         sorted(route_concurrency.get_stats()))
+
+    def test_invalid_limit_ignored(self):
+        self.flags(osapi_route_concurrency={'FakeController': 'many'})
+        self.assertIsNone(route_concurrency.get_limiter(self.controller.show))
+
+
+class ResourceConcurrencyTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(ResourceConcurrencyTestCase, self).setUp()
+        self.addCleanup(route_concurrency.reset)
+        self.flags(osapi_route_concurrency={'FakeController.index': '1'},
+                   osapi_route_queue_size=0)
+        self.app = fakes.TestRouter(FakeController())
+
+    def test_rejected_when_saturated(self):
+        limiter = route_concurrency.get_limiter(FakeController().index)
+        self.assertIsNone(limiter.acquire())
+        response = webob.Request.blank('/tests').get_response(self.app)
+        self.assertEqual(429, response.status_int)
+        self.assertIn('Retry-After', response.headers)
+
+        # Other routes are not affected
+        response = webob.Request.blank('/tests/1').get_response(self.app)
+        self.assertEqual(200, response.status_int)
+
+        limiter.release()
+        response = webob.Request.blank('/tests').get_response(self.app)
+        self.assertEqual(200, response.status_int)
+        self.assertEqual(0, limiter.get_stats()['in_flight'])
+
+    def test_fault_retry_after(self):
+        error = webob.exc.HTTPServiceUnavailable(
+            headers={'Retry-After': '5'})
+        response = wsgi.Fault(error)(wsgi.Request.blank('/'))
+        self.assertIn(b'"retryAfter": "5"', response.body)
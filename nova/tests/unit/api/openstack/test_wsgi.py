@@ -215,6 +215,26 @@ class JSONDictSerializerTest(test.NoDBTestCase):
         result = result.replace('\n', '').replace(' ', '')
         self.assertEqual(result, expected_json)
 
+    def test_serialize_chunks_matches_serialize(self):
+        input_dict = {'servers': [{'id': i, 'name': u'server\u00e9-%d' % i}
+                                  for i in range(123)],
+                      'servers_links': [{'rel': 'next', 'href': 'fake'}],
+                      'empty': [],
+                      'count': 123}
+        serializer = wsgi.JSONDictSerializer()
+        chunks = list(serializer.serialize_chunks(input_dict))
+        self.assertGreater(len(chunks), 3)
+        self.assertEqual(serializer.serialize(input_dict).encode('utf-8'),
+                         b''.join(chunks))
+
+    def test_can_stream(self):
+        can_stream = wsgi.JSONDictSerializer.can_stream
+        self.assertTrue(can_stream({'servers': [1, 2]}, 2))
+        self.assertFalse(can_stream({'servers': [1, 2]}, 3))
+        self.assertFalse(can_stream({'servers': [1, 2]}, 0))
+        self.assertFalse(can_stream({1: [1, 2]}, 1))
+        self.assertFalse(can_stream(None, 1))
+
 
 class JSONDeserializerTest(test.NoDBTestCase):
     def test_json(self):
@@ -345,6 +365,42 @@ class ResourceTest(test.NoDBTestCase):
         self.assertEqual(b'success', response.body)
         self.assertEqual(response.status_int, 200)
 
+    def test_resource_call_with_etag(self):
+        class Controller(object):
+            @wsgi.etag('2.28')
+            def index(self, req):
+                return {'foo': 'bar'}
+
+        app = fakes.TestRouterV21(Controller())
+        req = webob.Request.blank('/tests')
+        req.headers[self.header_name] = '2.28'
+        response = req.get_response(app)
+        self.assertEqual(200, response.status_int)
+        etag = response.headers['ETag']
+        self.assertTrue(etag.startswith('"') and etag.endswith('"'))
+
+        req = webob.Request.blank('/tests')
+        req.headers[self.header_name] = '2.28'
+        req.headers['If-None-Match'] = etag
+        response = req.get_response(app)
+        self.assertEqual(304, response.status_int)
+        self.assertEqual(b'', response.body)
+        self.assertEqual(etag, response.headers['ETag'])
+
+    def test_resource_call_with_etag_old_version(self):
+        class Controller(object):
+            @wsgi.etag('2.28')
+            def index(self, req):
+                return {'foo': 'bar'}
+
+        app = fakes.TestRouterV21(Controller())
+        req = webob.Request.blank('/tests')
+        req.headers[self.header_name] = '2.27'
+        req.headers['If-None-Match'] = '*'
+        response = req.get_response(app)
+        self.assertEqual(200, response.status_int)
+        self.assertNotIn('ETag', response.headers)
+
     def test_resource_call_with_method_post(self):
         class Controller(object):
             @extensions.expected_errors(400)
@@ -1058,6 +1114,55 @@ class ResponseObjectTest(test.NoDBTestCase):
         hdrs['hEADER'] = 'bar'
         self.assertEqual(robj['hEADER'], 'foo')
 
+    def test_serialize_streams_long_lists(self):
+        self.flags(osapi_stream_response_threshold=2)
+        robj = wsgi.ResponseObject({'servers': [{'id': 1}, {'id': 2}]})
+        response = robj.serialize(wsgi.Request.blank('/'),
+                                  'application/json')
+        self.assertIsNone(response.content_length)
+        self.assertEqual(b'{"servers": [{"id": 1}, {"id": 2}]}',
+                         response.body)
+
+    def test_serialize_short_lists_not_streamed(self):
+        self.flags(osapi_stream_response_threshold=3)
+        robj = wsgi.ResponseObject({'servers': [{'id': 1}, {'id': 2}]})
+        response = robj.serialize(wsgi.Request.blank('/'),
+                                  'application/json')
+        self.assertEqual(len(response.body), response.content_length)
+
+    def test_serialize_etag(self):
+        self.flags(osapi_stream_response_threshold=2)
+        robj = wsgi.ResponseObject({'servers': [{'id': 1}, {'id': 2}]})
+        robj._etag = True
+        response = robj.serialize(wsgi.Request.blank('/'),
+                                  'application/json')
+        self.assertEqual(200, response.status_int)
+        self.assertEqual(len(response.body), response.content_length)
+        self.assertIn('ETag', response.headers)
+
+        req = wsgi.Request.blank('/')
+        req.headers['If-None-Match'] = response.headers['ETag']
+        response = robj.serialize(req, 'application/json')
+        self.assertEqual(304, response.status_int)
+        self.assertEqual(b'', response.body)
+
+    def test_serialize_etag_changed(self):
+        robj = wsgi.ResponseObject({'server': {'status': 'ACTIVE'}})
+        robj._etag = True
+        req = wsgi.Request.blank('/')
+        req.headers['If-None-Match'] = '"stale"'
+        response = robj.serialize(req, 'application/json')
+        self.assertEqual(200, response.status_int)
+        self.assertEqual(b'{"server": {"status": "ACTIVE"}}', response.body)
+        self.assertNotEqual('"stale"', response.headers['ETag'])
+
+    def test_serialize_etag_only_for_get(self):
+        robj = wsgi.ResponseObject({})
+        robj._etag = True
+        response = robj.serialize(wsgi.Request.blank('/', method='POST'),
+                                  'application/json')
+        self.assertNotIn('ETag', response.headers)
+
 
 class ValidBodyTest(test.NoDBTestCase):
 
@@ -10924,6 +10924,48 @@ class ComputeAPIAggrCallsSchedulerTestCase(test.NoDBTestCase):
             self.api.remove_host_from_aggregate(self.context, 1, 'fakehost')
         update_aggregates.assert_called_once_with(self.context, [agg])
 
+    def test_cache_images(self):
+        agg = objects.Aggregate(name='fake', hosts=['host1', 'host2'])
+        with test.nested(
+                mock.patch.object(objects.Aggregate, 'get_by_id',
+                                  return_value=agg),
+                mock.patch.object(self.api.image_api, 'get'),
+                mock.patch.object(self.api.compute_rpcapi, 'cache_images')
+        ) as (mock_get_agg, mock_get_image, mock_cache):
+            self.api.cache_images(self.context, 1, ['image1'], pin=True)
+        mock_get_image.assert_called_once_with(self.context, 'image1')
+        mock_cache.assert_has_calls([
+            mock.call(self.context, host='host1', image_ids=['image1'],
+                      pin=True),
+            mock.call(self.context, host='host2', image_ids=['image1'],
+                      pin=True)])
+
+    def test_cache_images_image_not_found(self):
+        agg = objects.Aggregate(name='fake', hosts=['host1'])
+        with test.nested(
+                mock.patch.object(objects.Aggregate, 'get_by_id',
+                                  return_value=agg),
+                mock.patch.object(self.api.image_api, 'get',
+                                  side_effect=exception.ImageNotFound(
+                                      image_id='image1')),
+                mock.patch.object(self.api.compute_rpcapi, 'cache_images')
+        ) as (mock_get_agg, mock_get_image, mock_cache):
+            self.assertRaises(exception.ImageNotFound,
+                              self.api.cache_images, self.context, 1,
+                              ['image1'])
+        self.assertFalse(mock_cache.called)
+
+    def test_unpin_images(self):
+        agg = objects.Aggregate(name='fake', hosts=['host1'])
+        with test.nested(
+                mock.patch.object(objects.Aggregate, 'get_by_id',
+                                  return_value=agg),
+                mock.patch.object(self.api.compute_rpcapi, 'unpin_images')
+        ) as (mock_get_agg, mock_unpin):
+            self.api.unpin_images(self.context, 1, ['image1'])
+        mock_unpin.assert_called_once_with(self.context, host='host1',
+                                           image_ids=['image1'])
+
 
 class ComputeAggrTestCase(BaseTestCase):
     """This is for unit coverage of aggregate-related methods
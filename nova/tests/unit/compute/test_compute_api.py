@@ -2866,10 +2866,12 @@ class _ComputeAPIUnitTestMixIn(object):
                 'ensure_default')
         @mock.patch.object(self.compute_api, '_validate_bdm')
         @mock.patch.object(self.compute_api, '_create_block_device_mapping')
+        @mock.patch.object(objects.RequestSpec, 'create_all')
         @mock.patch.object(objects.RequestSpec, 'from_components')
         @mock.patch.object(objects, 'BuildRequest')
         def do_test(_mock_build_req,
-                mock_req_spec_from_components, _mock_create_bdm,
+                mock_req_spec_from_components, mock_req_spec_create_all,
+                _mock_create_bdm,
                 _mock_validate_bdm, _mock_ensure_default, _mock_create,
                 mock_check_num_inst_quota):
             quota_mock = mock.MagicMock()
@@ -2925,7 +2927,8 @@ class _ComputeAPIUnitTestMixIn(object):
                     mock.ANY, boot_meta, flavor, base_options['numa_topology'],
                     base_options['pci_requests'], filter_properties,
                     instance_group, base_options['availability_zone'])
-            req_spec_mock.create.assert_called_once_with()
+            mock_req_spec_create_all.assert_called_once_with(ctxt,
+                    [req_spec_mock])
 
         do_test()
 
@@ -2937,11 +2940,13 @@ class _ComputeAPIUnitTestMixIn(object):
                 'ensure_default')
         @mock.patch.object(self.compute_api, '_validate_bdm')
         @mock.patch.object(self.compute_api, '_create_block_device_mapping')
+        @mock.patch.object(objects.RequestSpec, 'create_all')
         @mock.patch.object(objects.RequestSpec, 'from_components')
         @mock.patch.object(objects, 'BuildRequest')
         def do_test(mock_build_req, mock_req_spec_from_components,
-                _mock_create_bdm, _mock_validate_bdm, _mock_ensure_default,
-                _mock_inst_create, _mock_inst_save, mock_check_num_inst_quota):
+                _mock_req_spec_create_all, _mock_create_bdm,
+                _mock_validate_bdm, _mock_ensure_default, _mock_inst_create,
+                _mock_inst_save, mock_check_num_inst_quota):
             quota_mock = mock.MagicMock()
             req_spec_mock = mock.MagicMock()
             build_req_mock = mock.MagicMock()
@@ -3039,6 +3044,66 @@ class _ComputeAPIUnitTestMixIn(object):
 
         do_test()
 
+    @mock.patch.object(objects.InstanceGroup, 'add_members')
+    @mock.patch.object(objects.Quotas, 'limit_check')
+    @mock.patch.object(objects.Quotas, 'count', return_value=3)
+    @mock.patch.object(objects.RequestSpec, 'create_all')
+    @mock.patch.object(objects.RequestSpec, 'from_components')
+    def test_provision_instances_server_group_batch(self, mock_from_comps,
+            mock_create_all, mock_count, mock_limit_check, mock_add_members):
+        quota_mock = mock.MagicMock()
+        instances = [mock.Mock(uuid=uuids.inst1), mock.Mock(uuid=uuids.inst2)]
+        group = objects.InstanceGroup(uuid=uuids.group)
+        ctxt = context.RequestContext('fake-user', 'fake-project')
+        base_options = {'numa_topology': None, 'pci_requests': None,
+                        'availability_zone': None,
+                        'display_name': 'fake-name'}
+        with test.nested(
+            mock.patch.object(self.compute_api, '_check_num_instances_quota',
+                              return_value=(2, quota_mock)),
+            mock.patch.object(self.compute_api, '_create_build_request'),
+            mock.patch.object(self.compute_api,
+                              'create_db_entry_for_new_instance',
+                              side_effect=instances),
+            mock.patch.object(compute_api.notifications,
+                              'send_update_with_states'),
+            mock.patch.object(objects.Instance, 'update'),
+        ):
+            result = self.compute_api._provision_instances(ctxt,
+                    mock.sentinel.flavor, 1, 2, base_options, {}, [], [],
+                    True, group, True, {})
+
+        self.assertEqual(instances, result)
+        self.assertEqual(1, mock_create_all.call_count)
+        self.assertEqual(2, len(mock_create_all.call_args[0][1]))
+        mock_count.assert_called_once_with(ctxt, 'server_group_members',
+                                           group, ctxt.user_id)
+        mock_limit_check.assert_called_once_with(ctxt,
+                                                 server_group_members=5)
+        mock_add_members.assert_called_once_with(ctxt, uuids.group,
+                                                 [uuids.inst1, uuids.inst2])
+        quota_mock.commit.assert_called_once_with()
+
+    @mock.patch.object(objects.RequestSpec, 'create_all')
+    @mock.patch.object(objects.Quotas, 'limit_check',
+                       side_effect=exception.OverQuota(overs='fake'))
+    @mock.patch.object(objects.Quotas, 'count', return_value=9)
+    def test_provision_instances_server_group_over_quota(self, mock_count,
+            mock_limit_check, mock_create_all):
+        quota_mock = mock.MagicMock()
+        group = objects.InstanceGroup(uuid=uuids.group)
+        ctxt = context.RequestContext('fake-user', 'fake-project')
+        with mock.patch.object(self.compute_api, '_check_num_instances_quota',
+                               return_value=(2, quota_mock)):
+            self.assertRaises(exception.QuotaError,
+                              self.compute_api._provision_instances, ctxt,
+                              mock.sentinel.flavor, 1, 2, {}, {}, [], [],
+                              True, group, True, {})
+        mock_limit_check.assert_called_once_with(ctxt,
+                                                 server_group_members=11)
+        self.assertFalse(mock_create_all.called)
+        quota_mock.rollback.assert_called_once_with()
+
     def _test_rescue(self, vm_state=vm_states.ACTIVE, rescue_password=None,
                      rescue_image=None, clean_shutdown=True):
         instance = self._create_instance_obj(params={'vm_state': vm_state})
@@ -3243,6 +3308,20 @@ class _ComputeAPIUnitTestMixIn(object):
         filters = mock_get.call_args_list[0][0][1]
         self.assertEqual({'project_id': 'foo'}, filters)
 
+    @mock.patch.object(objects.InstanceList, 'get_by_filters')
+    @mock.patch.object(objects.InstanceList, 'get_by_filters_stale_ok')
+    def test_get_all_stale_ok(self, mock_stale_ok, mock_get):
+        api = compute_api.API()
+        api.get_all(self.context, search_opts={'tenant_id': 'foo'},
+                    want_objects=True, stale_ok=True)
+        self.assertEqual({'project_id': 'foo'},
+                         mock_stale_ok.call_args[1]['filters'])
+        self.assertFalse(mock_get.called)
+
+        api.get_all(self.context, want_objects=True)
+        self.assertTrue(mock_get.called)
+        self.assertEqual(1, mock_stale_ok.call_count)
+
     def test_metadata_invalid_return_empty_object(self):
         api = compute_api.API()
         ret = api.get_all(self.context, want_objects=True,
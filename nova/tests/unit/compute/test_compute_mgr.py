@@ -1967,6 +1967,26 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
             detach_interface.assert_called_once_with(inst_obj, vif2)
         do_test()
 
+    def test_cache_images(self):
+        with mock.patch.object(self.compute.driver,
+                               'cache_images') as mock_cache:
+            self.compute.cache_images(self.context, ['image1'], pin=True)
+        mock_cache.assert_called_once_with(self.context, ['image1'],
+                                           pin=True)
+
+    @mock.patch.object(manager.LOG, 'warning')
+    def test_cache_images_not_implemented(self, mock_warning):
+        with mock.patch.object(self.compute.driver, 'cache_images',
+                               side_effect=NotImplementedError):
+            self.compute.cache_images(self.context, ['image1'])
+        self.assertTrue(mock_warning.called)
+
+    def test_unpin_images(self):
+        with mock.patch.object(self.compute.driver,
+                               'unpin_images') as mock_unpin:
+            self.compute.unpin_images(self.context, ['image1'])
+        mock_unpin.assert_called_once_with(self.context, ['image1'])
+
     def test_external_instance_event(self):
         instances = [
             objects.Instance(id=1, uuid=uuids.instance_1),
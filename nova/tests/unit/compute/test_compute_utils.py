@@ -18,6 +18,7 @@
 
 import copy
 import string
+import sys
 import uuid
 
 import mock
@@ -740,3 +741,79 @@ class ComputeUtilsQuotaDeltaTestCase(test.TestCase):
         compute_utils.reserve_quota_delta(self.context, deltas, inst)
         mock_reserve.assert_called_once_with(project_id=inst.project_id,
                                              user_id=inst.user_id, **deltas)
+
+
+class BufferedEventRecorderTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(BufferedEventRecorderTestCase, self).setUp()
+        self.context = context.RequestContext('fake-user', 'fake-project')
+        self.recorder = compute_utils.BufferedEventRecorder(60, 10)
+
+    @mock.patch.object(objects.InstanceActionEventList, 'record_events')
+    def test_start_and_finish_coalesced(self, mock_record):
+        self.recorder.event_start(self.context, uuids.instance, 'foo')
+        self.recorder.event_finish(self.context, uuids.instance, 'foo')
+        self.assertFalse(mock_record.called)
+
+        self.recorder.flush()
+
+        events = mock_record.call_args[0][1]
+        self.assertEqual(1, len(events))
+        self.assertEqual('foo', events[0]['event'])
+        self.assertEqual('Success', events[0]['result'])
+        self.assertIn('start_time', events[0])
+        self.assertIn('finish_time', events[0])
+        self.assertFalse(events[0]['use_last_action'])
+
+        mock_record.reset_mock()
+        self.recorder.flush()
+        self.assertFalse(mock_record.called)
+
+    @mock.patch.object(objects.InstanceActionEventList, 'record_events')
+    def test_finish_with_failure(self, mock_record):
+        try:
+            raise test.TestingException('oops')
+        except test.TestingException as e:
+            self.recorder.event_finish(self.context, uuids.instance, 'foo',
+                                       exc_val=e,
+                                       exc_tb=sys.exc_info()[2])
+        self.recorder.flush()
+
+        event = mock_record.call_args[0][1][0]
+        self.assertEqual('Error', event['result'])
+        self.assertEqual('oops', event['message'])
+        self.assertIsInstance(event['traceback'], six.string_types)
+
+    @mock.patch.object(objects.InstanceActionEventList, 'record_events')
+    def test_flush_when_full(self, mock_record):
+        self.recorder.flush_size = 2
+        self.recorder.event_start(self.context, uuids.instance, 'foo')
+        self.assertFalse(mock_record.called)
+        self.recorder.event_start(self.context, uuids.instance, 'bar')
+        self.assertEqual(2, len(mock_record.call_args[0][1]))
+
+    @mock.patch.object(objects.InstanceActionEventList, 'record_events',
+                       side_effect=test.TestingException)
+    def test_flush_failure_logged(self, mock_record):
+        self.recorder.event_start(self.context, uuids.instance, 'foo')
+        with mock.patch.object(compute_utils.LOG, 'exception') as mock_log:
+            self.recorder.flush()
+        self.assertTrue(mock_log.called)
+
+    @mock.patch.object(objects.InstanceActionEvent, 'event_start')
+    @mock.patch.object(objects.InstanceActionEventList, 'record_events')
+    def test_event_reporter_uses_recorder(self, mock_record, mock_start):
+        self.flags(instance_event_flush_interval=60)
+        with mock.patch.object(compute_utils.BufferedEventRecorder,
+                               'start'):
+            compute_utils.start_event_recorder()
+        self.addCleanup(compute_utils.stop_event_recorder)
+
+        with compute_utils.EventReporter(self.context, 'foo',
+                                         uuids.instance):
+            pass
+        self.assertFalse(mock_start.called)
+        self.assertFalse(mock_record.called)
+
+        compute_utils.stop_event_recorder()
+        self.assertEqual(1, len(mock_record.call_args[0][1]))
@@ -21,6 +21,7 @@ from oslo_serialization import jsonutils
 
 from nova.cells import utils as cells_utils
 from nova import compute
+from nova.compute import api as compute_api
 from nova import context
 from nova import exception
 from nova import objects
@@ -484,3 +485,61 @@ class ComputeHostAPICellsTestCase(ComputeHostAPITestCase):
         self.mox.ReplayAll()
         result = self.host_api.get_host_uptime(self.ctxt, 'fake-host')
         self.assertEqual('fake-response', result)
+
+
+class ComputeHostAPIHypervisorCacheTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(ComputeHostAPIHypervisorCacheTestCase, self).setUp()
+        self.flags(hypervisor_cache_seconds=30)
+        compute_api.reset_hypervisor_cache()
+        self.addCleanup(compute_api.reset_hypervisor_cache)
+        self.host_api = compute_api.HostAPI()
+        self.ctxt = context.get_admin_context()
+
+    @mock.patch('nova.db.compute_node_statistics')
+    def test_compute_node_statistics_cached(self, mock_stats):
+        mock_stats.return_value = {'count': 1}
+        for i in range(3):
+            self.assertEqual({'count': 1},
+                             self.host_api.compute_node_statistics(self.ctxt))
+        mock_stats.assert_called_once_with(self.ctxt)
+
+    @mock.patch('nova.db.compute_node_statistics')
+    def test_compute_node_statistics_expired(self, mock_stats):
+        mock_stats.side_effect = [{'count': 1}, {'count': 2}]
+        with mock.patch('oslo_utils.timeutils.utcnow_ts') as mock_now:
+            mock_now.return_value = 100
+            self.host_api.compute_node_statistics(self.ctxt)
+            mock_now.return_value = 131
+            self.assertEqual({'count': 2},
+                             self.host_api.compute_node_statistics(self.ctxt))
+        self.assertEqual(2, mock_stats.call_count)
+
+    @mock.patch('nova.db.compute_node_statistics')
+    def test_compute_node_statistics_cache_disabled(self, mock_stats):
+        self.flags(hypervisor_cache_seconds=0)
+        self.host_api.compute_node_statistics(self.ctxt)
+        self.host_api.compute_node_statistics(self.ctxt)
+        self.assertEqual(2, mock_stats.call_count)
+
+    @mock.patch.object(objects.ComputeNodeList, 'get_all')
+    def test_compute_node_get_all_cached(self, mock_get_all):
+        mock_get_all.return_value = objects.ComputeNodeList(objects=[
+            objects.ComputeNode(id=1, host='fake-host',
+                                hypervisor_hostname='fake-node')])
+        self.host_api.compute_node_get_all(self.ctxt)
+        nodes = self.host_api.compute_node_get_all(self.ctxt)
+
+        mock_get_all.assert_called_once_with(self.ctxt)
+        self.assertEqual(1, len(nodes))
+        self.assertEqual('fake-node', nodes[0].hypervisor_hostname)
+        self.assertEqual(self.ctxt, nodes[0]._context)
+
+    @mock.patch.object(objects.Service, 'get_by_id')
+    @mock.patch('nova.db.compute_node_statistics')
+    def test_service_delete_invalidates(self, mock_stats, mock_get):
+        mock_stats.return_value = {'count': 1}
+        self.host_api.compute_node_statistics(self.ctxt)
+        self.host_api.service_delete(self.ctxt, 1)
+        self.host_api.compute_node_statistics(self.ctxt)
+        self.assertEqual(2, mock_stats.call_count)
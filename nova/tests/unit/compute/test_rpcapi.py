@@ -169,6 +169,10 @@ class ComputeRpcAPITestCase(test.NoDBTestCase):
                 instance=self.fake_instance_obj, bdm=self.fake_volume_bdm,
                 version='4.0')
 
+    def test_cache_images(self):
+        self._test_compute_api('cache_images', 'cast', host='host',
+                image_ids=['fake-image'], pin=True, version='4.12')
+
     def test_change_instance_metadata(self):
         self._test_compute_api('change_instance_metadata', 'cast',
                 instance=self.fake_instance_obj, diff={}, version='4.0')
@@ -491,6 +495,10 @@ class ComputeRpcAPITestCase(test.NoDBTestCase):
                 instance=self.fake_instance_obj, bdms=[],
                 reservations=['uuid1', 'uuid2'], version='4.0')
 
+    def test_unpin_images(self):
+        self._test_compute_api('unpin_images', 'cast', host='host',
+                image_ids=['fake-image'], version='4.12')
+
     def test_unpause_instance(self):
         self._test_compute_api('unpause_instance', 'cast',
                                instance=self.fake_instance_obj)
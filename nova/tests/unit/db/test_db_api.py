@@ -236,6 +236,97 @@ class DecoratorTestCase(test.TestCase):
         mock_clone.assert_called_once_with(mode=enginefacade._READER)
         mock_using.assert_called_once_with(ctxt)
 
+    @mock.patch.object(sqlalchemy_api._replica_lag_monitor, 'get_lag')
+    @mock.patch.object(enginefacade._TransactionContextManager, 'using')
+    @mock.patch.object(enginefacade._TransactionContextManager, '_clone')
+    def _test_select_db_reader_mode_routing(self, expected_mode, mock_clone,
+                                            mock_using, mock_get_lag,
+                                            lag=0, max_staleness=30):
+
+        @db.select_db_reader_mode(max_staleness=max_staleness)
+        def func(self, context, value, use_slave=False):
+            pass
+
+        mock_get_lag.return_value = lag
+        mock_clone.return_value = enginefacade._TransactionContextManager(
+            mode=expected_mode)
+        ctxt = context.get_admin_context()
+        func(self, ctxt, 'some_value')
+
+        mock_clone.assert_called_once_with(mode=expected_mode)
+        mock_using.assert_called_once_with(ctxt)
+        return mock_get_lag
+
+    def test_select_db_reader_mode_routing_disabled(self):
+        mock_get_lag = self._test_select_db_reader_mode_routing(
+            enginefacade._READER)
+        self.assertFalse(mock_get_lag.called)
+
+    def test_select_db_reader_mode_routing_within_tolerance(self):
+        self.flags(db_read_replica_routing=True)
+        self._test_select_db_reader_mode_routing(
+            enginefacade._ASYNC_READER, lag=5)
+
+    def test_select_db_reader_mode_routing_replica_lagging(self):
+        self.flags(db_read_replica_routing=True)
+        self._test_select_db_reader_mode_routing(
+            enginefacade._READER, lag=31)
+
+    def test_select_db_reader_mode_routing_lag_unknown(self):
+        self.flags(db_read_replica_routing=True)
+        self._test_select_db_reader_mode_routing(
+            enginefacade._READER, lag=None)
+
+    def test_select_db_reader_mode_routing_no_tolerance(self):
+        self.flags(db_read_replica_routing=True)
+        mock_get_lag = self._test_select_db_reader_mode_routing(
+            enginefacade._READER, max_staleness=None)
+        self.assertFalse(mock_get_lag.called)
+
+    def test_select_db_reader_mode_routing_config_override(self):
+        self.flags(db_read_replica_routing=True,
+                   db_read_replica_max_staleness={'func': '0'})
+        mock_get_lag = self._test_select_db_reader_mode_routing(
+            enginefacade._READER, lag=0)
+        self.assertFalse(mock_get_lag.called)
+
+
+class ReplicaLagMonitorTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(ReplicaLagMonitorTestCase, self).setUp()
+        self.monitor = sqlalchemy_api.ReplicaLagMonitor()
+        self.flags(slave_connection='sqlite://', group='database')
+
+    def test_get_lag_without_slave_connection(self):
+        self.flags(slave_connection=None, group='database')
+        self.assertEqual(0, self.monitor.get_lag())
+
+    @mock.patch.object(sqlalchemy_api.ReplicaLagMonitor, '_newest_heartbeat')
+    def test_get_lag(self, mock_heartbeat):
+        now = timeutils.utcnow()
+        mock_heartbeat.side_effect = [now, now - datetime.timedelta(
+            seconds=12)]
+        self.assertEqual(12, self.monitor.get_lag())
+
+    @mock.patch.object(sqlalchemy_api.ReplicaLagMonitor, '_newest_heartbeat')
+    def test_get_lag_cached(self, mock_heartbeat):
+        now = timeutils.utcnow()
+        mock_heartbeat.side_effect = [now, now]
+        self.assertEqual(0, self.monitor.get_lag())
+        self.assertEqual(0, self.monitor.get_lag())
+        self.assertEqual(2, mock_heartbeat.call_count)
+
+    @mock.patch.object(sqlalchemy_api.ReplicaLagMonitor, '_newest_heartbeat')
+    def test_get_lag_replica_error(self, mock_heartbeat):
+        mock_heartbeat.side_effect = [timeutils.utcnow(),
+                                      db_exc.DBConnectionError()]
+        self.assertIsNone(self.monitor.get_lag())
+
+    @mock.patch.object(sqlalchemy_api.ReplicaLagMonitor, '_newest_heartbeat')
+    def test_get_lag_replica_empty(self, mock_heartbeat):
+        mock_heartbeat.side_effect = [timeutils.utcnow(), None]
+        self.assertIsNone(self.monitor.get_lag())
+
 
 def _get_fake_aggr_values():
     return {'name': 'fake_aggregate'}
@@ -1190,6 +1281,45 @@ class SqlAlchemyDbApiTestCase(DbTestCase):
         self.assertIn('info_cache', result[0])
         self.assertEqual(network_info, result[0]['info_cache']['network_info'])
 
+    def test_instance_get_usage_by_window(self):
+        begin = datetime.datetime(2013, 10, 10, 12, 0, 0)
+        end = begin + datetime.timedelta(hours=10)
+        ctxt = context.get_admin_context()
+        flavor = {'vcpus': 2, 'memory_mb': 512, 'root_gb': 10,
+                  'ephemeral_gb': 5}
+        # Launched before the window, still running: charged 10 hours.
+        self.create_instance_with_args(
+            launched_at=begin - datetime.timedelta(hours=1), **flavor)
+        # Launched and terminated within the window: charged 2 hours.
+        self.create_instance_with_args(
+            launched_at=begin + datetime.timedelta(hours=1),
+            terminated_at=begin + datetime.timedelta(hours=3), **flavor)
+        # Terminated before the window: not charged.
+        self.create_instance_with_args(
+            launched_at=begin - datetime.timedelta(hours=3),
+            terminated_at=begin - datetime.timedelta(hours=2), **flavor)
+        # Never launched: not charged.
+        self.create_instance_with_args(**flavor)
+        other_ctxt = context.RequestContext('user', 'other-project')
+        self.create_instance_with_args(
+            context=other_ctxt,
+            launched_at=end - datetime.timedelta(minutes=30), **flavor)
+
+        result = sqlalchemy_api.instance_get_usage_by_window(
+            ctxt, begin, end, project_id=self.project_id)
+        self.assertEqual(1, len(result))
+        self.assertEqual(self.project_id, result[0]['project_id'])
+        self.assertAlmostEqual(12, result[0]['hours'])
+        self.assertAlmostEqual(24, result[0]['vcpus_hours'])
+        self.assertAlmostEqual(12 * 512, result[0]['memory_mb_hours'])
+        self.assertAlmostEqual(12 * 15, result[0]['local_gb_hours'])
+
+        result = sqlalchemy_api.instance_get_usage_by_window(ctxt, begin, end)
+        hours = dict((usage['project_id'], usage['hours'])
+                     for usage in result)
+        self.assertEqual(2, len(hours))
+        self.assertAlmostEqual(0.5, hours['other-project'])
+
     @mock.patch('nova.db.sqlalchemy.api.instance_get_all_by_filters_sort')
     def test_instance_get_all_by_filters_calls_sort(self,
                                                     mock_get_all_filters_sort):
@@ -1608,6 +1738,32 @@ class InstanceSystemMetadataTestCase(test.TestCase):
                                                    self.instance['uuid'])
         self.assertEqual(metadata, {'new_key': 'new_value'})
 
+    def test_instance_system_metadata_update_mixed(self):
+        db.instance_system_metadata_update(
+                    self.ctxt, self.instance['uuid'],
+                    {'a': '1', 'b': '2', 'c': '3'}, False)
+        db.instance_system_metadata_update(
+                    self.ctxt, self.instance['uuid'],
+                    {'a': '1', 'b': '20', 'd': '4'}, True)
+        metadata = db.instance_system_metadata_get(self.ctxt,
+                                                   self.instance['uuid'])
+        self.assertEqual({'a': '1', 'b': '20', 'd': '4'}, metadata)
+
+    def test_instance_metadata_diff(self):
+        to_add, to_update, to_delete = sqlalchemy_api._instance_metadata_diff(
+            {'same': '1', 'changed': '2', 'gone': '3'},
+            {'same': '1', 'changed': '20', 'new': '4'}, True)
+        self.assertEqual({'new': '4'}, to_add)
+        self.assertEqual({'changed': '20'}, to_update)
+        self.assertEqual(['gone'], to_delete)
+
+    def test_instance_metadata_diff_no_delete(self):
+        to_add, to_update, to_delete = sqlalchemy_api._instance_metadata_diff(
+            {'same': '1', 'gone': '3'}, {'same': '1'}, False)
+        self.assertEqual({}, to_add)
+        self.assertEqual({}, to_update)
+        self.assertEqual([], to_delete)
+
     @test.testtools.skip("bug 1189462")
     def test_instance_system_metadata_update_nonexistent(self):
         self.assertRaises(exception.InstanceNotFound,
@@ -3104,6 +3260,32 @@ class InstanceTestCase(test.TestCase, ModelsObjectComparatorMixin):
         # Ensure that metadata is updated during instance_update
         self._test_instance_update_updates_metadata('metadata')
 
+    def _test_instance_update_metadata_bulk(self, metadata_type):
+        instance = self.create_instance_with_args()
+        db.instance_update(self.ctxt, instance['uuid'],
+                           {metadata_type: {'speed': '88', 'units': 'MPH',
+                                            'year': '1955'}})
+
+        meta = {'speed': '88', 'units': 'KPH', 'gigawatts': '1.21'}
+        inst = db.instance_update(self.ctxt, instance['uuid'],
+                                  {metadata_type: dict(meta)})
+        self.assertEqual(meta, utils.metadata_to_dict(inst[metadata_type]))
+        inst = db.instance_get_by_uuid(self.ctxt, instance['uuid'])
+        self.assertEqual(meta, utils.metadata_to_dict(inst[metadata_type]))
+
+        with mock.patch.object(sqlalchemy_api,
+                               '_instance_metadata_bulk_apply') as mock_apply:
+            inst = db.instance_update(self.ctxt, instance['uuid'],
+                                      {metadata_type: dict(meta)})
+        self.assertFalse(mock_apply.called)
+        self.assertEqual(meta, utils.metadata_to_dict(inst[metadata_type]))
+
+    def test_instance_update_system_metadata_bulk(self):
+        self._test_instance_update_metadata_bulk('system_metadata')
+
+    def test_instance_update_metadata_bulk(self):
+        self._test_instance_update_metadata_bulk('metadata')
+
     def test_instance_floating_address_get_all(self):
         ctxt = context.get_admin_context()
 
@@ -3784,6 +3966,44 @@ class InstanceActionTestCase(test.TestCase, ModelsObjectComparatorMixin):
                                              self.ctxt.request_id)
         self.assertEqual('Error', action['message'])
 
+    def test_instance_action_events_record(self):
+        uuid1 = str(stdlib_uuid.uuid4())
+        uuid2 = str(stdlib_uuid.uuid4())
+        action1 = db.action_start(self.ctxt,
+                                  self._create_action_values(uuid1))
+        action2 = db.action_start(self.ctxt,
+                                  self._create_action_values(uuid2))
+        db.action_event_start(self.ctxt,
+                              self._create_event_values(uuid2, 'reboot'))
+        finish_time = timeutils.utcnow() + datetime.timedelta(seconds=5)
+
+        db.action_events_record(self.ctxt, [
+            # Started and finished since the last batch
+            self._create_event_values(uuid1, extra={
+                'finish_time': finish_time, 'result': 'Error',
+                'use_last_action': False}),
+            # Started in an earlier batch
+            {'event': 'reboot', 'instance_uuid': uuid2,
+             'request_id': self.ctxt.request_id,
+             'finish_time': utils.strtime(finish_time), 'result': 'Success'},
+            # No such action
+            self._create_event_values(str(stdlib_uuid.uuid4())),
+        ])
+
+        events = db.action_events_get(self.ctxt, action1['id'])
+        self.assertEqual(1, len(events))
+        self.assertEqual('schedule', events[0]['event'])
+        self.assertEqual('Error', events[0]['result'])
+        self.assertEqual(finish_time, events[0]['finish_time'])
+        action1 = db.action_get_by_request_id(self.ctxt, uuid1,
+                                              self.ctxt.request_id)
+        self.assertEqual('Error', action1['message'])
+
+        events = db.action_events_get(self.ctxt, action2['id'])
+        self.assertEqual(1, len(events))
+        self.assertEqual('Success', events[0]['result'])
+        self.assertEqual(finish_time, events[0]['finish_time'])
+
     def test_instance_action_and_event_start_string_time(self):
         """Create an instance action and event with a string start_time."""
         uuid = str(stdlib_uuid.uuid4())
@@ -0,0 +1,95 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import itertools
+
+import mock
+
+from nova import context
+from nova import db
+from nova.db.sqlalchemy import profiler
+from nova import test
+
+
+class DBAPIProfilerTestCase(test.TestCase):
+    def setUp(self):
+        super(DBAPIProfilerTestCase, self).setUp()
+        self.context = context.RequestContext('fake-user', 'fake-project',
+                                              request_id='req-fake')
+        profiler.setup(True)
+        self.addCleanup(profiler.setup, False)
+        self.profiler = profiler.get_profiler()
+        self.profiler.reset()
+        profiler.set_operation(None)
+
+    def _get_entry(self, function):
+        for entry in self.profiler.get_summary():
+            if entry['function'] == function:
+                return entry
+        self.fail('%s not profiled' % function)
+
+    def test_attributes_queries_to_db_api_function(self):
+        db.service_create(self.context, {'host': 'fake-host',
+                                         'binary': 'nova-compute',
+                                         'topic': 'compute'})
+        db.service_get_all(self.context)
+
+        entry = self._get_entry('service_get_all')
+        self.assertEqual(1, entry['calls'])
+        self.assertEqual(1, entry['queries'])
+        self.assertEqual(1, entry['operations']['<unknown>']['calls'])
+        self.assertEqual('req-fake',
+                         entry['operations']['<unknown>']['last_request_id'])
+        self._get_entry('service_create')
+
+    def test_tags_operation(self):
+        profiler.set_operation('GET ServersController.detail')
+        db.service_get_all(self.context)
+
+        entry = self._get_entry('service_get_all')
+        self.assertEqual(['GET ServersController.detail'],
+                         list(entry['operations']))
+
+    @mock.patch.object(profiler.LOG, 'warning')
+    def test_logs_slow_queries(self, mock_warning):
+        self.profiler.slow_query_threshold = 0.000001
+        with mock.patch.object(profiler, 'time') as mock_time:
+            mock_time.time.side_effect = itertools.count()
+            db.service_get_all(self.context)
+        self.assertTrue(mock_warning.called)
+        self.assertEqual('service_get_all',
+                         mock_warning.call_args[0][1]['function'])
+
+    def test_setup_disabled(self):
+        profiler.setup(False)
+        self.assertIsNone(profiler.get_profiler())
+        endpoints = [mock.sentinel.endpoint]
+        self.assertEqual(endpoints, profiler.wrap_endpoints(endpoints))
+
+
+class ProfiledEndpointTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(ProfiledEndpointTestCase, self).setUp()
+        profiler.setup(True)
+        self.addCleanup(profiler.setup, False)
+
+    def test_wrap_endpoints_tags_rpc_method(self):
+        class FakeEndpoint(object):
+            target = mock.sentinel.target
+
+            def do_thing(self, ctxt, arg):
+                return profiler.get_operation(), arg
+
+        endpoint, = profiler.wrap_endpoints([FakeEndpoint()])
+        self.assertEqual(mock.sentinel.target, endpoint.target)
+        self.assertEqual(('FakeEndpoint.do_thing', 'arg'),
+                         endpoint.do_thing(None, 'arg'))
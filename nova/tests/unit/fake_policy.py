@@ -156,6 +156,8 @@ policy_data = """
     "os_compute_api:os-aggregates:add_host": "rule:admin_api",
     "os_compute_api:os-aggregates:remove_host": "rule:admin_api",
     "os_compute_api:os-aggregates:set_metadata": "rule:admin_api",
+    "os_compute_api:os-aggregates:cache_images": "rule:admin_api",
+    "os_compute_api:os-aggregates:unpin_images": "rule:admin_api",
     "compute_extension:agents": "",
     "os_compute_api:os-agents": "",
     "compute_extension:attach_interfaces": "",
@@ -324,6 +326,7 @@ policy_data = """
     "compute_extension:server_usage": "",
     "os_compute_api:os-server-usage": "",
     "os_compute_api:os-server-groups": "",
+    "os_compute_api:os-server-bulk-actions:discoverable": "",
     "compute_extension:services": "",
     "os_compute_api:os-services": "",
     "compute_extension:shelve": "",
@@ -23,6 +23,7 @@ import mock
 from oslo_config import cfg
 from oslo_service import sslutils
 from oslo_utils import netutils
+from oslo_utils import units
 import six
 import testtools
 
@@ -674,6 +675,81 @@ class TestDownloadNoDirectUri(test.NoDBTestCase):
         writer.close.assert_called_once_with()
 
 
+class TestDownloadRanges(test.NoDBTestCase):
+
+    def setUp(self):
+        super(TestDownloadRanges, self).setUp()
+        self.flags(download_concurrency=4, download_range_size=1,
+                   api_servers=['http://glance.example.com:9292'],
+                   group='glance')
+        self.client = mock.MagicMock()
+        self.service = glance.GlanceImageService(self.client)
+        self.ctx = context.RequestContext('fake', 'fake', auth_token='token')
+
+    @mock.patch('nova.image.ranged_download.RangedDownloader')
+    @mock.patch('nova.image.glance.GlanceImageService.show')
+    def test_download_ranges(self, show_mock, downloader_mock):
+        show_mock.return_value = {'size': 10 * units.Mi, 'checksum': 'sum'}
+        downloader_mock.return_value.download.return_value = 'sum'
+
+        res = self.service.download(self.ctx, 'fake-image',
+                                    dst_path=mock.sentinel.dst_path)
+
+        self.assertIsNone(res)
+        downloader_mock.assert_called_once_with(
+            'http://glance.example.com:9292/v2/images/fake-image/file',
+            mock.ANY, 'fake-image', 10 * units.Mi, 4, units.Mi,
+            num_retries=0, verify=True)
+        self.assertEqual('token',
+                         downloader_mock.call_args[0][1]['X-Auth-Token'])
+        downloader_mock.return_value.download.assert_called_once_with(
+            mock.sentinel.dst_path, verifier=None)
+        self.assertFalse(self.client.call.called)
+
+    @mock.patch('nova.image.ranged_download.RangedDownloader')
+    @mock.patch('nova.image.glance.GlanceImageService.show')
+    def test_download_ranges_checksum_mismatch(self, show_mock,
+                                               downloader_mock):
+        show_mock.return_value = {'size': 10 * units.Mi, 'checksum': 'sum'}
+        downloader_mock.return_value.download.return_value = 'other'
+
+        self.assertRaises(exception.ImageUnacceptable,
+                          self.service.download, self.ctx, 'fake-image',
+                          dst_path=mock.sentinel.dst_path)
+
+    @mock.patch.object(six.moves.builtins, 'open')
+    @mock.patch('nova.image.ranged_download.RangedDownloader')
+    @mock.patch('nova.image.glance.GlanceImageService.show')
+    def test_download_ranges_not_supported(self, show_mock, downloader_mock,
+                                           open_mock):
+        show_mock.return_value = {'size': 10 * units.Mi, 'checksum': 'sum'}
+        downloader_mock.return_value.download.return_value = None
+        self.client.call.return_value = [1, 2, 3]
+
+        self.service.download(self.ctx, 'fake-image',
+                              dst_path=mock.sentinel.dst_path)
+
+        self.client.call.assert_called_once_with(self.ctx, 1, 'data',
+                                                 'fake-image')
+        open_mock.return_value.write.assert_has_calls(
+            [mock.call(1), mock.call(2), mock.call(3)])
+
+    @mock.patch.object(six.moves.builtins, 'open')
+    @mock.patch('nova.image.ranged_download.RangedDownloader')
+    @mock.patch('nova.image.glance.GlanceImageService.show')
+    def test_download_ranges_small_image(self, show_mock, downloader_mock,
+                                         open_mock):
+        show_mock.return_value = {'size': units.Mi, 'checksum': 'sum'}
+        self.client.call.return_value = []
+
+        self.service.download(self.ctx, 'fake-image', data=mock.Mock(),
+                              dst_path=None)
+        self.service.download(self.ctx, 'fake-image',
+                              dst_path=mock.sentinel.dst_path)
+
+        self.assertFalse(downloader_mock.called)
+
+
 class TestDownloadSignatureVerification(test.NoDBTestCase):
 
     class MockVerifier(object):
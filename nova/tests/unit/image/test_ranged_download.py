@@ -0,0 +1,120 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import hashlib
+import os
+import re
+
+import mock
+from requests_mock.contrib import fixture
+
+from nova import exception
+from nova.image import ranged_download
+from nova import test
+from nova import utils
+
+
+URL = 'http://glance.example.com/v2/images/fake-image/file'
+
+
+class RangedDownloaderTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(RangedDownloaderTestCase, self).setUp()
+        self.requests = self.useFixture(fixture.Fixture())
+        self.data = os.urandom(1000)
+        self.ranges = []
+
+    def _serve_range(self, request, context):
+        match = re.match(r'bytes=(\d+)-(\d+)', request.headers['Range'])
+        start, end = int(match.group(1)), int(match.group(2))
+        self.ranges.append((start, end))
+        context.status_code = 206
+        context.headers['Content-Range'] = 'bytes %d-%d/%d' % (
+            start, end, len(self.data))
+        return self.data[start:end + 1]
+
+    def _download(self, verifier=None, **kwargs):
+        downloader = ranged_download.RangedDownloader(
+            URL, {'X-Auth-Token': 'token'}, 'fake-image', len(self.data),
+            4, 300, **kwargs)
+        with utils.tempdir() as tmpdir:
+            path = os.path.join(tmpdir, 'image')
+            checksum = downloader.download(path, verifier=verifier)
+            if checksum is None:
+                return None, os.path.exists(path)
+            with open(path, 'rb') as f:
+                return checksum, f.read()
+
+    def test_download(self):
+        self.requests.get(URL, content=self._serve_range)
+        verifier = mock.Mock()
+        checksum, content = self._download(verifier=verifier)
+        self.assertEqual(self.data, content)
+        self.assertEqual(hashlib.md5(self.data).hexdigest(), checksum)
+        self.assertEqual([(0, 299), (300, 599), (600, 899), (900, 999)],
+                         sorted(self.ranges))
+        self.assertEqual(self.data, b''.join(
+            call[0][0] for call in verifier.update.call_args_list))
+        for request in self.requests.request_history:
+            self.assertEqual('token', request.headers['X-Auth-Token'])
+
+    def test_download_ranges_not_supported(self):
+        self.requests.get(URL, content=self.data)
+        checksum, exists = self._download()
+        self.assertIsNone(checksum)
+        self.assertFalse(exists)
+        self.assertEqual(1, len(self.requests.request_history))
+
+    def test_download_probe_not_found(self):
+        self.requests.get(URL, status_code=404)
+        checksum, exists = self._download()
+        self.assertIsNone(checksum)
+        self.assertFalse(exists)
+        self.assertEqual(1, len(self.requests.request_history))
+
+    def test_download_probe_not_implemented(self):
+        self.requests.get(URL, status_code=501)
+        checksum, exists = self._download()
+        self.assertIsNone(checksum)
+        self.assertFalse(exists)
+
+    def test_download_range_not_found(self):
+        def serve_range(request, context):
+            if request.headers['Range'] == 'bytes=0-299':
+                return self._serve_range(request, context)
+            context.status_code = 404
+            return b''
+
+        self.requests.get(URL, content=serve_range)
+        self.assertRaises(exception.ImageNotFound, self._download)
+
+    def test_download_short_range_retried(self):
+        served = []
+
+        def serve_range(request, context):
+            data = self._serve_range(request, context)
+            if request.headers['Range'] == 'bytes=300-599' and not served:
+                served.append(True)
+                return data[:10]
+            return data
+
+        self.requests.get(URL, content=serve_range)
+        checksum, content = self._download(num_retries=1)
+        self.assertEqual(self.data, content)
+        self.assertEqual(5, len(self.ranges))
+
+    def test_download_short_range_fails(self):
+        def serve_range(request, context):
+            return self._serve_range(request, context)[:10]
+
+        self.requests.get(URL, content=serve_range)
+        self.assertRaises(exception.GlanceConnectionFailed, self._download)
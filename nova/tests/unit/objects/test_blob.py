@@ -0,0 +1,52 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from oslo_serialization import jsonutils
+
+from nova.objects import blob
+from nova import test
+
+
+class BlobTestCase(test.NoDBTestCase):
+    primitive = {'nova_object.name': 'Fake',
+                 'nova_object.data': {'cells': [{'id': i, 'cpus': [1, 2, 3],
+                                                 'name': u'cell\xe9'}
+                                                for i in range(64)]}}
+
+    def test_dumps_json_by_default(self):
+        data = blob.dumps(self.primitive)
+        self.assertEqual(jsonutils.dumps(self.primitive), data)
+        self.assertEqual(self.primitive, blob.loads(data))
+
+    def _test_roundtrip(self, encoding, prefix):
+        self.flags(db_blob_encoding=encoding)
+        data = blob.dumps(self.primitive)
+        self.assertTrue(data.startswith(prefix))
+        self.assertLess(len(data), len(jsonutils.dumps(self.primitive)))
+        self.assertEqual(self.primitive, blob.loads(data))
+        self.assertEqual(self.primitive, blob.loads(data.encode('utf-8')))
+
+    def test_zlib_roundtrip(self):
+        self._test_roundtrip('zlib', blob.ZLIB_PREFIX)
+
+    def test_msgpack_roundtrip(self):
+        self._test_roundtrip('msgpack', blob.MSGPACK_PREFIX)
+
+    def test_small_primitives_stay_json(self):
+        self.flags(db_blob_encoding='zlib')
+        data = blob.dumps({'cells': []})
+        self.assertEqual(jsonutils.dumps({'cells': []}), data)
+
+    def test_loads_json_when_compact_encoding_configured(self):
+        self.flags(db_blob_encoding='msgpack')
+        data = jsonutils.dumps(self.primitive)
+        self.assertEqual(self.primitive, blob.loads(data))
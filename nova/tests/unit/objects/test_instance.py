@@ -24,6 +24,7 @@ from oslo_utils import timeutils
 from nova.cells import rpcapi as cells_rpcapi
 from nova.compute import flavors
 from nova import db
+from nova.db.sqlalchemy import api as sqlalchemy_api
 from nova import exception
 from nova.network import model as network_model
 from nova import notifications
@@ -1428,6 +1429,27 @@ class _TestInstanceListObject(object):
             sort_keys=['key1', 'key2'], sort_dirs=['dir1', 'dir2'])
         self.assertEqual(0, mock_get_by_filters.call_count)
 
+    @mock.patch.object(sqlalchemy_api, '_select_reader_mode',
+                       wraps=sqlalchemy_api._select_reader_mode)
+    @mock.patch.object(db, 'instance_get_all_by_filters', return_value=[])
+    def test_get_by_filters_stale_ok(self, mock_get_by_filters,
+                                     mock_select):
+        objects.InstanceList.get_by_filters_stale_ok(
+            self.context, {'foo': 'bar'}, sort_key='key', sort_dir='dir',
+            limit=100, marker='uuid')
+        mock_get_by_filters.assert_called_once_with(
+            self.context, {'foo': 'bar'}, 'key', 'dir', limit=100,
+            marker='uuid', columns_to_join=None)
+        self.assertEqual(30, mock_select.call_args[0][2])
+
+    @mock.patch.object(sqlalchemy_api, '_select_reader_mode',
+                       wraps=sqlalchemy_api._select_reader_mode)
+    @mock.patch.object(db, 'instance_get_all_by_filters', return_value=[])
+    def test_get_by_filters_reads_primary(self, mock_get_by_filters,
+                                          mock_select):
+        objects.InstanceList.get_by_filters(self.context, {'foo': 'bar'})
+        self.assertIsNone(mock_select.call_args[0][2])
+
     def test_get_all_by_filters_works_for_cleaned(self):
         fakes = [self.fake_instance(1),
                  self.fake_instance(2, updates={'deleted': 2,
@@ -92,6 +92,15 @@ class _TestInstanceNUMATopology(object):
         mock_get.return_value = fake_old_db_topology
         self._test_get_by_instance_uuid()
 
+    @mock.patch('nova.db.instance_extra_get_by_instance_uuid')
+    def test_get_by_instance_uuid_compact(self, mock_get):
+        self.flags(db_blob_encoding='zlib', db_blob_compress_min_size=0)
+        fake_topology = dict(fake_db_topology)
+        fake_topology['numa_topology'] = fake_obj_numa_topology._to_json()
+        self.assertTrue(fake_topology['numa_topology'].startswith('zlib1:'))
+        mock_get.return_value = fake_topology
+        self._test_get_by_instance_uuid()
+
     @mock.patch('nova.db.instance_extra_get_by_instance_uuid')
     def test_get_by_instance_uuid_missing(self, mock_get):
         mock_get.return_value = None
@@ -1130,7 +1130,7 @@ object_data = {
     'Instance': '2.1-416fdd0dfc33dfa12ff2cfdd8cc32e17',
     'InstanceAction': '1.1-f9f293e526b66fca0d05c3b3a2d13914',
     'InstanceActionEvent': '1.1-e56a64fa4710e43ef7af2ad9d6028b33',
-    'InstanceActionEventList': '1.1-13d92fb953030cdbfee56481756e02be',
+    'InstanceActionEventList': '1.2-55780095fe6cbc3f8a9fdd273081e2c6',
     'InstanceActionList': '1.0-4a53826625cc280e15fae64a575e0879',
     'InstanceExternalEvent': '1.1-6e446ceaae5f475ead255946dd443417',
     'InstanceFault': '1.2-7ef01f16f1084ad1304a513d6d410a38',
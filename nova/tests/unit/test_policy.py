@@ -17,6 +17,7 @@
 
 import os.path
 
+import mock
 from oslo_policy import policy as oslo_policy
 from oslo_serialization import jsonutils
 import requests_mock
@@ -57,6 +58,36 @@ class PolicyFileTestCase(test.NoDBTestCase):
             self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
                               self.context, action, self.target)
 
+    def test_modified_policy_dir_reloads(self):
+        with utils.tempdir() as tmpdir:
+            tmpfilename = os.path.join(tmpdir, 'policy')
+            policy_dir = os.path.join(tmpdir, 'policy.d')
+            os.mkdir(policy_dir)
+            dir_filename = os.path.join(policy_dir, 'example.json')
+
+            self.flags(policy_file=tmpfilename, policy_dirs=[policy_dir],
+                       group='oslo_policy')
+            policy.reset()
+
+            action = "example:test"
+            with open(tmpfilename, "w") as policyfile:
+                policyfile.write('{"example:test": "!"}')
+            with open(dir_filename, "w") as policyfile:
+                policyfile.write('{"example:test": ""}')
+            policy.enforce(self.context, action, self.target)
+            policy.enforce(self.context, action, self.target)
+
+            # NOTE: The policy.d rules are merged into the current Rules
+            # object, which must not keep the cached outcome alive.
+            rules = policy._ENFORCER.rules
+            with open(dir_filename, "w") as policyfile:
+                policyfile.write('{"example:test": "!"}')
+            mtime = os.path.getmtime(dir_filename) + 10
+            os.utime(dir_filename, (mtime, mtime))
+            self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                              self.context, action, self.target)
+            self.assertIs(rules, policy._ENFORCER.rules)
+
 
 class PolicyTestCase(test.NoDBTestCase):
     def setUp(self):
@@ -145,6 +176,56 @@ class PolicyTestCase(test.NoDBTestCase):
         policy.enforce(admin_context, lowercase_action, self.target)
         policy.enforce(admin_context, uppercase_action, self.target)
 
+    def test_role_only_outcome_cached(self):
+        action = "example:lowercase_admin"
+        admin_context = context.RequestContext('admin', 'fake',
+                                               roles=['admin'])
+        with mock.patch.object(policy._ENFORCER, 'enforce',
+                               wraps=policy._ENFORCER.enforce) as enforce:
+            for i in range(3):
+                policy.enforce(admin_context, action, {'project_id': i})
+                self.assertRaises(exception.PolicyNotAuthorized,
+                                  policy.enforce, self.context, action,
+                                  {'project_id': i})
+        # One evaluation per distinct set of roles.
+        self.assertEqual(2, enforce.call_count)
+
+    def test_target_dependent_outcome_not_cached(self):
+        action = "example:my_file"
+        with mock.patch.object(policy._ENFORCER, 'enforce',
+                               wraps=policy._ENFORCER.enforce) as enforce:
+            policy.enforce(self.context, action, {'project_id': 'fake'})
+            self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                              self.context, action, {'project_id': 'other'})
+        self.assertEqual(2, enforce.call_count)
+
+    def test_cache_cleared_on_set_rules(self):
+        action = "example:allowed"
+        policy.enforce(self.context, action, self.target)
+        policy.set_rules(oslo_policy.Rules.from_dict({action: '!'}))
+        self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                          self.context, action, self.target)
+
+    def test_compile_check(self):
+        rules = oslo_policy.Rules.from_dict({
+            "admin": "is_admin:True or role:admin",
+            "owner": "project_id:%(project_id)s",
+            "admin_api": "rule:admin and user_id:fake",
+            "admin_or_owner": "rule:admin or rule:owner",
+            "loop": "rule:loop",
+        })
+        self.assertEqual(frozenset(['is_admin', 'roles']),
+                         policy._compile_check(rules['admin'], rules, set()))
+        self.assertEqual(frozenset(['is_admin', 'roles', 'user_id']),
+                         policy._compile_check(rules['admin_api'], rules,
+                                               set()))
+        self.assertIsNone(policy._compile_check(rules['owner'], rules,
+                                                set()))
+        self.assertIsNone(policy._compile_check(rules['admin_or_owner'],
+                                                rules, set()))
+        self.assertIsNone(policy._compile_check(rules['loop'], rules,
+                                                set(['loop'])))
+
 
 class DefaultPolicyTestCase(test.NoDBTestCase):
 
@@ -315,6 +396,8 @@ class RealRolePolicyTestCase(test.NoDBTestCase):
 "os_compute_api:os-aggregates:add_host",
 "os_compute_api:os-aggregates:remove_host",
 "os_compute_api:os-aggregates:set_metadata",
+"os_compute_api:os-aggregates:cache_images",
+"os_compute_api:os-aggregates:unpin_images",
 "os_compute_api:os-agents",
 "os_compute_api:os-baremetal-nodes",
 "os_compute_api:os-cells",
@@ -692,6 +775,7 @@ class RealRolePolicyTestCase(test.NoDBTestCase):
 "os_compute_api:os-server-password:discoverable",
 "os_compute_api:os-server-usage:discoverable",
 "os_compute_api:os-server-groups:discoverable",
+"os_compute_api:os-server-bulk-actions:discoverable",
 "os_compute_api:os-services:discoverable",
 "os_compute_api:server-metadata:discoverable",
 "os_compute_api:servers:discoverable",
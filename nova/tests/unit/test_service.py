@@ -18,6 +18,7 @@
 Unit Tests for remote procedure calls using queue
 """
 
+import os
 import sys
 
 import mock
@@ -289,6 +290,17 @@ class TestWSGIService(test.NoDBTestCase):
         test_service.start()
         self.assertFalse(mock_create.called)
 
+    @mock.patch.object(service.LOG, 'info')
+    @mock.patch('nova.objects.Service.get_by_host_and_binary')
+    def test_service_start_reports_startup_time(self, mock_get, mock_info):
+        test_service = service.WSGIService("test_service")
+        test_service.start()
+        self.addCleanup(test_service.stop)
+        args = mock_info.call_args[0][1]
+        self.assertEqual('test_service', args['name'])
+        self.assertEqual(os.getpid(), args['pid'])
+        self.assertEqual(test_service.app_load_time, args['load'])
+
     @mock.patch('nova.objects.Service.get_by_host_and_binary')
     def test_service_random_port(self, mock_get):
         test_service = service.WSGIService("test_service")
@@ -106,6 +106,10 @@ def file_open(path, mode=None):
     return File(path, mode)
 
 
+def open_flat_image(disk_path, source_fmt):
+    return File(disk_path)
+
+
 def find_disk(virt_dom):
     if disk_type == 'lvm':
         return ("/dev/nova-vg/lv", "raw")
@@ -10,6 +10,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import hashlib
 
 import mock
 
@@ -537,3 +538,61 @@ class RbdTestCase(test.NoDBTestCase):
         proxy.list_snaps.return_value = [{'name': self.snap_name}, ]
         self.driver.rollback_to_snap(self.volume_name, self.snap_name)
         proxy.rollback_to_snap.assert_called_once_with(self.snap_name)
+
+    @mock.patch.object(rbd_utils, 'IMPORT_WRITE_SIZE', 4)
+    @mock.patch.object(rbd_utils, 'RBDVolumeProxy')
+    @mock.patch.object(rbd_utils, 'RADOSClient')
+    @mock.patch.object(rbd_utils, 'rbd')
+    def test_import_stream(self, mock_rbd, mock_client, mock_proxy):
+        client = mock_client.return_value
+        client.__enter__.return_value = client
+        proxy = mock_proxy.return_value
+        proxy.__enter__.return_value = proxy
+        proxy.aio_write.return_value.get_return_value.return_value = 0
+        chunks = [b'ab', b'cd\0\0', b'\0\0ef']
+
+        checksum = self.driver.import_stream(iter(chunks), self.volume_name,
+                                             10, max_in_flight=1)
+
+        self.assertEqual(hashlib.md5(b''.join(chunks)).hexdigest(), checksum)
+        mock_rbd.RBD.return_value.create.assert_called_once_with(
+            client.ioctx, str(self.volume_name), 10, old_format=False,
+            features=client.features)
+        # The chunk of zeroes is not written.
+        self.assertEqual([mock.call(b'abcd', 0, mock.ANY),
+                          mock.call(b'ef', 8, mock.ANY)],
+                         proxy.aio_write.call_args_list)
+        completion = proxy.aio_write.return_value
+        self.assertEqual(2, completion.wait_for_complete_and_cb.call_count)
+        proxy.flush.assert_called_once_with()
+
+    @mock.patch.object(rbd_utils.RBDDriver, 'remove_image')
+    @mock.patch.object(rbd_utils, 'RBDVolumeProxy')
+    @mock.patch.object(rbd_utils, 'RADOSClient')
+    @mock.patch.object(rbd_utils, 'rbd')
+    def test_import_stream_write_fails(self, mock_rbd, mock_client,
+                                       mock_proxy, mock_remove):
+        proxy = mock_proxy.return_value
+        proxy.__enter__.return_value = proxy
+        proxy.aio_write.return_value.get_return_value.return_value = -5
+
+        self.assertRaises(exception.ImageUnacceptable,
+                          self.driver.import_stream, [b'data'],
+                          self.volume_name, 4)
+        mock_remove.assert_called_once_with(self.volume_name)
+        self.assertFalse(proxy.flush.called)
+
+    @mock.patch.object(rbd_utils.RBDDriver, 'remove_image')
+    @mock.patch.object(rbd_utils, 'RBDVolumeProxy')
+    @mock.patch.object(rbd_utils, 'RADOSClient')
+    @mock.patch.object(rbd_utils, 'rbd')
+    def test_import_stream_short(self, mock_rbd, mock_client, mock_proxy,
+                                 mock_remove):
+        proxy = mock_proxy.return_value
+        proxy.__enter__.return_value = proxy
+        proxy.aio_write.return_value.get_return_value.return_value = 0
+
+        self.assertRaises(exception.ImageUnacceptable,
+                          self.driver.import_stream, [b'data'],
+                          self.volume_name, 10)
+        mock_remove.assert_called_once_with(self.volume_name)
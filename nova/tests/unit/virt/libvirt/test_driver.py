@@ -95,6 +95,7 @@ from nova.virt.libvirt import firewall
 from nova.virt.libvirt import guest as libvirt_guest
 from nova.virt.libvirt import host
 from nova.virt.libvirt import imagebackend
+from nova.virt.libvirt import imagepeers
 from nova.virt.libvirt.storage import dmcrypt
 from nova.virt.libvirt.storage import lvm
 from nova.virt.libvirt.storage import rbd_utils
@@ -8588,6 +8589,29 @@ class LibvirtConnTestCase(test.NoDBTestCase):
                            fallback_from_host=instance.host)])
             self.assertIsInstance(res, objects.LibvirtLiveMigrateData)
 
+    def _test_try_fetch_image_cache_image_peers(self, supports_clone):
+        self.flags(image_peers=['peer1:8780'], group='libvirt')
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        instance = objects.Instance(**self.test_instance)
+        image = mock.Mock(SUPPORTS_CLONE=supports_clone)
+
+        drvr._try_fetch_image_cache(image, libvirt_utils.fetch_image,
+                                    self.context, 'fake-base', 'fake-image',
+                                    instance, 10)
+
+        return image.cache.call_args[1]['fetch_func']
+
+    def test_try_fetch_image_cache_image_peers(self):
+        fetch_func = self._test_try_fetch_image_cache_image_peers(False)
+
+        self.assertEqual(imagepeers.fetch_image, fetch_func.func)
+        self.assertEqual((libvirt_utils.fetch_image,), fetch_func.args)
+
+    def test_try_fetch_image_cache_image_peers_clone(self):
+        fetch_func = self._test_try_fetch_image_cache_image_peers(True)
+
+        self.assertEqual(libvirt_utils.fetch_image, fetch_func)
+
     def test_get_instance_disk_info_works_correctly(self):
         # Test data
         instance = objects.Instance(**self.test_instance)
@@ -13293,7 +13317,8 @@ class LibvirtConnTestCase(test.NoDBTestCase):
         disconnect_volume.assert_called_once_with(old_connection_info, 'vdb')
         volume_save.assert_called_once_with()
 
-    def _test_live_snapshot(self, can_quiesce=False, require_quiesce=False):
+    def _test_live_snapshot(self, can_quiesce=False, require_quiesce=False,
+                            stream=False):
         drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI())
         mock_dom = mock.MagicMock()
         test_image_meta = self.test_image_meta.copy()
@@ -13307,9 +13332,10 @@ class LibvirtConnTestCase(test.NoDBTestCase):
                 mock.patch.object(fake_libvirt_utils, 'create_cow_image'),
                 mock.patch.object(fake_libvirt_utils, 'chown'),
                 mock.patch.object(fake_libvirt_utils, 'extract_snapshot'),
+                mock.patch.object(fake_libvirt_utils, 'open_flat_image'),
                 mock.patch.object(drvr, '_set_quiesced')
         ) as (mock_define, mock_size, mock_backing, mock_create_cow,
-              mock_chown, mock_snapshot, mock_quiesce):
+              mock_chown, mock_snapshot, mock_open_flat, mock_quiesce):
 
             xmldoc = "<domain/>"
             srcfile = "/first/path"
@@ -13329,8 +13355,11 @@ class LibvirtConnTestCase(test.NoDBTestCase):
                         instance_id=self.test_instance['id'], reason='test'))
 
             image_meta = objects.ImageMeta.from_dict(test_image_meta)
-            drvr._live_snapshot(self.context, self.test_instance, guest,
-                                srcfile, dstfile, "qcow2", "qcow2", image_meta)
+            image_file = drvr._live_snapshot(self.context,
+                                             self.test_instance, guest,
+                                             srcfile, dstfile, "qcow2",
+                                             "qcow2", image_meta,
+                                             stream=stream)
 
             mock_dom.XMLDesc.assert_called_once_with(flags=(
                 fakelibvirt.VIR_DOMAIN_XML_INACTIVE |
@@ -13346,8 +13375,14 @@ class LibvirtConnTestCase(test.NoDBTestCase):
                                                  format="qcow2")
             mock_create_cow.assert_called_once_with(bckfile, dltfile, 1004009)
             mock_chown.assert_called_once_with(dltfile, os.getuid())
-            mock_snapshot.assert_called_once_with(dltfile, "qcow2",
-                                                  dstfile, "qcow2")
+            if stream:
+                self.assertEqual(mock_open_flat.return_value, image_file)
+                mock_open_flat.assert_called_once_with(dltfile, "qcow2")
+                self.assertFalse(mock_snapshot.called)
+            else:
+                self.assertIsNone(image_file)
+                mock_snapshot.assert_called_once_with(dltfile, "qcow2",
+                                                      dstfile, "qcow2")
             mock_define.assert_called_once_with(xmldoc)
             mock_quiesce.assert_any_call(mock.ANY, self.test_instance,
                                          mock.ANY, True)
@@ -13358,6 +13393,9 @@ class LibvirtConnTestCase(test.NoDBTestCase):
     def test_live_snapshot(self):
         self._test_live_snapshot()
 
+    def test_live_snapshot_stream(self):
+        self._test_live_snapshot(stream=True)
+
     def test_live_snapshot_with_quiesce(self):
         self._test_live_snapshot(can_quiesce=True)
 
@@ -15087,11 +15125,14 @@ class LibvirtDriverTestCase(test.NoDBTestCase):
 
         exists.side_effect = [False, False, True, False]
 
-        result = self.drvr.delete_instance_files(instance)
+        with mock.patch.object(self.drvr.image_cache_manager,
+                               'remove_image_users') as remove_image_users:
+            result = self.drvr.delete_instance_files(instance)
         get_instance_path.assert_called_with(instance)
         exe.assert_called_with('mv', '/path', '/path_del')
         shutil.assert_called_with('/path_del')
         self.assertTrue(result)
+        remove_image_users.assert_called_once_with(instance)
 
     @mock.patch('shutil.rmtree')
     @mock.patch('nova.utils.execute')
@@ -19,9 +19,11 @@ import os
 import shutil
 import tempfile
 
+import eventlet
 import fixtures
 import mock
 from oslo_concurrency import lockutils
+from oslo_concurrency import processutils
 from oslo_config import cfg
 from oslo_config import fixture as config_fixture
 from oslo_utils import imageutils
@@ -207,7 +209,7 @@ class RawTestCase(_ImageTestCase, test.NoDBTestCase):
         fn = self.mox.CreateMockAnything()
         self.mox.StubOutWithMock(imagebackend.utils.synchronized,
                                  '__call__')
-        self.mox.StubOutWithMock(imagebackend.libvirt_utils, 'copy_image')
+        self.mox.StubOutWithMock(imagebackend, '_copy_image')
         self.mox.StubOutWithMock(imagebackend.disk, 'extend')
         return fn
 
@@ -280,7 +282,7 @@ class RawTestCase(_ImageTestCase, test.NoDBTestCase):
     def test_create_image(self):
         fn = self.prepare_mocks()
         fn(target=self.TEMPLATE_PATH, max_size=None, image_id=None)
-        imagebackend.libvirt_utils.copy_image(self.TEMPLATE_PATH, self.PATH)
+        imagebackend._copy_image(self.TEMPLATE_PATH, self.PATH)
         self.mox.ReplayAll()
 
         image = self.image_class(self.INSTANCE, self.NAME)
@@ -303,7 +305,7 @@ class RawTestCase(_ImageTestCase, test.NoDBTestCase):
     def test_create_image_extend(self, fake_qemu_img_info):
         fn = self.prepare_mocks()
         fn(max_size=self.SIZE, target=self.TEMPLATE_PATH, image_id=None)
-        imagebackend.libvirt_utils.copy_image(self.TEMPLATE_PATH, self.PATH)
+        imagebackend._copy_image(self.TEMPLATE_PATH, self.PATH)
         image = imgmodel.LocalFileImage(self.PATH, imgmodel.FORMAT_RAW)
         imagebackend.disk.extend(image, self.SIZE)
         self.mox.ReplayAll()
@@ -1191,6 +1193,38 @@ class RbdTestCase(_ImageTestCase, test.NoDBTestCase):
 
         self.mox.VerifyAll()
 
+    @mock.patch.object(imagebackend.Rbd, 'check_image_exists',
+                       return_value=False)
+    def test_cache_concurrent_clones(self, mock_exists):
+        # The image is cloned into the rbd image of each instance, the base
+        # file is never created so both requests have to clone it.
+        calls = []
+        started = eventlet.event.Event()
+        release = eventlet.event.Event()
+
+        def clone(target, *args, **kwargs):
+            calls.append(target)
+            if len(calls) == 1:
+                started.send()
+                release.wait()
+
+        images = [self.image_class(self.INSTANCE, name)
+                  for name in (self.NAME, self.NAME + '.other')]
+        for image in images:
+            self.mock_create_image(image)
+
+        first = eventlet.spawn(images[0].cache, clone, self.TEMPLATE)
+        started.wait()
+        second = eventlet.spawn(images[1].cache, clone, self.TEMPLATE)
+        eventlet.sleep(0)
+        release.send()
+
+        first.wait()
+        second.wait()
+        self.assertEqual([self.TEMPLATE_PATH] * 2, calls)
+        self.assertFalse(os.path.exists(self.TEMPLATE_PATH))
+        self.assertEqual({}, imagebackend._IN_FLIGHT)
+
     def test_cache_base_dir_exists(self):
         fn = self.mox.CreateMockAnything()
         image = self.image_class(self.INSTANCE, self.NAME)
@@ -1442,6 +1476,81 @@ class RbdTestCase(_ImageTestCase, test.NoDBTestCase):
             mock_import.assert_called_once_with(mock.sentinel.file, name)
         _test()
 
+    @mock.patch.object(imagebackend.IMAGE_API, 'download')
+    @mock.patch.object(imagebackend.IMAGE_API, 'get')
+    @mock.patch.object(rbd_utils.RBDDriver, 'import_stream')
+    @mock.patch.object(rbd_utils.RBDDriver, 'supports_import_stream',
+                       return_value=True)
+    def test_direct_import(self, mock_supported, mock_import, mock_get,
+                           mock_download):
+        mock_get.return_value = {'disk_format': 'raw', 'size': 1024,
+                                 'checksum': 'md5'}
+        mock_import.return_value = 'md5'
+        image = self.image_class(self.INSTANCE, self.NAME)
+
+        image.direct_import(mock.sentinel.ctx, 'fake-image', max_size=2048)
+
+        mock_download.assert_called_once_with(mock.sentinel.ctx, 'fake-image')
+        mock_import.assert_called_once_with(mock_download.return_value,
+                                            image.rbd_name, 1024,
+                                            max_in_flight=8)
+
+    @mock.patch.object(imagebackend.IMAGE_API, 'get')
+    @mock.patch.object(rbd_utils.RBDDriver, 'import_stream')
+    @mock.patch.object(rbd_utils.RBDDriver, 'supports_import_stream',
+                       return_value=True)
+    def test_direct_import_not_raw(self, mock_supported, mock_import,
+                                   mock_get):
+        mock_get.return_value = {'disk_format': 'qcow2', 'size': 1024}
+        image = self.image_class(self.INSTANCE, self.NAME)
+
+        self.assertRaises(exception.ImageUnacceptable, image.direct_import,
+                          mock.sentinel.ctx, 'fake-image')
+        self.assertFalse(mock_import.called)
+
+    @mock.patch.object(imagebackend.IMAGE_API, 'get')
+    @mock.patch.object(rbd_utils.RBDDriver, 'import_stream')
+    def test_direct_import_disabled(self, mock_import, mock_get):
+        self.flags(images_rbd_import_max_in_flight=0, group='libvirt')
+        image = self.image_class(self.INSTANCE, self.NAME)
+
+        self.assertRaises(exception.ImageUnacceptable, image.direct_import,
+                          mock.sentinel.ctx, 'fake-image')
+        self.assertFalse(mock_get.called)
+        self.assertFalse(mock_import.called)
+
+    @mock.patch.object(imagebackend.IMAGE_API, 'get')
+    @mock.patch.object(rbd_utils.RBDDriver, 'import_stream')
+    @mock.patch.object(rbd_utils.RBDDriver, 'supports_import_stream',
+                       return_value=True)
+    def test_direct_import_flavor_too_small(self, mock_supported,
+                                            mock_import, mock_get):
+        mock_get.return_value = {'disk_format': 'raw', 'size': 4096}
+        image = self.image_class(self.INSTANCE, self.NAME)
+
+        self.assertRaises(exception.FlavorDiskSmallerThanImage,
+                          image.direct_import, mock.sentinel.ctx,
+                          'fake-image', max_size=2048)
+        self.assertFalse(mock_import.called)
+
+    @mock.patch.object(imagebackend.IMAGE_API, 'download')
+    @mock.patch.object(imagebackend.IMAGE_API, 'get')
+    @mock.patch.object(rbd_utils.RBDDriver, 'remove_image')
+    @mock.patch.object(rbd_utils.RBDDriver, 'import_stream')
+    @mock.patch.object(rbd_utils.RBDDriver, 'supports_import_stream',
+                       return_value=True)
+    def test_direct_import_bad_checksum(self, mock_supported, mock_import,
+                                        mock_remove, mock_get,
+                                        mock_download):
+        mock_get.return_value = {'disk_format': 'raw', 'size': 1024,
+                                 'checksum': 'md5'}
+        mock_import.return_value = 'other'
+        image = self.image_class(self.INSTANCE, self.NAME)
+
+        self.assertRaises(exception.ImageUnacceptable, image.direct_import,
+                          mock.sentinel.ctx, 'fake-image')
+        mock_remove.assert_called_once_with(image.rbd_name)
+
     def test_get_parent_pool(self):
         image = self.image_class(self.INSTANCE, self.NAME)
         with mock.patch.object(rbd_utils.RBDDriver, 'parent_info') as mock_pi:
@@ -1586,7 +1695,7 @@ class PloopTestCase(_ImageTestCase, test.NoDBTestCase):
         fn = self.mox.CreateMockAnything()
         self.mox.StubOutWithMock(imagebackend.utils.synchronized,
                                  '__call__')
-        self.mox.StubOutWithMock(imagebackend.libvirt_utils, 'copy_image')
+        self.mox.StubOutWithMock(imagebackend, '_copy_image')
         self.mox.StubOutWithMock(self.utils, 'execute')
         return fn
 
@@ -1614,7 +1723,7 @@ class PloopTestCase(_ImageTestCase, test.NoDBTestCase):
         fn = self.prepare_mocks()
         fn(target=self.TEMPLATE_PATH, max_size=2048, image_id=None)
         img_path = os.path.join(self.PATH, "root.hds")
-        imagebackend.libvirt_utils.copy_image(self.TEMPLATE_PATH, img_path)
+        imagebackend._copy_image(self.TEMPLATE_PATH, img_path)
         self.utils.execute("ploop", "restore-descriptor", "-f", "raw",
                            self.PATH, img_path)
         self.utils.execute("ploop", "grow", '-s', "2K",
@@ -1734,3 +1843,111 @@ class BackendTestCase(test.NoDBTestCase):
 
     def test_image_default(self):
         self._test_image('default', imagebackend.Raw, imagebackend.Qcow2)
+
+
+class CreateOnceTestCase(test.NoDBTestCase):
+    def test_concurrent_requests_share_creation(self):
+        calls = []
+        started = eventlet.event.Event()
+        release = eventlet.event.Event()
+
+        def create(target):
+            calls.append(target)
+            started.send()
+            release.wait()
+
+        first = eventlet.spawn(imagebackend._create_once, '/base', create,
+                               '/base')
+        started.wait()
+        waiters = [eventlet.spawn(imagebackend._create_once, '/base',
+                                  create, '/base') for i in range(3)]
+        eventlet.sleep(0)
+        release.send()
+
+        first.wait()
+        for waiter in waiters:
+            waiter.wait()
+        self.assertEqual(['/base'], calls)
+        self.assertEqual({}, imagebackend._IN_FLIGHT)
+
+    def test_waiter_retries_failed_creation(self):
+        calls = []
+        started = eventlet.event.Event()
+        release = eventlet.event.Event()
+
+        def create(target):
+            calls.append(target)
+            if len(calls) == 1:
+                started.send()
+                release.wait()
+                raise exception.FlavorDiskSmallerThanImage(
+                    flavor_size=1, image_size=2)
+
+        first = eventlet.spawn(imagebackend._create_once, '/base', create,
+                               '/base')
+        started.wait()
+        waiter = eventlet.spawn(imagebackend._create_once, '/base', create,
+                                '/base')
+        eventlet.sleep(0)
+        release.send()
+
+        self.assertRaises(exception.FlavorDiskSmallerThanImage, first.wait)
+        waiter.wait()
+        self.assertEqual(['/base', '/base'], calls)
+        self.assertEqual({}, imagebackend._IN_FLIGHT)
+
+
+class CopyImageTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(CopyImageTestCase, self).setUp()
+        self.addCleanup(imagebackend._COPY_UNSUPPORTED.clear)
+        tmpdir = self.useFixture(fixtures.TempDir()).path
+        self.src = os.path.join(tmpdir, 'base')
+        self.dest = os.path.join(tmpdir, 'disk')
+        with open(self.src, 'wb') as f:
+            f.write(b'data')
+            f.truncate(units.Mi)
+
+    @mock.patch.object(imagebackend.libvirt_utils, 'copy_image')
+    @mock.patch.object(imagebackend.utils, 'execute')
+    def test_copy_reflink(self, mock_execute, mock_copy):
+        self.assertEqual('reflink',
+                         imagebackend._copy_image(self.src, self.dest))
+        mock_execute.assert_called_once_with('cp', '--reflink=always',
+                                             self.src, self.dest)
+        self.assertFalse(mock_copy.called)
+
+    @mock.patch.object(imagebackend, '_copy_file_range', return_value=False)
+    @mock.patch.object(imagebackend.libvirt_utils, 'copy_image')
+    @mock.patch.object(imagebackend.utils, 'execute',
+                       side_effect=processutils.ProcessExecutionError)
+    def test_copy_fallback_remembered(self, mock_execute, mock_copy,
+                                      mock_copy_file_range):
+        for i in range(2):
+            self.assertEqual('copy',
+                             imagebackend._copy_image(self.src, self.dest))
+        mock_execute.assert_called_once_with('cp', '--reflink=always',
+                                             self.src, self.dest)
+        mock_copy_file_range.assert_called_once_with(self.src, self.dest)
+        self.assertEqual([mock.call(self.src, self.dest)] * 2,
+                         mock_copy.call_args_list)
+
+    @mock.patch.object(imagebackend.libvirt_utils, 'copy_image')
+    @mock.patch.object(imagebackend.utils, 'execute',
+                       side_effect=processutils.ProcessExecutionError)
+    def test_copy_file_range(self, mock_execute, mock_copy):
+        if not hasattr(os, 'copy_file_range'):
+            self.skipTest('copy_file_range is not available')
+        self.assertEqual('copy_file_range',
+                         imagebackend._copy_image(self.src, self.dest))
+        self.assertFalse(mock_copy.called)
+        with open(self.src, 'rb') as src, open(self.dest, 'rb') as dest:
+            self.assertEqual(src.read(), dest.read())
+
+    @mock.patch.object(imagebackend.libvirt_utils, 'copy_image')
+    @mock.patch.object(imagebackend.utils, 'execute')
+    def test_copy_missing_source(self, mock_execute, mock_copy):
+        self.assertEqual('copy', imagebackend._copy_image('/missing',
+                                                          self.dest))
+        self.assertFalse(mock_execute.called)
+        mock_copy.assert_called_once_with('/missing', self.dest)
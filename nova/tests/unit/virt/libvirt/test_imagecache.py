@@ -19,6 +19,7 @@ import hashlib
 import os
 import time
 
+import fixtures
 import mock
 from oslo_concurrency import lockutils
 from oslo_concurrency import processutils
@@ -31,9 +32,11 @@ from six.moves import cStringIO
 
 from nova import conductor
 from nova import context
+from nova import exception
 from nova import objects
 from nova import test
 from nova.tests.unit import fake_instance
+from nova.tests import uuidsentinel
 from nova import utils
 from nova.virt.libvirt import imagecache
 from nova.virt.libvirt import utils as libvirt_utils
@@ -413,6 +416,22 @@ class ImageCacheManagerTestCase(test.NoDBTestCase):
             self.assertFalse(os.path.exists(fname))
             self.assertFalse(os.path.exists(info_fname))
 
+    def test_remove_base_file_pinned(self):
+        with self._make_base_file() as fname:
+            imagecache.write_stored_info(fname, field='pinned', value=True)
+            os.utime(fname, (-1, time.time() - 3600 * 25))
+            image_cache_manager = imagecache.ImageCacheManager()
+            image_cache_manager._remove_base_file(fname)
+            self.assertTrue(os.path.exists(fname))
+
+            # The base file made for testing is not in the base directory
+            self.flags(image_cache_subdirectory_name='')
+            with mock.patch.object(imagecache, 'get_cache_fname',
+                                   return_value='aaa'):
+                image_cache_manager.unpin_images(['fake-image'])
+            image_cache_manager._remove_base_file(fname)
+            self.assertFalse(os.path.exists(fname))
+
     def test_remove_base_file_dne(self):
         # This test is solely to execute the "does not exist" code path. We
         # don't expect the method being tested to do anything in this case.
@@ -905,6 +924,56 @@ class ImageCacheManagerTestCase(test.NoDBTestCase):
         mock_synchronized.assert_called_once_with(lock_file, external=True,
                                                   lock_path=lock_path)
 
+    @mock.patch.object(libvirt_utils, 'update_mtime')
+    def test_cache_images(self, mock_mtime):
+        ctxt = context.RequestContext('user', 'project')
+        fetched = []
+
+        def fake_fetch(context, target, image_id, user_id, project_id):
+            self.assertEqual(ctxt, context)
+            self.assertEqual(('user', 'project'), (user_id, project_id))
+            fetched.append(image_id)
+            with open(target, 'w') as f:
+                f.write('data')
+
+        with utils.tempdir() as tmpdir:
+            self.flags(instances_path=tmpdir)
+            self.flags(image_info_filename_pattern=('$instances_path/'
+                                                    '%(image)s.info'),
+                       group='libvirt')
+            base_dir = os.path.join(tmpdir, CONF.image_cache_subdirectory_name)
+            image_cache_manager = imagecache.ImageCacheManager()
+            image_cache_manager.cache_images(ctxt, ['image1', 'image2'],
+                                             fake_fetch, pin=True)
+            # Images already in the cache are not fetched again
+            image_cache_manager.cache_images(ctxt, ['image1'], fake_fetch)
+
+            self.assertEqual(['image1', 'image2'], sorted(fetched))
+            for image_id in ('image1', 'image2'):
+                base_file = os.path.join(
+                    base_dir,
+                    imagecache.get_cache_fname({'image_id': image_id},
+                                               'image_id'))
+                self.assertTrue(os.path.exists(base_file))
+                self.assertTrue(imagecache.read_stored_info(base_file,
+                                                            field='pinned'))
+            self.assertEqual(3, mock_mtime.call_count)
+
+    @mock.patch.object(libvirt_utils, 'update_mtime')
+    def test_cache_images_fetch_failure(self, mock_mtime):
+        ctxt = context.RequestContext('user', 'project')
+        fetch = mock.Mock(side_effect=exception.ImageNotFound(
+            image_id='image1'))
+
+        with utils.tempdir() as tmpdir:
+            self.flags(instances_path=tmpdir)
+            image_cache_manager = imagecache.ImageCacheManager()
+            image_cache_manager.cache_images(ctxt, ['image1', 'image2'],
+                                             fetch, pin=True)
+
+        self.assertEqual(2, fetch.call_count)
+        self.assertFalse(mock_mtime.called)
+
 
 class VerifyChecksumTestCase(test.NoDBTestCase):
 
@@ -1008,3 +1077,221 @@ class VerifyChecksumTestCase(test.NoDBTestCase):
             # Checksum requests for a file with no checksum now have the
             # side effect of creating the checksum
             self.assertTrue(os.path.exists(info_fname))
+
+    def test_verify_checksum_limit_per_pass(self):
+        self.flags(checksum_max_images_per_pass=1, group='libvirt')
+        with utils.tempdir() as tmpdir:
+            image_cache_manager, fname = self._check_body(tmpdir, "csum valid")
+            res = image_cache_manager._verify_checksum(self.img, fname)
+            self.assertTrue(res)
+
+            # The stored checksum is recent, it is not counted
+            res = image_cache_manager._verify_checksum(self.img, fname)
+            self.assertTrue(res)
+
+            self._write_file(imagecache.get_info_filename(fname),
+                             "csum valid", b'')
+            with mock.patch.object(imagecache, '_hash_file') as mock_hash:
+                res = image_cache_manager._verify_checksum(self.img, fname)
+            self.assertIsNone(res)
+            self.assertFalse(mock_hash.called)
+
+    @mock.patch.object(time, 'sleep')
+    @mock.patch.object(time, 'time', return_value=1000)
+    def test_hash_file_read_rate_limit(self, mock_time, mock_sleep):
+        self.flags(checksum_read_rate_limit=1, group='libvirt')
+        data = b'a' * 256 * 1024
+        with utils.tempdir() as tmpdir:
+            fname = os.path.join(tmpdir, 'aaa')
+            with open(fname, 'wb') as f:
+                f.write(data)
+            self.assertEqual(hashlib.sha1(data).hexdigest(),
+                             imagecache._hash_file(fname))
+
+        # 256 KiB at 1 MiB per second take a quarter of a second
+        mock_sleep.assert_called_with(0.25)
+
+
+class ImageUsageIndexTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(ImageUsageIndexTestCase, self).setUp()
+        self.tmpdir = self.useFixture(fixtures.TempDir()).path
+        self.flags(instances_path=self.tmpdir)
+        self.base_dir = os.path.join(self.tmpdir, '_base')
+        os.mkdir(self.base_dir)
+        self.index = imagecache.ImageUsageIndex(self.base_dir)
+
+    def test_load_missing(self):
+        self.assertIsNone(self.index.load())
+
+    def test_add_and_remove_users(self):
+        self.index.add_users(uuidsentinel.instance1, ['aaa', 'bbb'])
+        self.index.add_users(uuidsentinel.instance2, ['aaa'])
+        self.index.add_users(None, ['ccc'])
+
+        entries = self.index.load()['base_files']
+        self.assertEqual(set([uuidsentinel.instance1, uuidsentinel.instance2]),
+                         set(entries['aaa']['users']))
+        self.assertEqual({uuidsentinel.instance1: CONF.host},
+                         entries['bbb']['users'])
+        self.assertEqual({}, entries['ccc']['users'])
+
+        self.index.remove_users([uuidsentinel.instance1, 'instance-1'])
+        entries = self.index.load()['base_files']
+        self.assertEqual([uuidsentinel.instance2],
+                         list(entries['aaa']['users']))
+        self.assertEqual({}, entries['bbb']['users'])
+
+
+class IndexedImageCacheManagerTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(IndexedImageCacheManagerTestCase, self).setUp()
+        self.tmpdir = self.useFixture(fixtures.TempDir()).path
+        self.flags(instances_path=self.tmpdir)
+        self.flags(image_info_filename_pattern=('$instances_path/'
+                                                '%(image)s.info'),
+                   group='libvirt')
+        self.flags(image_cache_index=True, group='libvirt')
+        self.base_dir = os.path.join(self.tmpdir, '_base')
+        os.mkdir(self.base_dir)
+        self.index = imagecache.ImageUsageIndex(self.base_dir)
+        self.context = context.get_admin_context()
+        self.instance = fake_instance.fake_instance_obj(
+            self.context, image_ref='1', uuid=uuidsentinel.instance,
+            name='instance-1', host=CONF.host, vm_state='', task_state='')
+        self.used = hashlib.sha1('1').hexdigest()
+        self.unused = hashlib.sha1('2').hexdigest()
+
+        patcher = mock.patch.object(
+            objects.BlockDeviceMappingList, 'get_by_instance_uuid',
+            return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(libvirt_utils, 'update_mtime')
+        self.mock_mtime = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _make_base_file(self, name, age=0):
+        path = os.path.join(self.base_dir, name)
+        with open(path, 'w') as f:
+            f.write('data')
+        if age:
+            os.utime(path, (-1, time.time() - age))
+        return path
+
+    def test_add_image_users(self):
+        self._make_base_file(self.used)
+        image_cache_manager = imagecache.ImageCacheManager()
+        image_cache_manager.add_image_users(
+            self.instance, [self.used, self.unused, 'ephemeral_1_default'])
+
+        entries = self.index.load()['base_files']
+        self.assertEqual([self.used], list(entries))
+        self.assertEqual({uuidsentinel.instance: CONF.host},
+                         entries[self.used]['users'])
+
+        image_cache_manager.remove_image_users(self.instance)
+        entries = self.index.load()['base_files']
+        self.assertEqual({}, entries[self.used]['users'])
+
+    def test_add_image_users_disabled(self):
+        self.flags(image_cache_index=False, group='libvirt')
+        self._make_base_file(self.used)
+        image_cache_manager = imagecache.ImageCacheManager()
+        image_cache_manager.add_image_users(self.instance, [self.used])
+        self.assertIsNone(self.index.load())
+
+    def test_update_builds_index(self):
+        used = self._make_base_file(self.used)
+        unused = self._make_base_file(self.unused)
+
+        image_cache_manager = imagecache.ImageCacheManager()
+        image_cache_manager.update(self.context, [self.instance])
+
+        data = self.index.load()
+        self.assertIn('scanned_at', data)
+        self.assertEqual(set([self.used, self.unused]),
+                         set(data['base_files']))
+        self.assertTrue(os.path.exists(used))
+        self.assertTrue(os.path.exists(unused))
+
+    @mock.patch.object(imagecache.ImageCacheManager, '_list_backing_images')
+    @mock.patch.object(imagecache.ImageCacheManager, '_list_base_images')
+    def test_update_from_index(self, mock_list_base, mock_list_backing):
+        used = self._make_base_file(self.used, age=3600 * 25)
+        unused = self._make_base_file(self.unused, age=3600 * 25)
+        other = self._make_base_file(self.unused + '_10', age=3600 * 25)
+        old = time.time() - 3600 * 25
+
+        def _fill(data):
+            data['scanned_at'] = time.time()
+            data['base_files'] = {
+                self.used: {'users': {}, 'last_used': old},
+                self.unused: {'users': {uuidsentinel.deleted: 'otherhost'},
+                              'last_used': old},
+                self.unused + '_10': {'users': {uuidsentinel.instance:
+                                                CONF.host},
+                                      'last_used': old}}
+        self.index.update(_fill)
+
+        image_cache_manager = imagecache.ImageCacheManager()
+        image_cache_manager.update(self.context, [self.instance])
+
+        self.assertFalse(mock_list_base.called)
+        self.assertFalse(mock_list_backing.called)
+        # Used by the running instance
+        self.assertTrue(os.path.exists(used))
+        # The instance recorded in the index does not exist anymore
+        self.assertFalse(os.path.exists(unused))
+        # Used according to the index
+        self.assertTrue(os.path.exists(other))
+        self.assertEqual(set([used, other]),
+                         set(image_cache_manager.active_base_files))
+        self.assertEqual(set([self.used, self.unused + '_10']),
+                         set(self.index.load()['base_files']))
+
+    @mock.patch.object(imagecache.ImageCacheManager, '_list_base_images')
+    def test_update_from_index_recently_used(self, mock_list_base):
+        unused = self._make_base_file(self.unused, age=3600 * 25)
+
+        def _fill(data):
+            data['scanned_at'] = time.time()
+            data['base_files'] = {
+                self.unused: {'users': {}, 'last_used': time.time()}}
+        self.index.update(_fill)
+
+        image_cache_manager = imagecache.ImageCacheManager()
+        with mock.patch.object(image_cache_manager,
+                               '_remove_base_file') as mock_remove:
+            image_cache_manager.update(self.context, [self.instance])
+
+        self.assertFalse(mock_remove.called)
+        self.assertTrue(os.path.exists(unused))
+
+    @mock.patch.object(imagecache.ImageCacheManager, '_list_base_images')
+    def test_update_from_index_checksums_oldest_first(self, mock_list_base):
+        self.flags(checksum_base_images=True, group='libvirt')
+        self.flags(checksum_max_images_per_pass=1, group='libvirt')
+        resized = self.used + '_10'
+        self._make_base_file(self.used)
+        self._make_base_file(resized)
+
+        def _fill(data):
+            data['scanned_at'] = time.time()
+            data['base_files'] = {
+                self.used: {'users': {}, 'checksummed_at': 1000},
+                resized: {'users': {}, 'checksummed_at': 10}}
+        self.index.update(_fill)
+
+        image_cache_manager = imagecache.ImageCacheManager()
+        with mock.patch.object(imagecache, '_hash_file',
+                               return_value='fake-sha1') as mock_hash:
+            image_cache_manager.update(self.context, [self.instance])
+
+        mock_hash.assert_called_once_with(
+            os.path.join(self.base_dir, resized))
+        entries = self.index.load()['base_files']
+        self.assertEqual(1000, entries[self.used]['checksummed_at'])
+        self.assertNotEqual(10, entries[resized]['checksummed_at'])
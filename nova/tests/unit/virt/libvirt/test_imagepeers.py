@@ -0,0 +1,245 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import hashlib
+import os
+
+import fixtures
+import mock
+from oslo_utils import fileutils
+from requests_mock.contrib import fixture
+import webob
+
+from nova import exception
+from nova import test
+from nova.virt import images
+from nova.virt.libvirt import imagepeers
+
+
+IMAGE_ID = 'c1a7e6b4-5f8a-4d2b-9e3c-7a6f0d1b2c3e'
+PEER_URL = 'http://peer1:8780/images/%s' % IMAGE_ID
+
+
+class ImagePeersTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(ImagePeersTestCase, self).setUp()
+        self.instances_path = self.useFixture(fixtures.TempDir()).path
+        self.flags(instances_path=self.instances_path)
+        self.flags(image_peers=['peer1:8780'], group='libvirt')
+        self.base = imagepeers._get_base_path(IMAGE_ID)
+        fileutils.ensure_tree(os.path.dirname(self.base))
+        self.data = b'base image data'
+        self.checksum = hashlib.md5(self.data).hexdigest()
+        patcher = mock.patch('socket.getaddrinfo',
+                             return_value=[(2, 1, 6, '', ('10.0.0.1', 0))])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _write_base(self):
+        with open(self.base, 'wb') as f:
+            f.write(self.data)
+
+    def _get(self, remote_addr='10.0.0.1', headers=None):
+        req = webob.Request.blank('/images/%s' % IMAGE_ID,
+                                  remote_addr=remote_addr,
+                                  headers=headers or {})
+        return req.get_response(imagepeers.ImagePeerApp())
+
+    def test_serve_recorded_base_image(self):
+        self._write_base()
+        imagepeers.record_base_image(self.base, self.checksum)
+
+        resp = self._get()
+
+        self.assertEqual(200, resp.status_int)
+        self.assertEqual(self.data, resp.body)
+        self.assertEqual(self.checksum, resp.headers['X-Image-Checksum'])
+
+    def test_serve_unrecorded_base_image(self):
+        self._write_base()
+
+        self.assertEqual(404, self._get().status_int)
+
+    def test_serve_missing_base_image(self):
+        self.assertEqual(404, self._get().status_int)
+
+    def test_serve_unknown_peer(self):
+        self._write_base()
+        imagepeers.record_base_image(self.base, self.checksum)
+
+        self.assertEqual(403, self._get(remote_addr='10.0.0.2').status_int)
+
+    def test_serve_signed_request(self):
+        self.flags(image_peer_secret='secret', group='libvirt')
+        self._write_base()
+        imagepeers.record_base_image(self.base, self.checksum)
+        signature = imagepeers._sign('/images/%s' % IMAGE_ID)
+
+        resp = self._get(headers={imagepeers.SIGNATURE_HEADER: signature})
+
+        self.assertEqual(200, resp.status_int)
+
+    def test_serve_unsigned_request(self):
+        self.flags(image_peer_secret='secret', group='libvirt')
+        self._write_base()
+        imagepeers.record_base_image(self.base, self.checksum)
+
+        self.assertEqual(403, self._get().status_int)
+        self.assertEqual(403, self._get(
+            headers={imagepeers.SIGNATURE_HEADER: 'bogus'}).status_int)
+
+
+class FetchFromPeersTestCase(ImagePeersTestCase):
+    def setUp(self):
+        super(FetchFromPeersTestCase, self).setUp()
+        self.requests = self.useFixture(fixture.Fixture())
+        self.qemu_img_info = mock.Mock(file_format='raw', backing_file=None,
+                                       virtual_size=100)
+        patcher = mock.patch.object(images, 'qemu_img_info',
+                                    return_value=self.qemu_img_info)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _serve(self, image_checksum=None, data=None):
+        self.requests.get(PEER_URL,
+                          content=data or self.data,
+                          headers={'X-Image-Checksum':
+                                   image_checksum or self.checksum})
+
+    def test_fetch_from_peers(self):
+        self._serve()
+
+        self.assertTrue(
+            imagepeers.fetch_from_peers(IMAGE_ID, self.checksum, self.base))
+        with open(self.base, 'rb') as f:
+            self.assertEqual(self.data, f.read())
+        self.assertNotIn(imagepeers.SIGNATURE_HEADER,
+                         self.requests.last_request.headers)
+
+    def test_fetch_from_peers_signed(self):
+        self.flags(image_peer_secret='secret', group='libvirt')
+        self._serve()
+
+        self.assertTrue(
+            imagepeers.fetch_from_peers(IMAGE_ID, self.checksum, self.base))
+        self.assertEqual(imagepeers._sign('/images/%s' % IMAGE_ID),
+                         self.requests.last_request.headers[
+                             imagepeers.SIGNATURE_HEADER])
+
+    def test_fetch_from_peers_other_version(self):
+        self._serve(image_checksum='old-sum')
+
+        self.assertFalse(
+            imagepeers.fetch_from_peers(IMAGE_ID, self.checksum, self.base))
+        self.assertFalse(os.path.exists(self.base))
+
+    def test_fetch_from_peers_corrupt_data(self):
+        # NOTE: The peer claims the right checksum, only the data tells.
+        self._serve(data=b'corrupt data')
+
+        self.assertFalse(
+            imagepeers.fetch_from_peers(IMAGE_ID, self.checksum, self.base))
+        self.assertFalse(os.path.exists(self.base))
+        self.assertFalse(os.path.exists('%s.part' % self.base))
+        self.assertFalse(images.qemu_img_info.called)
+
+    def test_fetch_from_peers_not_found(self):
+        self.requests.get(PEER_URL, status_code=404)
+
+        self.assertFalse(
+            imagepeers.fetch_from_peers(IMAGE_ID, self.checksum, self.base))
+
+    def test_fetch_from_peers_backing_file(self):
+        self.qemu_img_info.backing_file = '/etc/shadow'
+        self._serve()
+
+        self.assertFalse(
+            imagepeers.fetch_from_peers(IMAGE_ID, self.checksum, self.base))
+        self.assertFalse(os.path.exists(self.base))
+        self.assertFalse(os.path.exists('%s.part' % self.base))
+
+    def test_fetch_from_peers_flavor_too_small(self):
+        self._serve()
+
+        self.assertRaises(exception.FlavorDiskSmallerThanImage,
+                          imagepeers.fetch_from_peers, IMAGE_ID,
+                          self.checksum, self.base, max_size=10)
+        self.assertFalse(os.path.exists(self.base))
+
+    @mock.patch.object(images, 'convert_image')
+    def test_fetch_from_peers_converts(self, mock_convert):
+        self.flags(force_raw_images=True)
+        self.qemu_img_info.file_format = 'qcow2'
+        self._serve()
+
+        def fake_convert(source, dest, in_format, out_format):
+            self.qemu_img_info.file_format = 'raw'
+            with open(dest, 'wb') as f:
+                f.write(b'converted')
+
+        mock_convert.side_effect = fake_convert
+
+        self.assertTrue(
+            imagepeers.fetch_from_peers(IMAGE_ID, self.checksum, self.base))
+        mock_convert.assert_called_once_with('%s.part' % self.base,
+                                             '%s.converted' % self.base,
+                                             'qcow2', 'raw')
+
+    def _fetch_image(self, image_meta, fetch_func=None):
+        self.flags(image_peer_port=8780, group='libvirt')
+        fetch_func = fetch_func or mock.Mock()
+        with mock.patch.object(images, 'get_info', return_value=image_meta):
+            imagepeers.fetch_image(fetch_func, mock.sentinel.ctx, self.base,
+                                   IMAGE_ID, 'user', 'project', max_size=200)
+        return fetch_func
+
+    def test_fetch_image_from_peer(self):
+        self._serve()
+
+        fetch_func = self._fetch_image({'checksum': self.checksum,
+                                        'disk_format': 'raw'})
+
+        self.assertFalse(fetch_func.called)
+        self.assertEqual(200, self._get().status_int)
+
+    def test_fetch_image_falls_back_to_glance(self):
+        self.requests.get(PEER_URL, status_code=404)
+        fetch_func = mock.Mock(side_effect=lambda **kw: self._write_base())
+
+        self._fetch_image({'checksum': self.checksum, 'disk_format': 'raw'},
+                          fetch_func)
+
+        fetch_func.assert_called_once_with(
+            context=mock.sentinel.ctx, target=self.base, image_id=IMAGE_ID,
+            user_id='user', project_id='project', max_size=200)
+        resp = self._get()
+        self.assertEqual(200, resp.status_int)
+        self.assertEqual(self.checksum, resp.headers['X-Image-Checksum'])
+
+    def test_fetch_image_converted_not_recorded(self):
+        self.requests.get(PEER_URL, status_code=404)
+        fetch_func = mock.Mock(side_effect=lambda **kw: self._write_base())
+
+        self._fetch_image({'checksum': self.checksum,
+                           'disk_format': 'qcow2'}, fetch_func)
+
+        self.assertEqual(404, self._get().status_int)
+
+    def test_fetch_image_target_not_written(self):
+        self.requests.get(PEER_URL, status_code=404)
+
+        fetch_func = self._fetch_image({'checksum': self.checksum,
+                                        'disk_format': 'raw'})
+
+        self.assertTrue(fetch_func.called)
+        self.assertFalse(os.path.exists(self.base))
+        self.assertEqual(404, self._get().status_int)
@@ -17,9 +17,11 @@ import functools
 import os
 import tempfile
 
+import fixtures
 import mock
 from oslo_concurrency import processutils
 from oslo_config import cfg
+from oslo_serialization import jsonutils
 from oslo_utils import fileutils
 import six
 
@@ -482,6 +484,49 @@ disk size: 4.4M
                                        dest_format='ploop',
                                        out_format='parallels')
 
+    def _write_flat_image_layers(self):
+        tmpdir = self.useFixture(fixtures.TempDir()).path
+        disk = os.path.join(tmpdir, 'disk')
+        base = os.path.join(tmpdir, 'base')
+        with open(disk, 'wb') as f:
+            f.write(b'xxABCDyy')
+        with open(base, 'wb') as f:
+            f.write(b'0123EFG')
+        return disk, base
+
+    @mock.patch.object(libvirt_utils, 'get_disk_backing_file')
+    @mock.patch.object(utils, 'execute')
+    def test_open_flat_image(self, mock_execute, mock_backing):
+        disk, base = self._write_flat_image_layers()
+        mock_backing.return_value = base
+        mock_execute.return_value = (jsonutils.dumps([
+            {'start': 0, 'length': 4, 'depth': 0, 'zero': False,
+             'data': True, 'offset': 2},
+            {'start': 4, 'length': 3, 'depth': 1, 'zero': False,
+             'data': True, 'offset': 4},
+            {'start': 7, 'length': 2, 'depth': 1, 'zero': True,
+             'data': False}]), '')
+
+        with libvirt_utils.open_flat_image(disk, 'qcow2') as image:
+            self.assertEqual(b'ABC', image.read(3))
+            self.assertEqual(b'DEFG\0', image.read(5))
+            self.assertEqual(b'\0', image.read())
+            self.assertEqual(b'', image.read(3))
+
+        mock_execute.assert_called_once_with(
+            'qemu-img', 'map', '--output=json', '-f', 'qcow2', disk)
+        mock_backing.assert_called_once_with(disk, basename=False)
+
+    @mock.patch.object(utils, 'execute')
+    def test_open_flat_image_compressed(self, mock_execute):
+        disk, base = self._write_flat_image_layers()
+        mock_execute.return_value = (jsonutils.dumps([
+            {'start': 0, 'length': 8, 'depth': 0, 'zero': False,
+             'data': True}]), '')
+
+        self.assertRaises(exception.ImageUnacceptable,
+                          libvirt_utils.open_flat_image, disk, 'qcow2')
+
     def test_load_file(self):
         dst_fd, dst_path = tempfile.mkstemp()
         try:
@@ -12,10 +12,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import hashlib
 import os
 
+import fixtures
 import mock
 from oslo_concurrency import processutils
+from oslo_utils import units
 
 from nova import exception
 from nova import test
@@ -66,3 +69,154 @@ class QemuTestCase(test.NoDBTestCase):
                                'Image href123 is unacceptable.*',
                                images.fetch_to_raw,
                                None, 'href123', '/no/path', None, None)
+
+
+class QemuImgInfoCacheTestCase(test.NoDBTestCase):
+    QEMU_IMG_INFO = """image: %s
+file format: vmdk
+virtual size: 1.0K (1024 bytes)
+disk size: 4.0K
+"""
+
+    def setUp(self):
+        super(QemuImgInfoCacheTestCase, self).setUp()
+        self.tmpdir = self.useFixture(fixtures.TempDir()).path
+        self.path = os.path.join(self.tmpdir, 'disk')
+
+    def _write_qcow2(self, backing_file=b'', nb_snapshots=0, version=3):
+        header = images._QCOW2_HEADER.pack(
+            images.QCOW2_MAGIC, version, 112 if backing_file else 0,
+            len(backing_file), 16, 10 * units.Gi, 0, 20, 0, 0, 0,
+            nb_snapshots, 0)
+        header += images._QCOW2_V3_HEADER.pack(0, 0, 0, 4, 104)
+        with open(self.path, 'wb') as f:
+            f.write(header.ljust(112, b'\0') + backing_file)
+
+    @mock.patch.object(utils, 'execute')
+    def test_qemu_img_info_qcow2_header(self, mock_execute):
+        self._write_qcow2(backing_file=b'/var/lib/nova/instances/_base/abc')
+
+        info = images.qemu_img_info(self.path)
+
+        self.assertFalse(mock_execute.called)
+        self.assertEqual('qcow2', info.file_format)
+        self.assertEqual(10 * units.Gi, info.virtual_size)
+        self.assertEqual(64 * units.Ki, info.cluster_size)
+        self.assertEqual('/var/lib/nova/instances/_base/abc',
+                         info.backing_file)
+
+    @mock.patch.object(utils, 'execute')
+    def test_qemu_img_info_qcow2_snapshots(self, mock_execute):
+        self._write_qcow2(nb_snapshots=1)
+        mock_execute.return_value = (self.QEMU_IMG_INFO % self.path, '')
+
+        images.qemu_img_info(self.path)
+
+        mock_execute.assert_called_once_with('env', 'LC_ALL=C', 'LANG=C',
+                                             'qemu-img', 'info', self.path)
+
+    @mock.patch.object(utils, 'execute')
+    def test_qemu_img_info_raw(self, mock_execute):
+        with open(self.path, 'wb') as f:
+            f.write(b'\0' * 1024)
+
+        info = images.qemu_img_info(self.path, format='raw')
+
+        self.assertFalse(mock_execute.called)
+        self.assertEqual('raw', info.file_format)
+        self.assertEqual(1024, info.virtual_size)
+
+    @mock.patch.object(utils, 'execute')
+    def test_qemu_img_info_cached_until_changed(self, mock_execute):
+        with open(self.path, 'wb') as f:
+            f.write(b'vmdk')
+        mock_execute.return_value = (self.QEMU_IMG_INFO % self.path, '')
+
+        info = images.qemu_img_info(self.path)
+        self.assertEqual(info, images.qemu_img_info(self.path))
+        self.assertEqual(1, mock_execute.call_count)
+        self.assertEqual('vmdk', info.file_format)
+
+        with open(self.path, 'ab') as f:
+            f.write(b'more data')
+        images.qemu_img_info(self.path)
+        self.assertEqual(2, mock_execute.call_count)
+
+        images.invalidate_qemu_img_info(self.path)
+        images.qemu_img_info(self.path)
+        self.assertEqual(3, mock_execute.call_count)
+
+
+class SparseImageWriterTestCase(test.NoDBTestCase):
+    def _write(self, chunks, block_size=4):
+        with utils.tempdir() as tmpdir:
+            path = os.path.join(tmpdir, 'image')
+            writer = images.SparseImageWriter(path, block_size=block_size)
+            writer._file = mock.Mock(wraps=writer._file)
+            for chunk in chunks:
+                writer.write(chunk)
+            writer.close()
+            with open(path, 'rb') as f:
+                return f.read(), writer._file.write.call_args_list, writer
+
+    def test_write_skips_zero_blocks(self):
+        data = b'abcd' + b'\0' * 8 + b'efgh' + b'\0' * 6
+        content, writes, writer = self._write([data])
+        self.assertEqual(data, content)
+        self.assertEqual([mock.call(b'abcd'), mock.call(b'efgh')], writes)
+        self.assertEqual(hashlib.md5(data).hexdigest(),
+                         writer.checksum.hexdigest())
+
+    def test_write_splits_chunks_on_file_blocks(self):
+        data = b'ab\0\0' + b'\0' * 4 + b'\0\0cd'
+        content, writes, writer = self._write([b'ab\0', b'\0\0\0\0\0\0',
+                                               b'\0c', b'd'])
+        self.assertEqual(data, content)
+        self.assertEqual([mock.call(b'ab\0'), mock.call(b'\0c'),
+                          mock.call(b'd')], writes)
+
+
+class FetchTestCase(test.NoDBTestCase):
+    @mock.patch.object(images.IMAGE_API, 'download')
+    def test_fetch(self, mock_download):
+        images.fetch(mock.sentinel.ctx, 'href', '/fake/path', None, None)
+        mock_download.assert_called_once_with(mock.sentinel.ctx, 'href',
+                                              dest_path='/fake/path')
+
+    def _fetch_stream(self, checksum):
+        self.flags(stream_image_downloads=True)
+
+        def fake_download(context, image_href, data=None, dest_path=None):
+            data.write(b'image')
+
+        with utils.tempdir() as tmpdir:
+            path = os.path.join(tmpdir, 'image')
+            with test.nested(
+                mock.patch.object(images.IMAGE_API, 'get',
+                                  return_value={'checksum': checksum}),
+                mock.patch.object(images.IMAGE_API, 'download',
+                                  side_effect=fake_download),
+            ):
+                try:
+                    images.fetch(mock.sentinel.ctx, 'href', path, None, None)
+                finally:
+                    exists = os.path.exists(path)
+            return exists
+
+    def test_fetch_stream(self):
+        self.assertTrue(
+            self._fetch_stream(hashlib.md5(b'image').hexdigest()))
+
+    def test_fetch_stream_checksum_mismatch(self):
+        self.assertRaises(exception.ImageUnacceptable,
+                          self._fetch_stream, 'bad')
+
+    @mock.patch.object(images, '_fetch_stream')
+    @mock.patch.object(images.IMAGE_API, 'download')
+    def test_fetch_stream_direct_url(self, mock_download, mock_stream):
+        self.flags(stream_image_downloads=True)
+        self.flags(allowed_direct_url_schemes=['file'], group='glance')
+        images.fetch(mock.sentinel.ctx, 'href', '/fake/path', None, None)
+        mock_download.assert_called_once_with(mock.sentinel.ctx, 'href',
+                                              dest_path='/fake/path')
+        self.assertFalse(mock_stream.called)
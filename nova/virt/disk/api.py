@@ -162,6 +162,7 @@ def extend(image, size):
         return
 
     utils.execute('qemu-img', 'resize', image.path, size)
+    images.invalidate_qemu_img_info(image.path)
 
     if (image.format != imgmodel.FORMAT_RAW and
         not CONF.resize_fs_using_block_device):
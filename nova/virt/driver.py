@@ -1316,6 +1316,27 @@ class ComputeDriver(object):
         """
         pass
 
+    def cache_images(self, context, image_ids, pin=False):
+        """Fetch images into the driver's local image cache.
+
+        This lets an operator warm the cache of a host ahead of the first
+        spawn of an image on it.
+
+        :param context: security context
+        :param image_ids: ids of the images to fetch
+        :param pin: if True, the images are kept in the cache when no
+                    instance uses them, until unpin_images() is called
+        """
+        raise NotImplementedError()
+
+    def unpin_images(self, context, image_ids):
+        """Let images pinned by cache_images() be removed from the cache.
+
+        :param context: security context
+        :param image_ids: ids of the images to unpin
+        """
+        raise NotImplementedError()
+
     def add_to_aggregate(self, context, aggregate, host, **kwargs):
         """Add a compute host to an aggregate.
 
@@ -17,7 +17,6 @@ import fractions
 import itertools
 
 from oslo_log import log as logging
-from oslo_serialization import jsonutils
 from oslo_utils import strutils
 from oslo_utils import units
 import six
@@ -27,6 +26,7 @@ from nova import context
 from nova import exception
 from nova.i18n import _
 from nova import objects
+from nova.objects import blob
 from nova.objects import fields
 from nova.objects import instance as obj_instance
 
@@ -1358,7 +1358,7 @@ def instance_topology_from_instance(instance):
         if isinstance(instance_numa_topology, six.string_types):
             instance_numa_topology = (
                 objects.InstanceNUMATopology.obj_from_primitive(
-                    jsonutils.loads(instance_numa_topology)))
+                    blob.loads(instance_numa_topology)))
 
         elif isinstance(instance_numa_topology, dict):
             # NOTE (ndipanov): A horrible hack so that we can use
@@ -19,12 +19,19 @@
 Handling of VM disk images.
 """
 
+import collections
+import hashlib
 import os
+import stat
+import struct
+import threading
 
 from oslo_concurrency import processutils
 from oslo_log import log as logging
 from oslo_utils import fileutils
 from oslo_utils import imageutils
+from oslo_utils import units
+import six
 
 import nova.conf
 from nova import exception
@@ -37,9 +44,139 @@ LOG = logging.getLogger(__name__)
 CONF = nova.conf.CONF
 IMAGE_API = image.API()
 
+# NOTE: Blocks of zeros this size and aligned on it are not written to the
+# image file. 64KiB matches the default cluster size of qcow2 images.
+SPARSE_BLOCK_SIZE = 64 * units.Ki
+
+
+# NOTE: The qemu-img info of regular files, keyed by path and format, is
+# kept along with the identity of the file it was obtained for, until the
+# file changes.
+_QEMU_IMG_INFO_CACHE = collections.OrderedDict()
+_QEMU_IMG_INFO_CACHE_SIZE = 1024
+_QEMU_IMG_INFO_LOCK = threading.Lock()
+
+QCOW2_MAGIC = b'QFI\xfb'
+_QCOW2_HEADER = struct.Struct('>4sIQIIQIIQQIIQ')
+_QCOW2_V3_HEADER = struct.Struct('>QQQII')
+_QCOW2_MAX_BACKING_FILE_SIZE = 1023
+
+
+def _get_file_identity(path):
+    """Return the stat of a regular file and a key identifying its
+    contents, which changes whenever the file is written or replaced.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None, None
+    if not stat.S_ISREG(st.st_mode):
+        return st, None
+    mtime = getattr(st, 'st_mtime_ns', st.st_mtime)
+    ctime = getattr(st, 'st_ctime_ns', st.st_ctime)
+    return st, (st.st_dev, st.st_ino, mtime, ctime, st.st_size)
+
+
+def _qcow2_info_from_header(f, path, st):
+    header = f.read(_QCOW2_HEADER.size)
+    if len(header) < _QCOW2_HEADER.size:
+        return None
+    (_magic, version, backing_file_offset, backing_file_size, cluster_bits,
+     size, crypt_method, l1_size, _l1_table_offset, _refcount_table_offset,
+     _refcount_table_clusters, nb_snapshots,
+     _snapshots_offset) = _QCOW2_HEADER.unpack(header)
+
+    # Leave anything beyond the plain layout of a disk, or what qemu-img
+    # would reject, to qemu-img.
+    if version not in (2, 3) or crypt_method or nb_snapshots:
+        return None
+    if not 9 <= cluster_bits <= 21:
+        return None
+    cluster_size = 1 << cluster_bits
+    l2_coverage = cluster_size * (cluster_size // 8)
+    if l1_size < (size + l2_coverage - 1) // l2_coverage:
+        return None
+    if version == 3:
+        header = f.read(_QCOW2_V3_HEADER.size)
+        if len(header) < _QCOW2_V3_HEADER.size:
+            return None
+        incompatible_features = _QCOW2_V3_HEADER.unpack(header)[0]
+        if incompatible_features:
+            return None
+
+    backing_file = None
+    if backing_file_offset:
+        if (backing_file_offset > cluster_size or
+                backing_file_size > _QCOW2_MAX_BACKING_FILE_SIZE):
+            return None
+        f.seek(backing_file_offset)
+        backing_file = f.read(backing_file_size)
+        if len(backing_file) < backing_file_size:
+            return None
+        if six.PY3:
+            backing_file = backing_file.decode('utf-8')
+        # NOTE: qemu-img reports the path relative backing files resolve to,
+        # and backing files may be given with protocols.
+        if not backing_file.startswith('/') or ':' in backing_file:
+            return None
+
+    info = imageutils.QemuImgInfo()
+    info.image = path
+    info.file_format = 'qcow2'
+    info.virtual_size = size
+    info.cluster_size = cluster_size
+    info.disk_size = st.st_blocks * 512
+    info.backing_file = backing_file
+    return info
+
+
+def _qemu_img_info_from_header(path, format, st):
+    """Build the qemu-img info of a raw or qcow2 image from its header.
+
+    :returns: the info, or None if qemu-img has to inspect the image, such
+              as to probe the format of an image not known to be raw, or
+              for qcow2 images with snapshots or encryption
+    """
+    if format == 'raw':
+        info = imageutils.QemuImgInfo()
+        info.image = path
+        info.file_format = 'raw'
+        info.virtual_size = st.st_size
+        info.disk_size = st.st_blocks * 512
+        return info
+    if format not in (None, 'qcow2'):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            if f.read(len(QCOW2_MAGIC)) != QCOW2_MAGIC:
+                return None
+            f.seek(0)
+            return _qcow2_info_from_header(f, path, st)
+    except (IOError, OSError):
+        return None
+
+
+def invalidate_qemu_img_info(path):
+    """Forget the cached qemu-img info of a file about to be written."""
+    with _QEMU_IMG_INFO_LOCK:
+        for key in list(_QEMU_IMG_INFO_CACHE):
+            if key[0] == path:
+                del _QEMU_IMG_INFO_CACHE[key]
+
+
+def reset_qemu_img_info_cache():
+    """Forget every cached qemu-img info, for tests."""
+    with _QEMU_IMG_INFO_LOCK:
+        _QEMU_IMG_INFO_CACHE.clear()
+
 
 def qemu_img_info(path, format=None):
-    """Return an object containing the parsed output from qemu-img info."""
+    """Return an object containing the parsed output from qemu-img info.
+
+    The info of regular files is cached until they change, and is read from
+    the header of raw and qcow2 images rather than by running qemu-img when
+    possible.
+    """
     # TODO(mikal): this code should not be referring to a libvirt specific
     # flag.
     # NOTE(sirp): The config option import must go here to avoid an import
@@ -49,6 +186,28 @@ def qemu_img_info(path, format=None):
     if not os.path.exists(path) and CONF.libvirt.images_type != 'rbd':
         raise exception.DiskNotFound(location=path)
 
+    st, identity = _get_file_identity(path)
+    if identity is None:
+        return _qemu_img_info(path, format)
+
+    key = (path, format)
+    with _QEMU_IMG_INFO_LOCK:
+        cached = _QEMU_IMG_INFO_CACHE.get(key)
+    if cached is not None and cached[0] == identity:
+        return cached[1]
+
+    info = _qemu_img_info_from_header(path, format, st)
+    if info is None:
+        info = _qemu_img_info(path, format)
+    with _QEMU_IMG_INFO_LOCK:
+        _QEMU_IMG_INFO_CACHE.pop(key, None)
+        _QEMU_IMG_INFO_CACHE[key] = (identity, info)
+        while len(_QEMU_IMG_INFO_CACHE) > _QEMU_IMG_INFO_CACHE_SIZE:
+            _QEMU_IMG_INFO_CACHE.popitem(last=False)
+    return info
+
+
+def _qemu_img_info(path, format):
     try:
         cmd = ('env', 'LC_ALL=C', 'LANG=C', 'qemu-img', 'info', path)
         if format is not None:
@@ -98,11 +257,75 @@ def _convert_image(source, dest, in_format, out_format, run_as_root):
         msg = (_("Unable to convert image to %(format)s: %(exp)s") %
                {'format': out_format, 'exp': exp})
         raise exception.ImageUnacceptable(image_id=source, reason=msg)
+    finally:
+        invalidate_qemu_img_info(dest)
+
+
+class SparseImageWriter(object):
+    """File object writing image data sparse and checksumming it.
+
+    Blocks of zeros are skipped by seeking over them, leaving holes in the
+    file that read back as zeros without taking any disk space.
+    """
+
+    def __init__(self, path, block_size=SPARSE_BLOCK_SIZE):
+        self.path = path
+        self.block_size = block_size
+        self.checksum = hashlib.md5()
+        self._file = open(path, 'wb')
+        self._size = 0
+
+    def write(self, data):
+        self.checksum.update(data)
+        pos = 0
+        while pos < len(data):
+            # Split the data on block boundaries of the file, so that a
+            # block of zeros is found however the data was chunked.
+            end = pos + self.block_size - self._size % self.block_size
+            block = data[pos:end]
+            if block.count(b'\0') == len(block):
+                self._file.seek(len(block), os.SEEK_CUR)
+            else:
+                self._file.write(block)
+            self._size += len(block)
+            pos = end
+
+    def truncate(self, size=0):
+        self._file.seek(size)
+        self._file.truncate(size)
+        self._size = size
+
+    def close(self):
+        # NOTE: Blocks of zeros at the end of the image were skipped, extend
+        # the file to the full size of the image.
+        self._file.truncate(self._size)
+        self._file.close()
+
+
+def _fetch_stream(context, image_href, path):
+    image_meta = IMAGE_API.get(context, image_href)
+    writer = SparseImageWriter(path)
+    try:
+        IMAGE_API.download(context, image_href, data=writer)
+    finally:
+        writer.close()
+
+    expected = image_meta.get('checksum')
+    actual = writer.checksum.hexdigest()
+    if expected and expected != actual:
+        raise exception.ImageUnacceptable(image_id=image_href,
+            reason=(_("checksum %(actual)s does not match the expected "
+                      "checksum %(expected)s") %
+                    {'actual': actual, 'expected': expected}))
 
 
 def fetch(context, image_href, path, _user_id, _project_id, max_size=0):
     with fileutils.remove_path_on_error(path):
-        IMAGE_API.download(context, image_href, dest_path=path)
+        if (CONF.stream_image_downloads and
+                not CONF.glance.allowed_direct_url_schemes):
+            _fetch_stream(context, image_href, path)
+        else:
+            IMAGE_API.download(context, image_href, dest_path=path)
 
 
 def get_info(context, image_href):
@@ -113,7 +336,11 @@ def fetch_to_raw(context, image_href, path, user_id, project_id, max_size=0):
     path_tmp = "%s.part" % path
     fetch(context, image_href, path_tmp, user_id, project_id,
           max_size=max_size)
+    convert_fetched_image(image_href, path_tmp, path, max_size=max_size)
+
 
+def convert_fetched_image(image_href, path_tmp, path, max_size=0):
+    """Check a fetched image and move it to path, converted if needed."""
     with fileutils.remove_path_on_error(path_tmp):
         data = qemu_img_info(path_tmp)
 
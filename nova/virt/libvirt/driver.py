@@ -101,6 +101,7 @@ from nova.virt.libvirt import guest as libvirt_guest
 from nova.virt.libvirt import host
 from nova.virt.libvirt import imagebackend
 from nova.virt.libvirt import imagecache
+from nova.virt.libvirt import imagepeers
 from nova.virt.libvirt import instancejobtracker
 from nova.virt.libvirt.storage import dmcrypt
 from nova.virt.libvirt.storage import lvm
@@ -529,6 +530,7 @@ class LibvirtDriver(driver.ComputeDriver):
         self._initiator = None
         self._fc_wwnns = None
         self._fc_wwpns = None
+        self._image_peer_server = None
         self._caps = None
         self.firewall_driver = firewall.load_driver(
             DEFAULT_FIREWALL_DRIVER,
@@ -698,6 +700,14 @@ class LibvirtDriver(driver.ComputeDriver):
                      'qemu_ver': self._version_to_string(
                         MIN_QEMU_OTHER_ARCH.get(kvm_arch))})
 
+        if CONF.libvirt.image_peer_port and self._image_peer_server is None:
+            self._image_peer_server = imagepeers.start_server()
+
+    def cleanup_host(self, host):
+        if self._image_peer_server is not None:
+            self._image_peer_server.stop()
+            self._image_peer_server = None
+
     def _check_required_migration_flags(self, migration_flags, config_name):
         if CONF.libvirt.virt_type == 'xen':
             if (migration_flags & libvirt.VIR_MIGRATE_PEER2PEER) != 0:
@@ -1712,14 +1722,18 @@ class LibvirtDriver(driver.ComputeDriver):
             snapshot_directory = CONF.libvirt.snapshots_directory
             fileutils.ensure_tree(snapshot_directory)
             with utils.tempdir(dir=snapshot_directory) as tmpdir:
+                image_file = None
                 try:
                     out_path = os.path.join(tmpdir, snapshot_name)
                     if live_snapshot:
                         # NOTE(xqueralt): libvirt needs o+x in the tempdir
                         os.chmod(tmpdir, 0o701)
-                        self._live_snapshot(context, instance, guest,
-                                            disk_path, out_path, source_format,
-                                            image_format, instance.image_meta)
+                        stream = (CONF.libvirt.snapshot_stream_upload and
+                                  image_format in ('raw', 'iso'))
+                        image_file = self._live_snapshot(
+                            context, instance, guest, disk_path, out_path,
+                            source_format, image_format, instance.image_meta,
+                            stream=stream)
                     else:
                         snapshot_backend.snapshot_extract(out_path,
                                                           image_format)
@@ -1732,7 +1746,9 @@ class LibvirtDriver(driver.ComputeDriver):
                 # Upload that image to the image service
                 update_task_state(task_state=task_states.IMAGE_UPLOADING,
                         expected_state=task_states.IMAGE_PENDING_UPLOAD)
-                with libvirt_utils.file_open(out_path) as image_file:
+                if image_file is None:
+                    image_file = libvirt_utils.file_open(out_path)
+                with image_file:
                     self._image_api.update(context,
                                            image_id,
                                            metadata,
@@ -1830,8 +1846,13 @@ class LibvirtDriver(driver.ComputeDriver):
         self._set_quiesced(context, instance, image_meta, False)
 
     def _live_snapshot(self, context, instance, guest, disk_path, out_path,
-                       source_format, image_format, image_meta):
-        """Snapshot an instance without downtime."""
+                       source_format, image_format, image_meta, stream=False):
+        """Snapshot an instance without downtime.
+
+        With stream, the copy of the disk is returned opened as a flat raw
+        image to upload from, rather than converted to out_path first, when
+        it can be read that way.
+        """
         dev = guest.get_block_device(disk_path)
 
         # Save a copy of the domain's persistent XML file
@@ -1889,6 +1910,14 @@ class LibvirtDriver(driver.ComputeDriver):
             if quiesced:
                 self._set_quiesced(context, instance, image_meta, False)
 
+        if stream:
+            try:
+                return libvirt_utils.open_flat_image(disk_delta, 'qcow2')
+            except exception.ImageUnacceptable as e:
+                LOG.info(_LI('Converting snapshot before uploading it, it '
+                             'can not be streamed: %s'), e,
+                         instance=instance)
+
         # Convert the delta (CoW) image with a backing file to a flat
         # image with no backing file.
         libvirt_utils.extract_snapshot(disk_delta, 'qcow2',
@@ -3133,8 +3162,12 @@ class LibvirtDriver(driver.ComputeDriver):
                            'kernel_id': instance.kernel_id,
                            'ramdisk_id': instance.ramdisk_id}
 
+        # Names of the base images used by the instance
+        base_files = []
+
         if disk_images['kernel_id']:
             fname = imagecache.get_cache_fname(disk_images, 'kernel_id')
+            base_files.append(fname)
             raw('kernel').cache(fetch_func=libvirt_utils.fetch_raw_image,
                                 context=context,
                                 filename=fname,
@@ -3143,6 +3176,7 @@ class LibvirtDriver(driver.ComputeDriver):
                                 project_id=instance.project_id)
             if disk_images['ramdisk_id']:
                 fname = imagecache.get_cache_fname(disk_images, 'ramdisk_id')
+                base_files.append(fname)
                 raw('ramdisk').cache(fetch_func=libvirt_utils.fetch_raw_image,
                                      context=context,
                                      filename=fname,
@@ -3157,6 +3191,7 @@ class LibvirtDriver(driver.ComputeDriver):
         # create a base image.
         if not booted_from_volume:
             root_fname = imagecache.get_cache_fname(disk_images, 'image_id')
+            base_files.append(root_fname)
             size = instance.root_gb * units.Gi
 
             if size == 0 or suffix == '.rescue':
@@ -3169,7 +3204,21 @@ class LibvirtDriver(driver.ComputeDriver):
                 def clone_fallback_to_fetch(*args, **kwargs):
                     try:
                         backend.clone(context, disk_images['image_id'])
+                        return
                     except exception.ImageUnacceptable:
+                        pass
+                    # NOTE: Images which can not be cloned are streamed into
+                    # the rbd image without going through a local file when
+                    # possible.
+                    try:
+                        backend.direct_import(context,
+                                              disk_images['image_id'],
+                                              max_size=kwargs.get('max_size'))
+                    except exception.ImageUnacceptable as e:
+                        LOG.debug('Unable to import image %(image_id)s '
+                                  'directly: %(error)s',
+                                  {'image_id': disk_images['image_id'],
+                                   'error': e}, instance=instance)
                         libvirt_utils.fetch_image(*args, **kwargs)
                 fetch_func = clone_fallback_to_fetch
             else:
@@ -3241,6 +3290,9 @@ class LibvirtDriver(driver.ComputeDriver):
                                          filename="swap_%s" % swap_mb,
                                          size=size,
                                          swap_mb=swap_mb)
+                base_files.append("swap_%s" % swap_mb)
+
+        self.image_cache_manager.add_image_users(instance, base_files)
 
         # Config drive
         if configdrive.required_by(instance):
@@ -6712,6 +6764,10 @@ class LibvirtDriver(driver.ComputeDriver):
     def _try_fetch_image_cache(self, image, fetch_func, context, filename,
                                image_id, instance, size,
                                fallback_from_host=None):
+        # NOTE: Backends cloning images do not keep a local base image, which
+        # peers could serve, and fetching one would defeat the clone.
+        if imagepeers.is_enabled() and not image.SUPPORTS_CLONE:
+            fetch_func = functools.partial(imagepeers.fetch_image, fetch_func)
         try:
             image.cache(fetch_func=fetch_func,
                         context=context,
@@ -7071,6 +7127,16 @@ class LibvirtDriver(driver.ComputeDriver):
         """Manage the local cache of images."""
         self.image_cache_manager.update(context, all_instances)
 
+    def cache_images(self, context, image_ids, pin=False):
+        fetch_func = libvirt_utils.fetch_image
+        if imagepeers.is_enabled():
+            fetch_func = functools.partial(imagepeers.fetch_image, fetch_func)
+        self.image_cache_manager.cache_images(context, image_ids, fetch_func,
+                                              pin=pin)
+
+    def unpin_images(self, context, image_ids):
+        self.image_cache_manager.unpin_images(image_ids)
+
     def _cleanup_remote_migration(self, dest, inst_base, inst_base_resize,
                                   shared_storage=False):
         """Used only for cleanup in case migrate_disk_and_power_off fails."""
@@ -7632,6 +7698,7 @@ class LibvirtDriver(driver.ComputeDriver):
             return False
 
         LOG.info(_LI('Deletion of %s complete'), target_del, instance=instance)
+        self.image_cache_manager.remove_image_users(instance)
         return True
 
     @property
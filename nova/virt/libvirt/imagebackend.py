@@ -16,10 +16,14 @@
 import abc
 import base64
 import contextlib
+import errno
 import functools
 import os
 import shutil
+import threading
 
+import eventlet
+from oslo_concurrency import processutils
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
@@ -64,6 +68,14 @@ __imagebackend_opts = [
     cfg.StrOpt('images_rbd_ceph_conf',
                default='',  # default determined by librados
                help='Path to the ceph configuration file to use'),
+    cfg.IntOpt('images_rbd_import_max_in_flight',
+               default=8,
+               min=0,
+               help='Number of 4 MiB writes kept in flight when a raw image '
+                    'that can not be cloned is streamed from glance straight '
+                    'into an rbd image. Images are downloaded to a local '
+                    'file and imported from it instead when this is 0 or '
+                    'when glance image signatures are verified.'),
     cfg.StrOpt('hw_disk_discard',
                choices=('ignore', 'unmap'),
                help='Discard option for nova managed disks. Need'
@@ -81,12 +93,176 @@ CONF.import_opt('cipher', 'nova.compute.api',
 CONF.import_opt('key_size', 'nova.compute.api',
                 group='ephemeral_storage_encryption')
 CONF.import_opt('rbd_user', 'nova.virt.libvirt.volume.net', group='libvirt')
+CONF.import_opt('verify_glance_signatures', 'nova.image.glance',
+                group='glance')
 CONF.import_opt('rbd_secret_uuid', 'nova.virt.libvirt.volume.net',
                 group='libvirt')
 
 LOG = logging.getLogger(__name__)
 IMAGE_API = image.API()
 
+# Seconds between the progress messages of requests waiting for a base image
+# created by another request.
+_WAIT_LOG_INTERVAL = 30
+
+_IN_FLIGHT = {}
+_IN_FLIGHT_LOCK = threading.Lock()
+
+
+class _SharedCreation(object):
+    """The creation of a base file, shared by the requests waiting for it."""
+
+    def __init__(self, target):
+        self.target = target
+        self.done = eventlet.event.Event()
+
+    def _get_progress(self):
+        for path in ('%s.part' % self.target, self.target):
+            try:
+                return os.path.getsize(path)
+            except OSError:
+                continue
+        return 0
+
+    def wait(self):
+        """Wait for the creation to complete.
+
+        Returns True if it succeeded, False otherwise.
+        """
+        while True:
+            with eventlet.timeout.Timeout(_WAIT_LOG_INTERVAL, False):
+                return self.done.wait()
+            LOG.info(_LI('Waiting for %(target)s created by another request, '
+                         '%(size)d bytes written so far'),
+                     {'target': self.target, 'size': self._get_progress()})
+
+
+def _create_once(target, create_func, *args, **kwargs):
+    """Create a base file once for the concurrent requests of this process.
+
+    The first request calls create_func, the requests for the same target
+    arriving meanwhile wait for it to complete instead of queueing up on the
+    lock of the base file and checking it in turn. When the creation fails,
+    the failure may be specific to the first request, such as a flavor too
+    small for the image, so one of the waiters tries again.
+
+    A creation may also succeed without producing the base file, when
+    create_func cloned the image straight into the disk of the instance of
+    the first request, as with rbd. Each waiter then calls create_func for
+    its own instance.
+    """
+    while True:
+        with _IN_FLIGHT_LOCK:
+            creation = _IN_FLIGHT.get(target)
+            first = creation is None
+            if first:
+                creation = _IN_FLIGHT[target] = _SharedCreation(target)
+
+        if not first:
+            if not creation.wait():
+                continue
+            if not os.path.exists(target):
+                create_func(*args, **kwargs)
+            return
+
+        succeeded = False
+        try:
+            create_func(*args, **kwargs)
+            succeeded = True
+        finally:
+            with _IN_FLIGHT_LOCK:
+                del _IN_FLIGHT[target]
+            creation.done.send(succeeded)
+        return
+
+
+# Copy strategies found not to work between a pair of filesystems.
+_COPY_UNSUPPORTED = set()
+
+
+def _copy_reflink(src, dest):
+    """Clone src into dest sharing its extents, on XFS or btrfs."""
+    try:
+        utils.execute('cp', '--reflink=always', src, dest)
+    except processutils.ProcessExecutionError:
+        return False
+    return True
+
+
+def _copy_file_range(src, dest):
+    """Copy the data extents of src into dest within the kernel.
+
+    Holes are skipped so that dest is as sparse as src.
+    """
+    if not hasattr(os, 'copy_file_range') or not hasattr(os, 'SEEK_DATA'):
+        return False
+    with open(src, 'rb') as fsrc, open(dest, 'wb') as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        offset = 0
+        try:
+            while offset < size:
+                try:
+                    start = os.lseek(fsrc.fileno(), offset, os.SEEK_DATA)
+                except OSError as e:
+                    if e.errno == errno.ENXIO:
+                        # Nothing but a hole left.
+                        break
+                    raise
+                end = os.lseek(fsrc.fileno(), start, os.SEEK_HOLE)
+                while start < end:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(),
+                                                end - start, start, start)
+                    if not copied:
+                        return False
+                    start += copied
+                offset = end
+        except OSError as e:
+            if e.errno in (errno.ENOSYS, errno.EXDEV, errno.EOPNOTSUPP,
+                           errno.EINVAL):
+                return False
+            raise
+        fdst.truncate(size)
+    return True
+
+
+_COPY_STRATEGIES = (('reflink', _copy_reflink),
+                    ('copy_file_range', _copy_file_range))
+
+
+def _copy_image(src, dest):
+    """Copy a base image to an instance disk with the cheapest strategy.
+
+    A reflink clone and an in kernel copy are tried in turn, each given up
+    on for a pair of filesystems once it failed between them. The image is
+    otherwise copied with cp, which keeps it sparse.
+
+    :returns: the name of the strategy used
+    """
+    try:
+        devices = (os.stat(src).st_dev,
+                   os.stat(os.path.dirname(dest)).st_dev)
+    except OSError:
+        devices = None
+
+    strategy = 'copy'
+    if devices is not None:
+        for name, copy_func in _COPY_STRATEGIES:
+            if (name, devices) in _COPY_UNSUPPORTED:
+                continue
+            if copy_func(src, dest):
+                strategy = name
+                break
+            LOG.debug('Unable to copy %(src)s to %(dest)s with %(name)s, '
+                      'not trying it again for these filesystems',
+                      {'src': src, 'dest': dest, 'name': name})
+            _COPY_UNSUPPORTED.add((name, devices))
+    if strategy == 'copy':
+        libvirt_utils.copy_image(src, dest)
+
+    LOG.debug('Copied %(src)s to %(dest)s with %(strategy)s',
+              {'src': src, 'dest': dest, 'strategy': strategy})
+    return strategy
+
 
 @six.add_metaclass(abc.ABCMeta)
 class Image(object):
@@ -234,12 +410,15 @@ class Image(object):
         :size: Size of created image in bytes (optional)
         """
         @utils.synchronized(filename, external=True, lock_path=self.lock_path)
-        def fetch_func_sync(target, *args, **kwargs):
+        def fetch_func_locked(target, *args, **kwargs):
             # The image may have been fetched while a subsequent
             # call was waiting to obtain the lock.
             if not os.path.exists(target):
                 fetch_func(target=target, *args, **kwargs)
 
+        def fetch_func_sync(target, *args, **kwargs):
+            _create_once(target, fetch_func_locked, target, *args, **kwargs)
+
         base_dir = os.path.join(CONF.instances_path,
                                 CONF.image_cache_subdirectory_name)
         if not os.path.exists(base_dir):
@@ -516,7 +695,7 @@ class Raw(Image):
 
         @utils.synchronized(filename, external=True, lock_path=self.lock_path)
         def copy_raw_image(base, target, size):
-            libvirt_utils.copy_image(base, target)
+            _copy_image(base, target)
             if size:
                 # class Raw is misnamed, format may not be 'raw' in all cases
                 image = imgmodel.LocalFileImage(target,
@@ -612,8 +791,9 @@ class Qcow2(Image):
                     legacy_base += '_%d' % legacy_backing_size
                     legacy_backing_size *= units.Gi
 
-        # Create the legacy backing file if necessary.
-        if legacy_backing_size:
+        @utils.synchronized(self._get_lock_name(legacy_base), external=True,
+                            lock_path=self.lock_path)
+        def create_legacy_base(base, legacy_base, legacy_backing_size):
             if not os.path.exists(legacy_base):
                 with fileutils.remove_path_on_error(legacy_base):
                     libvirt_utils.copy_image(base, legacy_base)
@@ -621,6 +801,11 @@ class Qcow2(Image):
                                                     imgmodel.FORMAT_QCOW2)
                     disk.extend(image, legacy_backing_size)
 
+        # Create the legacy backing file if necessary, once for each size.
+        if legacy_backing_size:
+            _create_once(legacy_base, create_legacy_base, base, legacy_base,
+                         legacy_backing_size)
+
         if not os.path.exists(self.path):
             with fileutils.remove_path_on_error(self.path):
                 copy_qcow2_image(base, self.path, size)
@@ -912,6 +1097,42 @@ class Rbd(Image):
         raise exception.ImageUnacceptable(image_id=image_id_or_uri,
                                           reason=reason)
 
+    def direct_import(self, context, image_id, max_size=0):
+        """Stream a raw image from glance straight into the rbd image.
+
+        :raises: exception.ImageUnacceptable when the image can not be
+                 streamed, in which case it has to be fetched to a local file
+                 and imported from it
+        """
+        max_in_flight = CONF.libvirt.images_rbd_import_max_in_flight
+        if (not max_in_flight or CONF.glance.verify_glance_signatures or
+                not self.driver.supports_import_stream()):
+            reason = _('Direct import is not available')
+            raise exception.ImageUnacceptable(image_id=image_id,
+                                              reason=reason)
+
+        image_meta = IMAGE_API.get(context, image_id)
+        size = image_meta.get('size')
+        if image_meta.get('disk_format') not in ['raw', 'iso'] or not size:
+            reason = _('Image is not raw format')
+            raise exception.ImageUnacceptable(image_id=image_id,
+                                              reason=reason)
+        # The virtual size of a raw image is its size.
+        if max_size and max_size < size:
+            raise exception.FlavorDiskSmallerThanImage(
+                flavor_size=max_size, image_size=size)
+
+        chunks = IMAGE_API.download(context, image_id)
+        checksum = self.driver.import_stream(chunks, self.rbd_name, size,
+                                             max_in_flight=max_in_flight)
+        if image_meta.get('checksum') and checksum != image_meta['checksum']:
+            self.driver.remove_image(self.rbd_name)
+            reason = _('Checksum of the streamed data does not match')
+            raise exception.ImageUnacceptable(image_id=image_id,
+                                              reason=reason)
+        LOG.debug('Streamed image %(image_id)s into rbd image %(name)s',
+                  {'image_id': image_id, 'name': self.rbd_name})
+
     def get_model(self, connection):
         secret = None
         if CONF.libvirt.rbd_secret_uuid:
@@ -1049,7 +1270,7 @@ class Ploop(Image):
         @utils.synchronized(filename, external=True, lock_path=self.lock_path)
         def create_ploop_image(base, target, size):
             image_path = os.path.join(target, "root.hds")
-            libvirt_utils.copy_image(base, image_path)
+            _copy_image(base, image_path)
             utils.execute('ploop', 'restore-descriptor', '-f', self.pcs_format,
                           target, image_path)
             if size:
@@ -25,12 +25,14 @@ import os
 import re
 import time
 
+import eventlet
 from oslo_concurrency import lockutils
 from oslo_concurrency import processutils
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
 from oslo_utils import fileutils
+from oslo_utils import units
 
 from nova.i18n import _LE
 from nova.i18n import _LI
@@ -65,6 +67,42 @@ imagecache_opts = [
     cfg.IntOpt('checksum_interval_seconds',
                default=3600,
                help='How frequently to checksum base images'),
+    cfg.IntOpt('checksum_max_images_per_pass',
+               default=0,
+               min=0,
+               help='Maximum number of base images checksummed by each pass '
+                    'of the image cache manager. The other images due for a '
+                    'checksum are verified by the following passes. 0 means '
+                    'no limit'),
+    cfg.IntOpt('checksum_read_rate_limit',
+               default=0,
+               min=0,
+               help='Maximum rate, in MiB per second, at which base images '
+                    'are read to be checksummed. 0 means no limit'),
+    cfg.BoolOpt('image_cache_index',
+                default=False,
+                help='Track the instances using each base image in an index '
+                     'stored in the base image directory, updated when '
+                     'instances are spawned and deleted. The image cache '
+                     'manager then consults the index instead of listing the '
+                     'base image directory and inspecting the disks of every '
+                     'instance on each pass. All compute hosts sharing the '
+                     'instances path should enable it together'),
+    cfg.IntOpt('image_cache_index_rescan_interval',
+               default=7 * 24 * 3600,
+               min=0,
+               help='How frequently, in seconds, the image cache manager '
+                    'rebuilds the index of base images with a full scan of '
+                    'the base image directory, to pick up base images it '
+                    'does not know about. The index is always built by a '
+                    'full scan when it does not exist yet. 0 means the index '
+                    'is only built once'),
+    cfg.IntOpt('image_cache_prefetch_concurrency',
+               default=2,
+               min=1,
+               help='Maximum number of images fetched at once when images '
+                    'are cached ahead of their first use through the '
+                    'cache_images aggregate action'),
     ]
 
 CONF = cfg.CONF
@@ -215,9 +253,20 @@ def write_stored_info(target, field=None, value=None):
 def _hash_file(filename):
     """Generate a hash for the contents of a file."""
     checksum = hashlib.sha1()
+    rate = CONF.libvirt.checksum_read_rate_limit * units.Mi
+    if rate:
+        start = time.time()
+        read = 0
     with open(filename) as f:
         for chunk in iter(lambda: f.read(32768), b''):
             checksum.update(chunk)
+            if rate:
+                # NOTE: Sleep whenever the read is ahead of the allowed rate,
+                # in steps long enough not to wake up for every chunk.
+                read += len(chunk)
+                ahead = float(read) / rate - (time.time() - start)
+                if ahead > 0.1:
+                    time.sleep(ahead)
     return checksum.hexdigest()
 
 
@@ -234,6 +283,104 @@ def write_stored_checksum(target):
     write_stored_info(target, field='sha1', value=_hash_file(target))
 
 
+def _get_fingerprint(name):
+    """Return the fingerprint of the image a base image was created from.
+
+    Returns None for base images which are not created from an image, such
+    as swap images.
+    """
+    digest_size = hashlib.sha1().digestsize * 2
+    if len(name) == digest_size:
+        return name
+    if len(name) > digest_size + 2 and name[digest_size] == '_':
+        return name[:digest_size]
+    return None
+
+
+def _is_swap_image(name):
+    names = name.split('_')
+    return (len(names) == 2 and names[0] == 'swap' and
+            len(names[1]) > 0 and names[1].isdigit())
+
+
+class ImageUsageIndex(object):
+    """Persistent index of the instances using each base image.
+
+    The index is a JSON file in the base image directory, mapping the name
+    of each base image to the instances using it and to the time it was last
+    used. Like the base images, it is shared by the compute nodes sharing
+    the instances path, and it is only changed under an external lock.
+    """
+
+    FILENAME = 'image-usage.json'
+
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+        self.path = os.path.join(base_dir, self.FILENAME)
+        self.lock_path = os.path.join(CONF.instances_path, 'locks')
+
+    def load(self):
+        """Return the content of the index, or None if there is none."""
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, 'r') as f:
+            data = _read_possible_json(f.read(), self.path)
+        data.setdefault('base_files', {})
+        return data
+
+    def _save(self, data):
+        # NOTE: The index is read without the lock, so replace it atomically.
+        tmp_path = '%s.tmp' % self.path
+        with open(tmp_path, 'w') as f:
+            f.write(jsonutils.dumps(data))
+        os.rename(tmp_path, self.path)
+
+    def update(self, func):
+        """Change the index with func, called with its content.
+
+        Returns the changed content.
+        """
+        @utils.synchronized('image-usage-index', external=True,
+                            lock_path=self.lock_path)
+        def _update():
+            data = self.load() or {'base_files': {}}
+            func(data)
+            self._save(data)
+            return data
+
+        return _update()
+
+    def add_users(self, user, names):
+        """Record that user, an instance uuid, uses the named base images.
+
+        With no user, the base images are only recorded as used now.
+        """
+        now = time.time()
+
+        def _add_users(data):
+            for name in names:
+                entry = data['base_files'].setdefault(name, {'users': {}})
+                if user:
+                    entry['users'][user] = CONF.host
+                entry['last_used'] = now
+
+        return self.update(_add_users)
+
+    def remove_users(self, users):
+        """Record that the given instance uuids or names stopped using any
+        base image.
+        """
+        now = time.time()
+
+        def _remove_users(data):
+            for entry in data['base_files'].values():
+                for user in users:
+                    if entry['users'].pop(user, None) is not None:
+                        entry['last_used'] = now
+
+        return self.update(_remove_users)
+
+
 class ImageCacheManager(imagecache.ImageCacheManager):
     def __init__(self):
         super(ImageCacheManager, self).__init__()
@@ -255,6 +402,10 @@ class ImageCacheManager(imagecache.ImageCacheManager):
         self.originals = []
         self.removable_base_files = []
         self.unexplained_images = []
+        self.backing_users = {}
+
+        self.checksums_left = (CONF.libvirt.checksum_max_images_per_pass or
+                               None)
 
     def _store_image(self, base_dir, ent, original=False):
         """Store a base image for later examination."""
@@ -327,6 +478,8 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                             backing_file)
                         if backing_path not in inuse_images:
                             inuse_images.append(backing_path)
+                        self.backing_users.setdefault(
+                            backing_path, set()).add(ent)
 
                         if backing_path in self.unexplained_images:
                             LOG.warn(_LW('Instance %(instance)s is using a '
@@ -399,6 +552,8 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                     write_stored_info(base_file, field='sha1',
                                       value=stored_checksum)
 
+                if not self._take_checksum_budget(img_id, base_file):
+                    return None
                 current_checksum = _hash_file(base_file)
 
                 if current_checksum != stored_checksum:
@@ -420,7 +575,8 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                 # NOTE(mikal): If the checksum file is missing, then we should
                 # create one. We don't create checksums when we download images
                 # from glance because that would delay VM startup.
-                if CONF.libvirt.checksum_base_images and create_if_missing:
+                if (CONF.libvirt.checksum_base_images and create_if_missing
+                        and self._take_checksum_budget(img_id, base_file)):
                     LOG.info(_LI('%(id)s (%(base_file)s): generating '
                                  'checksum'),
                              {'id': img_id,
@@ -431,6 +587,22 @@ class ImageCacheManager(imagecache.ImageCacheManager):
 
         return inner_verify_checksum()
 
+    def _take_checksum_budget(self, img_id, base_file):
+        """Count a checksum against the limit of checksums per pass.
+
+        Returns False if the limit is reached and the checksum has to wait
+        for a later pass.
+        """
+        if self.checksums_left is None:
+            return True
+        if self.checksums_left <= 0:
+            LOG.debug('image %(id)s at (%(base_file)s): checksum deferred '
+                      'to a later pass',
+                      {'id': img_id, 'base_file': base_file})
+            return False
+        self.checksums_left -= 1
+        return True
+
     @staticmethod
     def _get_age_of_file(base_file):
         if not os.path.exists(base_file):
@@ -503,12 +675,72 @@ class ImageCacheManager(imagecache.ImageCacheManager):
 
     def _remove_base_file(self, base_file):
         """Remove a single base file if it is old enough."""
+        if read_stored_info(base_file, field='pinned'):
+            LOG.info(_LI('Base file is pinned, not removing: %s'), base_file)
+            return
+
         maxage = CONF.libvirt.remove_unused_resized_minimum_age_seconds
         if base_file in self.originals:
             maxage = CONF.remove_unused_original_minimum_age_seconds
 
         self._remove_old_enough_file(base_file, maxage)
 
+    def _cache_image(self, context, base_dir, image_id, fetch_func, pin):
+        filename = get_cache_fname({'image_id': image_id}, 'image_id')
+        base_file = os.path.join(base_dir, filename)
+
+        @utils.synchronized(filename, external=True, lock_path=self.lock_path)
+        def fetch_base_file():
+            if not os.path.exists(base_file):
+                fetch_func(context=context, target=base_file,
+                           image_id=image_id, user_id=context.user_id,
+                           project_id=context.project_id)
+            # NOTE: Refresh the age of the base file as a spawn using it
+            # would, so that it is not aged out before it is used.
+            libvirt_utils.update_mtime(base_file)
+
+        try:
+            fetch_base_file()
+        except Exception:
+            LOG.exception(_LE('Failed to cache image %s'), image_id)
+            return
+
+        if pin:
+            write_stored_info(base_file, field='pinned', value=True)
+        if CONF.libvirt.image_cache_index:
+            ImageUsageIndex(base_dir).add_users(None, [filename])
+        LOG.info(_LI('image %(id)s at (%(base_file)s): cached'),
+                 {'id': image_id, 'base_file': base_file})
+
+    def cache_images(self, context, image_ids, fetch_func, pin=False):
+        """Fetch images into the base directory ahead of their first use.
+
+        :param image_ids: ids of the images to fetch
+        :param fetch_func: function fetching an image to a base file, with
+                           the arguments of libvirt_utils.fetch_image
+        :param pin: if True, the base files are not removed when unused
+                    until they are unpinned
+        """
+        base_dir = os.path.join(CONF.instances_path,
+                                CONF.image_cache_subdirectory_name)
+        fileutils.ensure_tree(base_dir)
+        pool = eventlet.GreenPool(
+            CONF.libvirt.image_cache_prefetch_concurrency)
+        for image_id in image_ids:
+            pool.spawn_n(self._cache_image, context, base_dir, image_id,
+                         fetch_func, pin)
+        pool.waitall()
+
+    def unpin_images(self, image_ids):
+        """Let the base files of pinned images be removed when unused."""
+        base_dir = os.path.join(CONF.instances_path,
+                                CONF.image_cache_subdirectory_name)
+        for image_id in image_ids:
+            base_file = os.path.join(
+                base_dir, get_cache_fname({'image_id': image_id}, 'image_id'))
+            if read_stored_info(base_file, field='pinned'):
+                write_stored_info(base_file, field='pinned', value=False)
+
     def _handle_base_image(self, img_id, base_file):
         """Handle the checks for a single base image."""
 
@@ -656,20 +888,212 @@ class ImageCacheManager(imagecache.ImageCacheManager):
             return
         return base_dir
 
+    def _get_index(self):
+        return ImageUsageIndex(os.path.join(
+            CONF.instances_path, CONF.image_cache_subdirectory_name))
+
+    def add_image_users(self, instance, names):
+        """Record in the index that an instance uses the named base images.
+        """
+        if not CONF.libvirt.image_cache_index:
+            return
+        index = self._get_index()
+        names = [name for name in names
+                 if ((_get_fingerprint(name) or _is_swap_image(name)) and
+                     os.path.exists(os.path.join(index.base_dir, name)))]
+        if not names:
+            return
+        # NOTE: The index is only an optimisation, the image cache manager
+        # still checks the base images against the running instances.
+        try:
+            index.add_users(instance.uuid, names)
+        except (IOError, OSError) as e:
+            LOG.warning(_LW('Failed to record the base images used in the '
+                            'image cache index: %s'), e, instance=instance)
+
+    def remove_image_users(self, instance):
+        """Record in the index that an instance uses no base image anymore.
+        """
+        if not CONF.libvirt.image_cache_index:
+            return
+        try:
+            self._get_index().remove_users([instance.uuid, instance.name])
+        except (IOError, OSError) as e:
+            LOG.warning(_LW('Failed to remove the base images used from the '
+                            'image cache index: %s'), e, instance=instance)
+
+    @staticmethod
+    def _index_is_stale(data):
+        if not data or 'scanned_at' not in data:
+            return True
+        interval = CONF.libvirt.image_cache_index_rescan_interval
+        return bool(interval) and time.time() - data['scanned_at'] >= interval
+
+    def _rebuild_index(self, index, base_dir, names):
+        """Rebuild the index from a full scan of the base images."""
+        LOG.debug('Rebuilding the image cache index')
+        now = time.time()
+        users = {}
+        for backing_path, backing_users in self.backing_users.items():
+            users[os.path.basename(backing_path)] = backing_users
+        present = set(name for name in names
+                      if os.path.exists(os.path.join(base_dir, name)))
+
+        def _rebuild(data):
+            entries = {}
+            for name, entry in data['base_files'].items():
+                # NOTE: Keep the base images added since the scan.
+                if name in present or name not in names:
+                    entries[name] = entry
+            for name in present:
+                entry = entries.setdefault(name, {'users': {},
+                                                  'last_used': now})
+                for user in users.get(name, ()):
+                    entry['users'].setdefault(user, CONF.host)
+            data['base_files'] = entries
+            data['scanned_at'] = now
+
+        index.update(_rebuild)
+
+    def _age_and_verify_indexed_images(self, index, base_dir):
+        """Ages and verifies the base images recorded in the index.
+
+        Unlike _age_and_verify_cached_images, neither the base image
+        directory nor the disks of the instances are inspected. A base
+        image is in use if the index records instances using it which still
+        exist, or if a running instance was created from the same image.
+        """
+        LOG.debug('Verify base images recorded in the index')
+        now = time.time()
+        fingerprints = set(hashlib.sha1(img).hexdigest()
+                           for img in self.used_images)
+
+        def _in_use(name, entry):
+            if entry['users']:
+                return True
+            fingerprint = _get_fingerprint(name)
+            if fingerprint is not None:
+                return fingerprint in fingerprints
+            return name in self.used_swap_images
+
+        def _reconcile(data):
+            for name, entry in data['base_files'].items():
+                users = entry.setdefault('users', {})
+                # NOTE: Users recorded after the running instances were
+                # listed may not be listed yet.
+                if entry.get('last_used', 0) < self.pass_started:
+                    for user in list(users):
+                        if user not in self.instance_names:
+                            del users[user]
+                if _in_use(name, entry):
+                    entry['last_used'] = now
+
+        data = index.update(_reconcile)
+
+        to_verify = []
+        removed = []
+        for name, entry in sorted(data['base_files'].items()):
+            base_file = os.path.join(base_dir, name)
+            if _get_fingerprint(name) == name:
+                self.originals.append(base_file)
+
+            if _in_use(name, entry):
+                if not os.path.exists(base_file):
+                    LOG.warning(_LW('Base file %s is in use but does not '
+                                    'exist'), base_file)
+                    continue
+                self.active_base_files.append(base_file)
+                libvirt_utils.update_mtime(base_file)
+                if not _is_swap_image(name):
+                    to_verify.append((entry.get('checksummed_at', 0), name))
+                continue
+
+            self.removable_base_files.append(base_file)
+            if not self.remove_unused_base_images:
+                continue
+            if _is_swap_image(name) or base_file in self.originals:
+                maxage = CONF.remove_unused_original_minimum_age_seconds
+            else:
+                maxage = CONF.libvirt.remove_unused_resized_minimum_age_seconds
+            # NOTE: Base images last used recently are too young to be
+            # removed, skip them without looking at the files.
+            if now - entry.get('last_used', 0) < maxage:
+                continue
+            if _is_swap_image(name):
+                self._remove_swap_file(base_file)
+            else:
+                self._remove_base_file(base_file)
+            if not os.path.exists(base_file):
+                removed.append(name)
+
+        # Verify the base images checksummed the longest time ago first, so
+        # that a limit on the checksums per pass goes through all of them.
+        verified = []
+        if CONF.libvirt.checksum_base_images:
+            for checksummed_at, name in sorted(to_verify):
+                if (now - checksummed_at <
+                        CONF.libvirt.checksum_interval_seconds):
+                    break
+                if self.checksums_left is not None and not self.checksums_left:
+                    break
+                base_file = os.path.join(base_dir, name)
+                if self._verify_checksum(name, base_file) is False:
+                    self.corrupt_base_files.append(base_file)
+                verified.append(name)
+                # Give other threads a chance to run
+                time.sleep(0)
+
+        def _record_pass(data):
+            for name in removed:
+                data['base_files'].pop(name, None)
+            for name in verified:
+                if name in data['base_files']:
+                    data['base_files'][name]['checksummed_at'] = now
+
+        if removed or verified:
+            index.update(_record_pass)
+
+        if self.active_base_files:
+            LOG.info(_LI('Active base files: %s'),
+                     ' '.join(self.active_base_files))
+        if self.corrupt_base_files:
+            LOG.info(_LI('Corrupt base files: %s'),
+                     ' '.join(self.corrupt_base_files))
+        if self.removable_base_files:
+            LOG.info(_LI('Removable base files: %s'),
+                     ' '.join(self.removable_base_files))
+        LOG.debug('Verification complete')
+
     def update(self, context, all_instances):
         base_dir = self._get_base()
         if not base_dir:
             return
         # reset the local statistics
         self._reset_state()
+        index = None
+        if CONF.libvirt.image_cache_index:
+            index = ImageUsageIndex(base_dir)
+            self.pass_started = time.time()
+            if not self._index_is_stale(index.load()):
+                self._store_running_instances(context, all_instances)
+                self._age_and_verify_indexed_images(index, base_dir)
+                return
         # read the cached images
         self._list_base_images(base_dir)
+        names = set(os.path.basename(path)
+                    for path in self.unexplained_images)
+        names.update(self.back_swap_images)
         # read running instances data
+        self._store_running_instances(context, all_instances)
+        # perform the aging and image verification
+        self._age_and_verify_cached_images(context, all_instances, base_dir)
+        self._age_and_verify_swap_images(context, base_dir)
+        if index is not None:
+            self._rebuild_index(index, base_dir, names)
+
+    def _store_running_instances(self, context, all_instances):
         running = self._list_running_instances(context, all_instances)
         self.used_images = running['used_images']
         self.image_popularity = running['image_popularity']
         self.instance_names = running['instance_names']
         self.used_swap_images = running['used_swap_images']
-        # perform the aging and image verification
-        self._age_and_verify_cached_images(context, all_instances, base_dir)
-        self._age_and_verify_swap_images(context, base_dir)
@@ -0,0 +1,282 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Sharing of cached base images between compute hosts.
+
+Rolling a new image out to many compute hosts makes every one of them
+download it from glance. A host can instead serve the base images of its
+image cache to its peers over HTTP, and ask its peers for a base image
+before falling back to glance.
+
+A base image is only served once its info file records the checksum glance
+has for the image it was created from, which is only done when the base
+image holds the data of the glance image unconverted. A host fetching from a
+peer checks the MD5 of the data it received against the checksum glance
+currently has for the image, never against what the peer claims, before
+applying the same checks and conversion as to an image fetched from glance.
+
+Base images are only served to the hosts listed in image_peers, and when
+image_peer_secret is set, to requests signed with it.
+"""
+
+import contextlib
+import hashlib
+import hmac
+import os
+import random
+import re
+import socket
+
+from oslo_config import cfg
+from oslo_log import log as logging
+from oslo_utils import encodeutils
+from oslo_utils import fileutils
+from oslo_utils import secretutils as secutils
+import requests
+import six
+import webob.dec
+import webob.exc
+
+from nova import exception
+from nova.i18n import _, _LI, _LW
+from nova.virt import images
+from nova.virt.libvirt import imagecache
+from nova import wsgi
+
+LOG = logging.getLogger(__name__)
+
+imagepeers_opts = [
+    cfg.ListOpt('image_peers',
+                default=[],
+                help='List of <host>:<port> of compute hosts serving their '
+                     'cached base images, which are tried in random order '
+                     'before glance when a base image is missing. The data '
+                     'received from a peer is checked against the checksum '
+                     'glance has for the image. Base images are only served '
+                     'to the hosts in this list.'),
+    cfg.StrOpt('image_peer_listen',
+               default='$my_ip',
+               help='IP address on which the base images of this host are '
+                    'served to its peers. The data is sent unencrypted, so '
+                    'this should be an address on the management network.'),
+    cfg.PortOpt('image_peer_port',
+                default=0,
+                help='Port on which the base images of this host are served '
+                     'to the hosts in image_peers. Base images are not '
+                     'served when this is 0.'),
+    cfg.StrOpt('image_peer_secret',
+               secret=True,
+               help='Shared secret signing the requests for base images '
+                    'between peers. When set, requests without a valid '
+                    'signature are refused, so it must be the same on all '
+                    'the hosts in image_peers.'),
+    cfg.IntOpt('image_peer_timeout',
+               default=30,
+               min=1,
+               help='Seconds to wait for a peer to connect or send data '
+                    'before trying the next peer.'),
+    ]
+
+CONF = cfg.CONF
+CONF.register_opts(imagepeers_opts, 'libvirt')
+CONF.import_opt('instances_path', 'nova.compute.manager')
+CONF.import_opt('my_ip', 'nova.netconf')
+CONF.import_opt('image_cache_subdirectory_name', 'nova.virt.imagecache')
+
+CHUNK_SIZE = 64 * 1024
+SIGNATURE_HEADER = 'X-Image-Peer-Signature'
+
+_IMAGE_PATH_RE = re.compile(r'^/images/([^/]+)$')
+
+
+def _get_base_path(image_id):
+    return os.path.join(CONF.instances_path,
+                        CONF.image_cache_subdirectory_name,
+                        imagecache.get_cache_fname({'image_id': image_id},
+                                                   'image_id'))
+
+
+def _file_iter(f):
+    with contextlib.closing(f):
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            yield chunk
+
+
+def _sign(path):
+    return hmac.new(encodeutils.to_utf8(CONF.libvirt.image_peer_secret),
+                    encodeutils.to_utf8(path), hashlib.sha256).hexdigest()
+
+
+def _get_peer_addresses():
+    """Return the addresses of the hosts in image_peers."""
+    addresses = set()
+    for peer in CONF.libvirt.image_peers:
+        host = peer.rpartition(':')[0].strip('[]')
+        try:
+            for addrinfo in socket.getaddrinfo(host, None):
+                addresses.add(addrinfo[4][0])
+        except socket.gaierror as e:
+            LOG.warning(_LW('Unable to resolve image peer %(peer)s: '
+                            '%(error)s'),
+                        {'peer': peer, 'error': six.text_type(e)})
+    return addresses
+
+
+def record_base_image(target, image_checksum):
+    """Record the glance checksum needed to serve a base image to peers."""
+    imagecache.write_stored_info(target, field='image_checksum',
+                                 value=image_checksum)
+
+
+class ImagePeerApp(object):
+    """WSGI application serving the recorded base images of this host.
+
+    The addresses of the peers are resolved once, when the application is
+    created.
+    """
+
+    def __init__(self):
+        self.peer_addresses = _get_peer_addresses()
+
+    @webob.dec.wsgify
+    def __call__(self, req):
+        if req.remote_addr not in self.peer_addresses:
+            raise webob.exc.HTTPForbidden()
+        if CONF.libvirt.image_peer_secret:
+            signature = req.headers.get(SIGNATURE_HEADER, '')
+            if not secutils.constant_time_compare(_sign(req.path_info),
+                                                  signature):
+                raise webob.exc.HTTPForbidden()
+        if req.method != 'GET':
+            raise webob.exc.HTTPMethodNotAllowed()
+        match = _IMAGE_PATH_RE.match(req.path_info)
+        if match is None:
+            raise webob.exc.HTTPNotFound()
+
+        base = _get_base_path(match.group(1))
+        if not os.path.exists(base):
+            raise webob.exc.HTTPNotFound()
+        info = imagecache.read_stored_info(base)
+        if not info.get('image_checksum'):
+            raise webob.exc.HTTPNotFound()
+
+        f = open(base, 'rb')
+        resp = webob.Response(content_type='application/octet-stream',
+                              app_iter=_file_iter(f))
+        resp.content_length = os.fstat(f.fileno()).st_size
+        resp.headers['X-Image-Checksum'] = str(info['image_checksum'])
+        return resp
+
+
+def start_server():
+    """Start serving the base images of this host to its peers."""
+    server = wsgi.Server('image_peers', ImagePeerApp(),
+                         host=CONF.libvirt.image_peer_listen,
+                         port=CONF.libvirt.image_peer_port)
+    server.start()
+    return server
+
+
+def _fetch_from_peer(peer, image_id, image_checksum, target, max_size):
+    path = '/images/%s' % image_id
+    headers = {}
+    if CONF.libvirt.image_peer_secret:
+        headers[SIGNATURE_HEADER] = _sign(path)
+    resp = requests.get('http://%s%s' % (peer, path), headers=headers,
+                        stream=True, timeout=CONF.libvirt.image_peer_timeout)
+    with contextlib.closing(resp):
+        if resp.status_code != 200:
+            return False
+        # NOTE: The header only spares downloading another version of the
+        # image, the data itself is checked against glance below.
+        if resp.headers.get('X-Image-Checksum') != image_checksum:
+            LOG.debug('Peer %(peer)s holds another version of image '
+                      '%(image_id)s', {'peer': peer, 'image_id': image_id})
+            return False
+
+        path_tmp = '%s.part' % target
+        md5 = hashlib.md5()
+        with fileutils.remove_path_on_error(path_tmp):
+            with open(path_tmp, 'wb') as f:
+                for chunk in resp.iter_content(CHUNK_SIZE):
+                    md5.update(chunk)
+                    f.write(chunk)
+            if md5.hexdigest() != image_checksum:
+                raise exception.ImageUnacceptable(image_id=image_id,
+                    reason=_('data received from %s does not match the '
+                             'checksum of the image') % peer)
+
+    images.convert_fetched_image(image_id, path_tmp, target,
+                                 max_size=max_size)
+    return True
+
+
+def fetch_from_peers(image_id, image_checksum, target, max_size=0):
+    """Fetch a base image from the first peer holding it.
+
+    :param image_checksum: the checksum glance has for the image, which the
+                           data received from a peer must match
+    :returns: True if a peer served the image, False otherwise
+    """
+    peers = list(CONF.libvirt.image_peers)
+    random.shuffle(peers)
+    for peer in peers:
+        try:
+            fetched = _fetch_from_peer(peer, image_id, image_checksum,
+                                       target, max_size)
+        except (requests.RequestException, IOError,
+                exception.ImageUnacceptable,
+                exception.InvalidDiskInfo) as e:
+            LOG.warning(_LW('Unable to fetch image %(image_id)s from peer '
+                            '%(peer)s: %(error)s'),
+                        {'image_id': image_id, 'peer': peer,
+                         'error': six.text_type(e)})
+            continue
+        if fetched:
+            LOG.info(_LI('Fetched image %(image_id)s from peer %(peer)s'),
+                     {'image_id': image_id, 'peer': peer})
+            return True
+    return False
+
+
+def _holds_image_data(target, image_meta):
+    # NOTE: A base image converted from the format of the glance image does
+    # not match the checksum glance has, so it is not worth serving.
+    return (images.qemu_img_info(target).file_format ==
+            image_meta.get('disk_format'))
+
+
+def fetch_image(fetch_func, context, target, image_id, user_id, project_id,
+                max_size=0):
+    """Fetch a base image from a peer, or with fetch_func from glance.
+
+    Base images holding the data of the glance image are recorded so that
+    they can in turn be served to peers.
+    """
+    image_meta = images.get_info(context, image_id)
+    image_checksum = image_meta.get('checksum')
+
+    fetched = False
+    if image_checksum and CONF.libvirt.image_peers:
+        fetched = fetch_from_peers(image_id, image_checksum, target,
+                                   max_size=max_size)
+    if not fetched:
+        fetch_func(context=context, target=target, image_id=image_id,
+                   user_id=user_id, project_id=project_id, max_size=max_size)
+    if (image_checksum and CONF.libvirt.image_peer_port and
+            os.path.exists(target) and
+            _holds_image_data(target, image_meta)):
+        record_base_image(target, image_checksum)
+
+
+def is_enabled():
+    return bool(CONF.libvirt.image_peers or CONF.libvirt.image_peer_port)
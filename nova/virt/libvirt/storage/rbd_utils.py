@@ -14,6 +14,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import hashlib
 import urllib
 
 from eventlet import tpool
@@ -30,6 +32,7 @@ from oslo_serialization import jsonutils
 from oslo_service import loopingcall
 from oslo_utils import excutils
 from oslo_utils import units
+import six
 
 from nova.compute import task_states
 from nova import exception
@@ -41,6 +44,61 @@ from nova.virt.libvirt import utils as libvirt_utils
 
 LOG = logging.getLogger(__name__)
 
+IMPORT_WRITE_SIZE = 4 * units.Mi
+
+
+def _rechunk(chunks, size):
+    """Regroup an iterable of data into chunks of size bytes.
+
+    The last chunk is shorter when the data does not fill it.
+    """
+    buf = []
+    buffered = 0
+    for chunk in chunks:
+        buf.append(chunk)
+        buffered += len(chunk)
+        if buffered >= size:
+            data = b''.join(buf)
+            for offset in six.moves.range(0, len(data) - size + 1, size):
+                yield data[offset:offset + size]
+            rest = data[len(data) - len(data) % size:]
+            buf = [rest] if rest else []
+            buffered = len(rest)
+    if buffered:
+        yield b''.join(buf)
+
+
+class _AioWriter(object):
+    """Write to an RBD volume with a bounded number of writes in flight."""
+
+    def __init__(self, volume, name, max_in_flight):
+        self.volume = volume
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self._pending = collections.deque()
+
+    def _wait_oldest(self):
+        completion, offset, length = self._pending.popleft()
+        tpool.execute(completion.wait_for_complete_and_cb)
+        ret = completion.get_return_value()
+        if ret < 0:
+            raise exception.ImageUnacceptable(image_id=self.name,
+                reason=_('write of %(length)d bytes at offset %(offset)d '
+                         'failed with error %(ret)d') %
+                {'length': length, 'offset': offset, 'ret': ret})
+
+    def write(self, data, offset):
+        while len(self._pending) >= self.max_in_flight:
+            self._wait_oldest()
+        # NOTE: Completions are waited for in order rather than from the
+        # callback, which librbd runs in one of its own threads.
+        completion = self.volume.aio_write(data, offset, lambda c: None)
+        self._pending.append((completion, offset, len(data)))
+
+    def wait(self):
+        while self._pending:
+            self._wait_oldest()
+
 
 class RBDVolumeProxy(object):
     """Context manager for dealing with an existing rbd volume.
@@ -312,6 +370,55 @@ class RBDDriver(object):
         args += self.ceph_args()
         utils.execute('rbd', 'import', *args)
 
+    def supports_import_stream(self):
+        """Whether librbd provides the asynchronous writes import_stream
+        uses.
+        """
+        return hasattr(rbd.Image, 'aio_write')
+
+    def import_stream(self, chunks, name, size, max_in_flight=8):
+        """Import RBD volume from a stream of image data.
+
+        Unlike import_image, the data does not go through a local file. It
+        is written with asynchronous librbd writes, up to max_in_flight at
+        once, skipping the writes of zeroes so that the volume is as sparse
+        as the command line import makes it. The volume is removed if the
+        import fails.
+
+        :chunks: Iterable of the image data
+        :name: Name of RBD volume
+        :size: Size of the image data in bytes
+        :max_in_flight: Maximum number of writes in flight
+        :returns: the hex MD5 checksum of the image data
+        """
+        with RADOSClient(self, self.pool) as client:
+            rbd.RBD().create(client.ioctx, str(name), size,
+                             old_format=False, features=client.features)
+
+        checksum = hashlib.md5()
+        zeroes = b'\0' * IMPORT_WRITE_SIZE
+        try:
+            with RBDVolumeProxy(self, name) as vol:
+                writer = _AioWriter(vol, name, max_in_flight)
+                offset = 0
+                for data in _rechunk(chunks, IMPORT_WRITE_SIZE):
+                    checksum.update(data)
+                    if data != zeroes[:len(data)]:
+                        writer.write(data, offset)
+                    offset += len(data)
+                writer.wait()
+                if offset != size:
+                    raise exception.ImageUnacceptable(image_id=name,
+                        reason=_('received %(offset)d bytes of %(size)d') %
+                        {'offset': offset, 'size': size})
+                tpool.execute(vol.flush)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                LOG.error(_LE('Failed to import rbd image %s, removing it'),
+                          name)
+                self.remove_image(name)
+        return checksum.hexdigest()
+
     def _destroy_volume(self, client, volume, pool=None):
         """Destroy an RBD volume, retrying as needed.
         """
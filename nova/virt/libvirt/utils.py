@@ -18,6 +18,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import errno
 import os
 import re
@@ -26,9 +27,11 @@ from lxml import etree
 from oslo_concurrency import processutils
 from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_serialization import jsonutils
 
 from nova.compute import arch
 from nova.compute import vm_mode
+from nova import exception
 from nova.i18n import _
 from nova.i18n import _LI
 from nova import utils
@@ -42,6 +45,13 @@ libvirt_opts = [
                 default=False,
                 help='Compress snapshot images when possible. This '
                      'currently applies exclusively to qcow2 images'),
+    cfg.BoolOpt('snapshot_stream_upload',
+                default=False,
+                help='Upload raw live snapshots while reading them from the '
+                     'copy of the disk and its backing files, instead of '
+                     'converting them to a temporary flat image first. '
+                     'Requires qemu-img map. Snapshots of disks with '
+                     'compressed clusters are converted as before.'),
     ]
 
 CONF = cfg.CONF
@@ -73,6 +83,7 @@ def create_image(disk_format, path, size):
                  If no suffix is given, it will be interpreted as bytes.
     """
     execute('qemu-img', 'create', '-f', disk_format, path, size)
+    images.invalidate_qemu_img_info(path)
 
 
 def create_cow_image(backing_file, path, size=None):
@@ -105,6 +116,7 @@ def create_cow_image(backing_file, path, size=None):
         cow_opts = ['-o', csv_opts]
     cmd = base_cmd + cow_opts + [path]
     execute(*cmd)
+    images.invalidate_qemu_img_info(path)
 
 
 def pick_disk_driver_name(hypervisor_version, is_block_dev=False):
@@ -300,6 +312,98 @@ def extract_snapshot(disk_path, source_fmt, out_path, dest_fmt):
     execute(*qemu_img_cmd)
 
 
+class FlatImageReader(object):
+    """File object reading a disk image chain as a flat raw image.
+
+    The extents of the image are taken from qemu-img map and read from the
+    layer of the chain holding them, or returned as zeroes when no layer
+    holds them, so that nothing has to be converted up front.
+    """
+
+    def __init__(self, extents, layers):
+        self._extents = collections.deque(extents)
+        self._files = [open(path, 'rb') for path in layers]
+
+    def _read_extent(self, size):
+        start, length, layer, offset = self._extents[0]
+        size = min(size, length)
+        if layer is None:
+            data = b'\0' * size
+        else:
+            f = self._files[layer]
+            f.seek(offset)
+            data = f.read(size)
+            if len(data) != size:
+                raise IOError(_('unexpected end of %s') % f.name)
+        if size == length:
+            self._extents.popleft()
+        else:
+            self._extents[0] = (start + size, length - size, layer,
+                                offset + size if layer is not None else None)
+        return data
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = sum(extent[1] for extent in self._extents)
+        chunks = []
+        while size > 0 and self._extents:
+            data = self._read_extent(size)
+            chunks.append(data)
+            size -= len(data)
+        return b''.join(chunks)
+
+    def close(self):
+        for f in self._files:
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_flat_image(disk_path, source_fmt):
+    """Open a disk image and its backing files as a flat raw image.
+
+    Note that nobody should write to the disk image during this operation.
+
+    :param disk_path: Path to disk image
+    :param source_fmt: Format of the disk image
+    :returns: a FlatImageReader
+    :raises: exception.ImageUnacceptable if the image has extents whose data
+             can not be read directly, such as compressed clusters
+    """
+    out, _err = execute('qemu-img', 'map', '--output=json', '-f', source_fmt,
+                        disk_path)
+    layers = [disk_path]
+    extents = []
+    position = 0
+    for extent in jsonutils.loads(out):
+        if extent['start'] != position:
+            raise exception.ImageUnacceptable(image_id=disk_path,
+                reason=_('unexpected extent at offset %d') % extent['start'])
+        position += extent['length']
+        if not extent['data']:
+            extents.append((extent['start'], extent['length'], None, None))
+            continue
+        if 'offset' not in extent:
+            raise exception.ImageUnacceptable(image_id=disk_path,
+                reason=_('data at offset %d can not be read directly') %
+                extent['start'])
+        depth = extent.get('depth', 0)
+        while len(layers) <= depth:
+            backing_file = get_disk_backing_file(layers[-1], basename=False)
+            if not backing_file:
+                raise exception.ImageUnacceptable(image_id=disk_path,
+                    reason=_('missing backing file at depth %d') % depth)
+            layers.append(os.path.join(os.path.dirname(layers[-1]),
+                                       backing_file))
+        extents.append((extent['start'], extent['length'], depth,
+                        extent['offset']))
+    return FlatImageReader(extents, layers)
+
+
 def load_file(path):
     """Read contents of file
 
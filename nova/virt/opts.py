@@ -24,6 +24,7 @@ import nova.virt.imagecache
 import nova.virt.libvirt.driver
 import nova.virt.libvirt.imagebackend
 import nova.virt.libvirt.imagecache
+import nova.virt.libvirt.imagepeers
 import nova.virt.libvirt.storage.lvm
 import nova.virt.libvirt.utils
 import nova.virt.libvirt.vif
@@ -76,6 +77,7 @@ def list_opts():
              nova.virt.libvirt.driver.libvirt_opts,
              nova.virt.libvirt.imagebackend.__imagebackend_opts,
              nova.virt.libvirt.imagecache.imagecache_opts,
+             nova.virt.libvirt.imagepeers.imagepeers_opts,
              nova.virt.libvirt.storage.lvm.lvm_opts,
              nova.virt.libvirt.utils.libvirt_opts,
              nova.virt.libvirt.vif.libvirt_vif_opts,